@@ -1,16 +1,118 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from typing import List, Optional
+from collections import namedtuple
+import asyncio
+import io
+import os
+import uuid
+import zipfile
+import zlib
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
 import oci
 import base64
-import re
-from db_util import get_db, init_db, save_inv_extraction
+import hashlib
+import json
+import db_util
+import concurrency
+from concurrency import ExecutorSaturated
+from db_util import (
+    init_db, get_cached_extraction, cache_extraction, record_cache_bypass,
+    get_extraction_cache_stats, enqueue_job, get_job, get_vendor_totals, get_monthly_totals,
+    search_invoices, get_review_queue, count_review_queue, resolve_review, get_confidence_stats,
+    invoice_cache,
+)
+from jobs import JobWorkerPool
+from normalize import normalize_document
+from dates import normalize_date
+import extractors
+from export import ExportSnapshot, EXPORT_TABLES
+import uploads
+from uploads import SpooledPdf, spool_upload, encode_base64, content_hash as pdf_content_hash
+import metrics
+from metrics import (
+    EXTRACT_STAGE_SECONDS, EXTRACT_REQUESTS, EXTRACT_IN_FLIGHT, OCI_CALLS,
+    DOCUMENT_CONFIDENCE, DB_QUERY_SECONDS, LOCAL_EXTRACTIONS,
+)
+import random
 import time
-app = FastAPI()
+from contextlib import asynccontextmanager
+from oci_pool import OciClientPool, OCI_CONNECT_TIMEOUT, OCI_READ_TIMEOUT
+from breaker import CircuitBreaker, CircuitOpen
+import writer
+import storage
+
+# לקוח OCI אחד לכל thread, נבנה פעם אחת ונשמר בין בקשות
+oci_clients = OciClientPool()
+
+# כשל זמני של OCI (429/5xx/רשת) מנוסה שוב עם backoff, כל עוד לא עבר ה-deadline
+OCI_MAX_ATTEMPTS = int(os.getenv("OCI_MAX_ATTEMPTS", "3"))
+OCI_RETRY_BASE_DELAY = float(os.getenv("OCI_RETRY_BASE_DELAY", "0.5"))
+OCI_RETRY_MAX_DELAY = float(os.getenv("OCI_RETRY_MAX_DELAY", "4"))
+OCI_DEADLINE = float(os.getenv("OCI_DEADLINE", "30"))
+# הזמן הארוך ביותר שניסיון אחד יכול לקחת; ניסיון נוסף מתחיל רק אם גם הוא נגמר לפני ה-deadline
+OCI_ATTEMPT_TIMEOUT = OCI_CONNECT_TIMEOUT + OCI_READ_TIMEOUT
+# Retry-After ב-503 כשה-breaker עדיין סגור
+OCI_UNAVAILABLE_RETRY_AFTER = int(os.getenv("OCI_UNAVAILABLE_RETRY_AFTER", "5"))
+
+oci_breaker = CircuitBreaker()
+
+# חשבוניות נשמרות ונקראות רק דרך ה-repository (STORAGE_BACKEND, ראו storage.py)
+repository = storage.from_env()
+
+
+def require_db_path():
+    """/search, /analytics, /review and /export read DB_PATH, which only the sqlite backend fills."""
+    if not repository.uses_db_path:
+        raise HTTPException(status_code=501,
+                            detail=f"Not available with STORAGE_BACKEND={repository.name}; needs sqlite.")
+
+# יותר מ-1: supervisor + תהליך writer יחיד + APP_WORKERS תהליכי uvicorn
+APP_WORKERS = int(os.getenv("APP_WORKERS", "1"))
+APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
+APP_PORT = int(os.getenv("APP_PORT", "8080"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    repository.init()
+    # set by writer.writer_process() when the supervisor started several workers
+    remote_writer = writer.client_from_env()
+    if remote_writer is not None:
+        db_util.remote_writer = remote_writer
+        db_util.enable_cache_sync(repository.paths)
+    oci_clients.start()
+    job_workers.start(requeue=remote_writer is None)
+    yield
+    job_workers.stop()
+    oci_clients.close()
+    if remote_writer is not None:
+        db_util.disable_cache_sync()
+        db_util.remote_writer = None
+        remote_writer.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 def get_oci_client():  # pragma: no cover
-     config = oci.config.from_file()
-     doc_client = oci.ai_document.AIServiceDocumentClient(config)
-     return doc_client
+     return oci_clients.get()
+
+
+# דוחים upload גדול מדי לפי Content-Length, עוד לפני שה-body נקרא ומפורסר
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    if request.method == "POST" and request.url.path in ("/extract", "/extract/batch"):
+        length = request.headers.get("content-length", "")
+        if request.url.path == "/extract":
+            limit, error = uploads.MAX_UPLOAD_BYTES, uploads.too_large()
+        else:
+            limit, error = BATCH_MAX_BYTES, batch_too_large()
+        if length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD:
+            return JSONResponse(status_code=413, content={"error": error.detail})
+    return await call_next(request)
 
 
 #“ה־http_exception_handler מאפשר טיפול מרכזי ואחיד בשגיאות HTTP, בלי לחזור על אותו קוד בכל endpoint.”
@@ -18,7 +120,8 @@ def get_oci_client():  # pragma: no cover
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"error": str(exc.detail)}
+        content={"error": str(exc.detail)},
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -31,26 +134,11 @@ def is_pdf(upload: UploadFile, content: bytes) -> bool:
     )
 
 
-# לנקות ערכים כספיים מסימנים 
-def clean_money(value: str): 
-    if not value:
-        return None
-    v = re.sub(r"[^\d.]", "", value)
-    return float(v) if v else None
-
-
-@app.post("/extract")
-async def extract(file: UploadFile = File(...)):
-    pdf_bytes = await file.read()
-
-    # (3) 400
-    if not pdf_bytes or not is_pdf(file, pdf_bytes):
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid document. Please upload a valid PDF invoice with high confidence."
-        )
-
-    encoded_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
+# קריאה חוסמת ל-OCI - רצה ב-oci_executor ולא על ה-event loop
+# pdf: bytes או SpooledPdf (upload שעדיין בקובץ ה-spool)
+def analyze_pdf(pdf):
+    with EXTRACT_STAGE_SECONDS.time(stage="encode"):
+        encoded_pdf = encode_base64(pdf)
     document = oci.ai_document.models.InlineDocumentDetails(data=encoded_pdf)
 
     request = oci.ai_document.models.AnalyzeDocumentDetails(
@@ -62,81 +150,85 @@ async def extract(file: UploadFile = File(...)):
     )
     # (4) 503
     try:
-        response = get_oci_client().analyze_document(request)
-        #response = doc_client.analyze_document(request)
+        with EXTRACT_STAGE_SECONDS.time(stage="oci"):
+            return call_oci(request)
     except Exception:
-        raise HTTPException(
-            status_code=503,
-            detail="The service is currently unavailable. Please try again later."
-        )
-    data = {}
-    data_confidence = {} 
-    confidence = 0.0
-
-    for page in (response.data.pages or []):
-        for field in (getattr(page, "document_fields", None) or []):
-            label = getattr(field, "field_label", None)
-            field_name = getattr(label, "name", None)
-            field_confidence = getattr(label, "confidence", None)
-
-            field_value = getattr(field, "field_value", None)
-            field_value_text = getattr(field_value, "text", None) 
-
-            if field.field_type == "LINE_ITEM_GROUP":
-                items = []
-                rows = getattr(field_value, "items", None) or [] #כל השורות של ה־ Items בתוך החשבונית
-
-                for row in rows: 
-                    item = {
-                        "Description": None,
-                        "Name": None,
-                        "Quantity": None,
-                        "UnitPrice": None,
-                        "Amount": None,
-                    }
-
-                    row_value_obj = getattr(row, "field_value", None)
-                    cols = getattr(row_value_obj, "items", None) or [] #כל העמודות/השדות של הפריט
-
-                    for c in cols: 
-                        c_label = getattr(c, "field_label", None) 
-                        k = getattr(c_label, "name", None) #שם השדה בעמודה
-                        v_obj = getattr(c, "field_value", None) 
-                        v = getattr(v_obj, "text", None) if v_obj else None #הטקסט של הערך בעמודה
-
-                        # ניקוי ערכים מספריים
-                        if k in ("UnitPrice", "Amount"):
-                            v = clean_money(v)
-                        elif k == "Quantity":
-                            v = int(clean_money(v)) if clean_money(v) is not None else None
-
-                        if k in item:
-                            item[k] = v #הכנסת הערך המתאים לשדה המתאים במילון הפריט  
-
-                    items.append(item) # הוספת הפריט לרשימת הפריטים
-
-                data["Items"] = items
-
-            elif field_name: # אם יש שם שדה תקין
-                v = field_value_text #הטקסט של הערך של השדה
-
-                money_fields = {"SubTotal", "ShippingCost", "InvoiceTotal", "AmountDue"}
-                if field_name in money_fields and v:
-                    v = clean_money(v)
-
-                data[field_name] = v
-                data_confidence[field_name] = field_confidence
-
-    if response.data.detected_document_types:
-        for doc_type in response.data.detected_document_types:
-            confidence = doc_type.confidence if doc_type.confidence is not None else 0.0
-   
+        raise service_unavailable()
+
+
+def service_unavailable():
+    return HTTPException(
+        status_code=503,
+        detail="The service is currently unavailable. Please try again later.",
+        headers={"Retry-After": oci_breaker.retry_after_header(OCI_UNAVAILABLE_RETRY_AFTER)},
+    )
+
+
+def is_transient(exc) -> bool:
+    if isinstance(exc, oci.exceptions.ServiceError):
+        return exc.status == 429 or exc.status >= 500
+    return isinstance(exc, (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout))
+
+
+def call_oci(request):
+    """analyze_document through the circuit breaker.
+
+    Transient errors are retried with jittered exponential backoff, up to
+    OCI_MAX_ATTEMPTS and only while the backoff plus a whole attempt
+    (OCI_ATTEMPT_TIMEOUT) still fits in OCI_DEADLINE.
+    Clients are built without the SDK's own retry strategy (oci_pool), so
+    retries don't multiply.
+    """
+    deadline = time.monotonic() + OCI_DEADLINE
+    reloaded = False
+    attempt = 0
+    while True:
+        attempt += 1
+        oci_breaker.acquire()
+        try:
+            response = get_oci_client().analyze_document(request)
+        except oci.exceptions.ServiceError as e:
+            if e.status < 500 and e.status != 429:
+                # OCI ענה - השירות עצמו תקין
+                oci_breaker.record_success()
+                if e.status == 401 and not reloaded:
+                    # credentials rotated -> reload config, build new clients, retry once
+                    oci_clients.invalidate()
+                    reloaded = True
+                    continue
+                OCI_CALLS.inc(outcome="error")
+                raise
+            error = e
+        except Exception as e:
+            error = e
+        else:
+            oci_breaker.record_success()
+            OCI_CALLS.inc(outcome="success")
+            return response
+
+        oci_breaker.record_failure()
+        OCI_CALLS.inc(outcome="error")
+        delay = min(OCI_RETRY_MAX_DELAY, OCI_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        delay *= random.uniform(0.5, 1.0)
+        if (not is_transient(error) or attempt >= OCI_MAX_ATTEMPTS
+                or time.monotonic() + delay + OCI_ATTEMPT_TIMEOUT > deadline):
+            raise error
+        OCI_CALLS.inc(outcome="retry")
+        time.sleep(delay)
+
+
+INVALID_DOCUMENT = "Invalid document. Please upload a valid PDF invoice with high confidence."
+
+
+# ממירים את תשובת OCI למילון {confidence, data, dataConfidence}
+def parse_analyze_response(response):
+    with EXTRACT_STAGE_SECONDS.time(stage="parse"):
+        confidence, data, data_confidence = normalize_document(response.data)
+    DOCUMENT_CONFIDENCE.observe(confidence)
+
     # continue (3) 400
     if confidence < 0.9:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid document. Please upload a valid PDF invoice with high confidence."
-        )
+        raise HTTPException(status_code=400, detail=INVALID_DOCUMENT)
 
     result = {
         "confidence": confidence,
@@ -144,99 +236,606 @@ async def extract(file: UploadFile = File(...)):
         "dataConfidence": data_confidence,
     }
 
+    return result
+
+
+# תבניות מוכרות (extractors.py) מפוענחות מקומית, בלי קריאה ל-OCI
+def extract_locally(pdf):
+    """Result from a registered local extractor, or None when the file needs OCI."""
+    if not extractors.LOCAL_EXTRACT_ENABLED or len(pdf) > extractors.LOCAL_EXTRACT_MAX_BYTES:
+        return None
+    pdf_bytes = pdf.read() if isinstance(pdf, SpooledPdf) else pdf
+    with EXTRACT_STAGE_SECONDS.time(stage="local"):
+        name, result = extractors.extract_local(pdf_bytes)
+    LOCAL_EXTRACTIONS.inc(extractor=name or "none")
+    return result
+
+
+async def lookup_cached(content_hash: str, no_cache: bool = False):
+    """Stored result for this PDF hash, or None (also when the cache is off/bypassed)."""
+    if not db_util.EXTRACT_CACHE_ENABLED:
+        return None
+    if no_cache:
+        record_cache_bypass()
+        return None
+    with EXTRACT_STAGE_SECONDS.time(stage="cache_lookup"):
+        return await concurrency.db_executor.run(get_cached_extraction, content_hash)
+
+
+async def analyze_and_parse(pdf, queued: bool = False):
+    """OCI call + parsing. Raises HTTPException 400/429/503 like /extract.
+
+    ``queued=True`` waits for a free OCI worker instead of answering 429;
+    callers using it must bound their own concurrency.
+    Known templates are parsed locally and never reach OCI.
+    """
+    if extractors.LOCAL_EXTRACT_ENABLED:
+        result = await concurrency.local_executor.run(extract_locally, pdf)
+        if result is not None:
+            return result
+
+    try:
+        # ה-breaker פתוח -> נכשלים מיד, בלי לתפוס worker של OCI
+        oci_breaker.check()
+    except CircuitOpen:
+        raise service_unavailable()
+
+    try:
+        if queued:
+            response = await concurrency.oci_executor.run_queued(analyze_pdf, pdf)
+        else:
+            response = await concurrency.oci_executor.run(analyze_pdf, pdf)
+    except ExecutorSaturated:
+        # (5) 429 - כל ה-workers של OCI עסוקים והתור מלא
+        raise HTTPException(
+            status_code=429,
+            detail="Too many extractions in progress. Please try again later.",
+            headers={"Retry-After": "1"},
+        )
+
+    return parse_analyze_response(response)
+
+
+async def extract_pdf(pdf, no_cache: bool = False):
+    # אותו PDF כבר נותח -> מחזירים את התוצאה השמורה בלי לקרוא ל-OCI
+    content_hash = pdf_content_hash(pdf)
+    cached = await lookup_cached(content_hash, no_cache)
+    if cached is not None:
+        return cached
+
+    result = await analyze_and_parse(pdf)
+
+    with EXTRACT_STAGE_SECONDS.time(stage="save"):
+        await concurrency.db_executor.run(save_inv_extraction, result)
+        if db_util.EXTRACT_CACHE_ENABLED:
+            await concurrency.db_executor.run(cache_extraction, content_hash, result)
+    return result
+
+
+# אותו pipeline כמו extract_pdf, בגרסה סינכרונית שרצה ב-thread של job worker
+def process_job_pdf(pdf_bytes: bytes):
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    if db_util.EXTRACT_CACHE_ENABLED:
+        cached = get_cached_extraction(content_hash)
+        if cached is not None:
+            return cached
+
+    result = extract_locally(pdf_bytes) or parse_analyze_response(analyze_pdf(pdf_bytes))
+
     save_inv_extraction(result)
+    if db_util.EXTRACT_CACHE_ENABLED:
+        cache_extraction(content_hash, result)
     return result
 
 
-@app.get('/invoice/{invoice_id}')
-def get_invoice_by_id(invoice_id: str):
-    with get_db() as conn: #ניהול חיבור לבסיס הנתונים
-        cursor = conn.cursor() #מצביע (cursor) שרץ על מסד הנתונים ומבצע פקודות SQL
-
-        cursor.execute("""
-            SELECT InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
-                   ShippingAddress, SubTotal, ShippingCost, InvoiceTotal
-            FROM invoices
-            WHERE InvoiceId = ? 
-        """, (invoice_id,)) #,כי SQLite מצפה ל־ tuple/ של פרמטרים ? = אבטחה ויציבות
-       
-        row = cursor.fetchone() #Tuple
-        if not row:
-            raise HTTPException(status_code=404, detail="Invoice not found")
-
-        invoice = {
-            "InvoiceId": row[0],
-            "VendorName": row[1],
-            "InvoiceDate": row[2],
-            "BillingAddressRecipient": row[3],
-            "ShippingAddress": row[4],
-            "SubTotal": row[5],
-            "ShippingCost": row[6],
-            "InvoiceTotal": row[7],
-        }
+job_workers = JobWorkerPool(process_job_pdf)
 
-        cursor.execute("""
-            SELECT Description, Name, Quantity, UnitPrice, Amount
-            FROM items
-            WHERE InvoiceId = ?
-            ORDER BY id ASC
-        """, (invoice_id,))
-        items_rows = cursor.fetchall()
 
-        invoice["Items"] = [
-            {
-                "Description": r[0],
-                "Name": r[1],
-                "Quantity": r[2],
-                "UnitPrice": r[3],
-                "Amount": r[4],
-            }
-            for r in items_rows
-        ]
+@app.post("/extract")
+async def extract(file: UploadFile = File(...), no_cache: bool = False,
+                  async_mode: bool = Query(False, alias="async")):
+    status = 500
+    try:
+        with EXTRACT_IN_FLIGHT.track():
+            response = await _extract(file, no_cache, async_mode)
+        status = getattr(response, "status_code", 200)
+        return response
+    except HTTPException as exc:
+        status = exc.status_code
+        raise
+    finally:
+        EXTRACT_REQUESTS.inc(status=status)
+
+
+async def _extract(file: UploadFile, no_cache: bool, async_mode: bool):
+    # (3) 400 / 413 - נבדק על הבייטים הראשונים, לפני שקוראים את כל הקובץ
+    with EXTRACT_STAGE_SECONDS.time(stage="read"):
+        pdf = await spool_upload(file, is_pdf, INVALID_DOCUMENT)
+
+    if async_mode:
+        # מחזירים מיד מזהה job; worker ברקע יעבד את הקובץ
+        job_id = uuid.uuid4().hex
+        await concurrency.db_executor.run(enqueue_job, job_id, file.filename, pdf.read())
+        job_workers.notify()
+        return JSONResponse(
+            status_code=202,
+            content={"jobId": job_id, "status": "queued"},
+            headers={"Location": f"/jobs/{job_id}"},
+        )
 
-        return invoice
+    return await extract_pdf(pdf, no_cache=no_cache)
 
 
-@app.get("/invoices/vendor/{vendor_name}")
-async def invoices_by_vendor(vendor_name: str):
-    invoices = get_invoices_by_vendor(vendor_name)
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    body = {
+        "jobId": job["JobId"],
+        "status": job["Status"],
+        "attempts": job["Attempts"],
+        "createdAt": job["CreatedAt"],
+        "updatedAt": job["UpdatedAt"],
+    }
+    if job["Status"] == "done":
+        body["result"] = job["Result"]
+    elif job["Status"] == "failed":
+        body["statusCode"] = job["StatusCode"]
+        body["error"] = job["Error"]
+    elif job["Error"]:
+        # ממתין לניסיון נוסף אחרי 503
+        body["lastError"] = job["Error"]
+    return body
+
+
+# כמה קבצים מתוך batch נשלחים ל-OCI במקביל, וכמה קבצים / בייטים מותר בבקשה אחת
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(concurrency.OCI_MAX_CONCURRENCY)))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(100 * 1024 * 1024)))
+
+BATCH_TOO_LARGE = "Batch too large. Maximum total size is {} bytes."
+
+# too_large: the file is over MAX_UPLOAD_BYTES and its content was not kept
+BatchFile = namedtuple("BatchFile", "filename content_type content too_large", defaults=(False,))
+
+
+def too_many_files():
+    return HTTPException(status_code=400, detail=f"Too many files in one batch (max {BATCH_MAX_FILES}).")
+
+
+def batch_too_large():
+    return HTTPException(status_code=413, detail=BATCH_TOO_LARGE.format(BATCH_MAX_BYTES))
+
+
+async def _read_upload(upload: UploadFile, limit: int) -> bytes:
+    """Reads at most ``limit + 1`` bytes, so the caller can tell the upload is over ``limit``."""
+    chunks, size = [], 0
+    while size <= limit:
+        chunk = await upload.read(min(uploads.UPLOAD_CHUNK, limit + 1 - size))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+
+def _read_member(archive, info):
+    if info.file_size > uploads.MAX_UPLOAD_BYTES:
+        return BatchFile(info.filename, None, b"", too_large=True)
+    try:
+        with archive.open(info) as member:
+            content = member.read(uploads.MAX_UPLOAD_BYTES + 1)
+    except (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError):
+        content = b""
+    if len(content) > uploads.MAX_UPLOAD_BYTES:
+        return BatchFile(info.filename, None, b"", too_large=True)
+    return BatchFile(info.filename, None, content)
+
+
+async def _expand_batch_upload(upload: UploadFile, max_files: int, max_bytes: int):
+    """A .zip upload becomes one BatchFile per member; anything else is itself.
+
+    ``max_files`` and ``max_bytes`` are what is left of the batch limits. The
+    member count and declared sizes are checked before anything is decompressed.
+    """
+    is_zip = (upload.content_type in ("application/zip", "application/x-zip-compressed")
+              or (upload.filename and upload.filename.lower().endswith(".zip")))
+    if not is_zip:
+        content = await _read_upload(upload, uploads.MAX_UPLOAD_BYTES)
+        if len(content) > uploads.MAX_UPLOAD_BYTES:
+            return [BatchFile(upload.filename, upload.content_type, b"", too_large=True)]
+        if len(content) > max_bytes:
+            raise batch_too_large()
+        return [BatchFile(upload.filename, upload.content_type, content)]
+
+    content = await _read_upload(upload, max_bytes)
+    if len(content) > max_bytes:
+        raise batch_too_large()
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        return [BatchFile(upload.filename, upload.content_type, b"")]
+
+    members = [info for info in archive.infolist() if not info.is_dir()]
+    if len(members) > max_files:
+        raise too_many_files()
+    if sum(i.file_size for i in members if i.file_size <= uploads.MAX_UPLOAD_BYTES) > max_bytes:
+        raise batch_too_large()
+    return [_read_member(archive, info) for info in members]
+
+
+def _persist_batch(done):
+    save_inv_extractions([result for _, result in done])
+    if db_util.EXTRACT_CACHE_ENABLED:
+        for content_hash, result in done:
+            cache_extraction(content_hash, result)
+
+
+@app.post("/extract/batch")
+async def extract_batch(files: List[UploadFile] = File(...), no_cache: bool = False):
+    batch, total = [], 0
+    for upload in files:
+        expanded = await _expand_batch_upload(upload, BATCH_MAX_FILES - len(batch), BATCH_MAX_BYTES - total)
+        batch.extend(expanded)
+        if len(batch) > BATCH_MAX_FILES:
+            raise too_many_files()
+        total += sum(len(f.content) for f in expanded)
+
+    # אותו קובץ פעמיים באותו batch נשלח ל-OCI פעם אחת בלבד
+    hashes = [hashlib.sha256(f.content).hexdigest() for f in batch]
+    # checked per file: a non-PDF upload with a valid file's bytes is still a 400
+    valid = [not f.too_large and bool(f.content) and is_pdf(f, f.content) for f in batch]
+    unique = {}
+    for h, f, ok in zip(hashes, batch, valid):
+        if ok:
+            unique.setdefault(h, f.content)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    fresh = {}
+
+    async def run_one(content_hash, content):
+        cached = await lookup_cached(content_hash, no_cache)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            try:
+                result = await analyze_and_parse(content, queued=True)
+            except HTTPException as exc:
+                return exc
+        fresh[content_hash] = result
+        return result
+
+    outcomes = dict(zip(unique, await asyncio.gather(
+        *(run_one(h, c) for h, c in unique.items())
+    )))
+
+    # כל התוצאות החדשות נשמרות בטרנזקציה אחת
+    done = list(fresh.items())
+    if done:
+        await concurrency.db_executor.run(_persist_batch, done)
+
+    results = []
+    for h, f, ok in zip(hashes, batch, valid):
+        outcome = outcomes[h] if ok else None
+        if f.too_large:
+            results.append({"filename": f.filename, "status": 413,
+                            "error": uploads.too_large().detail})
+        elif outcome is None:
+            results.append({"filename": f.filename, "status": 400, "error": INVALID_DOCUMENT})
+        elif isinstance(outcome, HTTPException):
+            results.append({"filename": f.filename, "status": outcome.status_code,
+                            "error": str(outcome.detail)})
+        else:
+            results.append({"filename": f.filename, "status": 200, "result": outcome})
+
+    succeeded = sum(1 for r in results if r["status"] == 200)
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+@metrics.register_collector
+def _cache_and_queue_metrics():
+    extraction = get_extraction_cache_stats()
+    invoice = invoice_cache.stats()
+    return [
+        ("invoice_extraction_cache_hits_total", "counter", "Extraction cache hits.", extraction["hits"]),
+        ("invoice_extraction_cache_misses_total", "counter", "Extraction cache misses.", extraction["misses"]),
+        ("invoice_extraction_cache_entries", "gauge", "Rows in extraction_cache.", extraction["entries"]),
+        ("invoice_lookup_cache_hits_total", "counter", "Invoice LRU hits.", invoice["hits"]),
+        ("invoice_lookup_cache_misses_total", "counter", "Invoice LRU misses.", invoice["misses"]),
+        ("invoice_oci_executor_pending", "gauge", "OCI calls running or queued.",
+         concurrency.oci_executor.pending),
+        ("invoice_oci_breaker_open", "gauge", "1 while the OCI circuit breaker is not closed.",
+         int(oci_breaker.state != "closed")),
+        ("invoice_oci_breaker_opened_total", "counter", "Times the OCI circuit breaker opened.",
+         oci_breaker.times_opened),
+    ]
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    return {
+        "extraction": get_extraction_cache_stats(),
+        "invoice": invoice_cache.stats(),
+    }
+
+
+VENDOR_PAGE_MAX = int(os.getenv("VENDOR_PAGE_MAX", "1000"))
+SEARCH_PAGE_MAX = int(os.getenv("SEARCH_PAGE_MAX", "100"))
+REVIEW_PAGE_MAX = int(os.getenv("REVIEW_PAGE_MAX", "500"))
+
+
+@app.get('/invoice/{invoice_id}')
+def get_invoice_by_id(invoice_id: str, request: Request):
+    # LRU לפני SQLite; ETag מאפשר ללקוח לדלג על ה-body אם לא השתנה
+    db_util.sync_invoice_cache()
+    entry = invoice_cache.get(invoice_id)
+    if entry is None:
+        version = invoice_cache.version
+        invoice = load_invoice(invoice_id)
+        etag = '"%s"' % hashlib.sha1(
+            json.dumps(invoice, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        entry = (invoice, etag)
+        invoice_cache.put(invoice_id, entry, version)
+
+    invoice, etag = entry
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=invoice, headers={"ETag": etag})
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or any(t.removeprefix("W/") == etag for t in candidates)
+
+
+def load_invoice(invoice_id: str):
+    with DB_QUERY_SECONDS.time(query="get_invoice_by_id"):
+        invoice = repository.get(invoice_id)
+    if invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice
+
+
+def encode_cursor(invoice):
+    # אותו parse כמו בשמירה, כך שהמפתח שווה ל-InvoiceDateISO של השורה
+    key = [normalize_date(invoice["InvoiceDate"]), invoice["InvoiceId"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        invoice_date, invoice_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return invoice_date, str(invoice_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
-    if not invoices:
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+
+@app.get("/invoices/vendor/{vendor_name}")
+def invoices_by_vendor(vendor_name: str,
+                       limit: Optional[int] = Query(None, ge=1, le=VENDOR_PAGE_MAX),
+                       after: Optional[str] = None,
+                       date_from: Optional[str] = Query(None, alias="from", pattern=DATE_PATTERN),
+                       date_to: Optional[str] = Query(None, alias="to", pattern=DATE_PATTERN)):
+    total = count_invoices_by_vendor(vendor_name, date_from, date_to)
+
+    if not total and not (date_from or date_to):
         return {
             "VendorName": "Unknown Vendor",
             "TotalInvoices": 0,
             "invoices": []
         }
 
-    return {
+    key = decode_cursor(after) if after else None
+    invoices = get_invoices_by_vendor(vendor_name, limit=limit, after=key,
+                                      date_from=date_from, date_to=date_to)
+
+    body = {
         "VendorName": vendor_name,
-        "TotalInvoices": len(invoices),
+        "TotalInvoices": total,
         "invoices": invoices
     }
+    if limit is not None:
+        body["nextCursor"] = encode_cursor(invoices[-1]) if invoices and len(invoices) == limit else None
+    return body
+
+
+@app.get("/invoices/vendor/{vendor_name}/stream")
+def stream_invoices_by_vendor(vendor_name: str, after: Optional[str] = None,
+                              date_from: Optional[str] = Query(None, alias="from", pattern=DATE_PATTERN),
+                              date_to: Optional[str] = Query(None, alias="to", pattern=DATE_PATTERN)):
+    """NDJSON, one invoice per line, read straight from the DB cursor."""
+    key = decode_cursor(after) if after else None
+    lines = iter_invoices_by_vendor(vendor_name, key, date_from=date_from, date_to=date_to)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+# סכומים מטבלת vendor_monthly_totals - לא עוברים על החשבוניות עצמן
+MONTH_PATTERN = r"^\d{4}-\d{2}$"
+
+
+@app.get("/analytics/vendors")
+def vendor_totals(from_month: Optional[str] = Query(None, alias="from", pattern=MONTH_PATTERN),
+                  to_month: Optional[str] = Query(None, alias="to", pattern=MONTH_PATTERN)):
+    require_db_path()
+    with DB_QUERY_SECONDS.time(query="vendor_totals"):
+        return {"vendors": get_vendor_totals(from_month, to_month)}
+
+
+@app.get("/analytics/monthly")
+def monthly_totals(from_month: Optional[str] = Query(None, alias="from", pattern=MONTH_PATTERN),
+                   to_month: Optional[str] = Query(None, alias="to", pattern=MONTH_PATTERN)):
+    require_db_path()
+    with DB_QUERY_SECONDS.time(query="monthly_totals"):
+        return {"months": get_monthly_totals(None, from_month, to_month)}
+
+
+@app.get("/analytics/vendors/{vendor_name}/monthly")
+def vendor_monthly_totals(vendor_name: str,
+                          from_month: Optional[str] = Query(None, alias="from", pattern=MONTH_PATTERN),
+                          to_month: Optional[str] = Query(None, alias="to", pattern=MONTH_PATTERN)):
+    require_db_path()
+    with DB_QUERY_SECONDS.time(query="vendor_monthly_totals"):
+        months = get_monthly_totals(vendor_name, from_month, to_month)
+    return {"vendorName": vendor_name, "months": months}
+
+
+@app.get("/analytics/confidence")
+def confidence_stats():
+    """Per-field dataConfidence statistics, kept up to date by every save."""
+    require_db_path()
+    with DB_QUERY_SECONDS.time(query="confidence_stats"):
+        return {"fields": get_confidence_stats()}
+
+
+@app.get("/export/{table}")
+def export_table(table: str, since: int = Query(0, ge=0)):
+    """NDJSON dump of a table for invoices with ChangeSeq > ``since``.
+
+    The X-Export-Watermark header is the snapshot's highest ChangeSeq; pass
+    it as ``since`` next time to get only what changed.
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    require_db_path()
+    snapshot = ExportSnapshot()
+
+    def lines():
+        try:
+            yield from snapshot.ndjson_chunks(table, since)
+        finally:
+            snapshot.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"X-Export-Watermark": str(snapshot.until)})
+
+
+@app.get("/search")
+def search(q: str = Query(..., min_length=1, max_length=200),
+           limit: int = Query(20, ge=1, le=SEARCH_PAGE_MAX),
+           offset: int = Query(0, ge=0)):
+    """Full-text search over recipient, address, vendor and line item text (FTS5, bm25 order)."""
+    require_db_path()
+    with DB_QUERY_SECONDS.time(query="search"):
+        results, ranked = search_invoices(q, limit=limit, offset=offset)
+    return {
+        "query": q,
+        "ranked": ranked,
+        "results": results,
+        "nextOffset": offset + limit if len(results) == limit else None,
+    }
+
 
+def save_inv_extraction(result):
+    repository.save([result])
 
-def get_invoices_by_vendor(vendor_name: str): 
-    with get_db() as conn:
-        cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT InvoiceId
-            FROM invoices
-            WHERE VendorName = ?
-            ORDER BY InvoiceDate ASC
-        """, (vendor_name,))
-        invoice_ids = [r[0] for r in cursor.fetchall()]
+def save_inv_extractions(results):
+    """Persist many extraction results in one write (per shard)."""
+    repository.save(results)
 
-    invoices = []
-    for inv_id in invoice_ids:
-        inv = get_invoice_by_id(inv_id)
-        if inv:
-            invoices.append(inv)
 
-    return invoices
+@app.get("/review")
+def review_queue(limit: int = Query(50, ge=1, le=REVIEW_PAGE_MAX), after: Optional[str] = None):
+    """Invoices with a field below its review threshold, least confident first."""
+    require_db_path()
+    key = decode_review_cursor(after) if after else None
+    with DB_QUERY_SECONDS.time(query="review_queue"):
+        entries = get_review_queue(limit=limit, after=key)
+        total = count_review_queue()
+    return {
+        "total": total,
+        "invoices": entries,
+        "nextCursor": encode_review_cursor(entries[-1]) if len(entries) == limit else None,
+    }
+
+
+@app.delete("/review/{invoice_id}", status_code=204)
+def resolve_review_entry(invoice_id: str):
+    require_db_path()
+    if not resolve_review(invoice_id):
+        raise HTTPException(status_code=404, detail="Invoice not in review queue")
+    return Response(status_code=204)
+
+
+def encode_review_cursor(entry):
+    key = [entry["MinConfidence"], entry["InvoiceId"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_review_cursor(cursor: str):
+    try:
+        min_confidence, invoice_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(min_confidence), str(invoice_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def count_invoices_by_vendor(vendor_name: str, date_from=None, date_to=None):
+    return repository.count_by_vendor(vendor_name, date_from, date_to)
+
+
+def get_invoices_by_vendor(vendor_name: str, limit=None, after=None, date_from=None, date_to=None):
+    with DB_QUERY_SECONDS.time(query="get_invoices_by_vendor"):
+        return repository.list_by_vendor(vendor_name, limit=limit, after=after,
+                                          date_from=date_from, date_to=date_to)
+
+
+def iter_invoices_by_vendor(vendor_name: str, after=None, date_from=None, date_to=None):
+    """Yield NDJSON lines; holds at most one invoice and one fetch chunk in memory."""
+    for invoice in repository.iter_by_vendor(vendor_name, after, date_from=date_from, date_to=date_to):
+        yield json.dumps(invoice) + "\n"
+
+
+def check_workers(workers):
+    """Several workers share one store only through the writer process, i.e. the sqlite backend."""
+    if workers > 1 and not repository.uses_db_path:
+        raise RuntimeError(f"APP_WORKERS={workers} needs STORAGE_BACKEND=sqlite, not {repository.name}")
+
+
+def serve_workers(workers):  # pragma: no cover
+    """Several uvicorn workers sharing one writer process.
+
+    Schema setup and the requeue of interrupted jobs run once here, before
+    any worker starts.
+    """
+    import socket
+    import uvicorn
+    from uvicorn.supervisors import Multiprocess
+    check_workers(workers)
+    init_db()
+    repository.init()
+    db_util.requeue_running_jobs()
+    config = uvicorn.Config("app:app", host=APP_HOST, port=APP_PORT, workers=workers)
+    sock = config.bind_socket()
+    # asyncio sets TCP_NODELAY only on sockets it created; the workers get this one, and
+    # without it each keep-alive response waits ~40 ms for the client's delayed ACK
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    with writer.writer_process():
+        Multiprocess(config, sockets=[sock]).run()
 
 
 if __name__ == "__main__": # pragma: no cover
     import uvicorn 
-    init_db()
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    if APP_WORKERS > 1:
+        serve_workers(APP_WORKERS)
+    else:
+        uvicorn.run(app, host=APP_HOST, port=APP_PORT)
@@ -0,0 +1,185 @@
+"""Bulk load of stored extraction results ({confidence, data, dataConfidence}).
+
+    python backfill.py json_output/all_invoices_pretty.json archive.ndjson [--batch 10000]
+
+Input is a JSON array (like json_output/all_invoices_pretty.json) or NDJSON,
+read incrementally - a file is never loaded whole. Records are written in
+batches of BACKFILL_BATCH, one transaction each, and the byte offset after
+the batch is stored in backfill_checkpoints in that same transaction. An
+interrupted run started again with the same file continues from there.
+
+By default the secondary indexes (db_util.DEFERRED_INDEXES) are dropped for
+the load and built once at the end, and invoice_search / vendor_monthly_totals
+are rebuilt once instead of being maintained per invoice. Until the run
+finishes, vendor listings and /search are slow or incomplete, so use
+--online when loading into a database the service is using.
+"""
+import argparse
+import codecs
+import json
+import os
+import sys
+import time
+
+import db_util
+import storage
+from db_util import (
+    init_db, get_backfill_checkpoint, set_backfill_checkpoint, save_backfill_batch,
+    drop_deferred_indexes, create_deferred_indexes, rebuild_derived_tables,
+)
+
+
+BACKFILL_BATCH = int(os.getenv("BACKFILL_BATCH", "10000"))
+READ_CHUNK = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class NdjsonReader:
+    """Records of an NDJSON file, starting at byte ``start``; ``position`` is the
+    offset just past the last record returned."""
+
+    def __init__(self, f, start=0):
+        self.f = f
+        self.f.seek(start)
+        self.position = start
+
+    def __iter__(self):
+        while True:
+            line = self.f.readline()
+            if not line:
+                return
+            self.position += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+
+class JsonArrayReader:
+    """Elements of a top-level JSON array, parsed one at a time from a buffered read.
+
+    ``start`` may be 0 or any ``position`` this reader reported before, since
+    the separators between elements ("[", ",", whitespace) are skipped.
+    """
+
+    _SKIP = " \t\r\n,["
+
+    def __init__(self, f, start=0):
+        self.f = f
+        self.f.seek(start)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.base = start  # byte offset of buf[0]
+        self.buf = ""
+        self.pos = 0
+
+    @property
+    def position(self):
+        return self.base + len(self.buf[:self.pos].encode("utf-8"))
+
+    def _fill(self):
+        """Drop the parsed prefix and read another chunk; False at end of file."""
+        self.base = self.position
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        chunk = self.f.read(READ_CHUNK)
+        self.buf += self.utf8.decode(chunk, final=not chunk)
+        return bool(chunk)
+
+    def _truncated(self, exc):
+        """Whether raw_decode failed only because the element runs past the buffer."""
+        if exc.msg.startswith("Unterminated string"):
+            return True  # no closing quote before the end of the buffer
+        # a cut-off literal ("tru") or \uXXXX escape is reported where it starts
+        return exc.pos >= len(self.buf) - 6
+
+    def __iter__(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self._SKIP:
+                self.pos += 1
+            if self.pos == len(self.buf):
+                if not self._fill():
+                    return
+                continue
+            if self.buf[self.pos] == "]":
+                return
+            try:
+                record, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as exc:
+                # only an element cut off by the end of the buffer continues in the next
+                # chunk; anything else is malformed, and reading on would load the whole file
+                if not (self._truncated(exc) and self._fill()):
+                    offset = self.base + len(self.buf[:exc.pos].encode("utf-8"))
+                    raise ValueError(f"invalid JSON at byte {offset}: {exc.msg}") from exc
+                continue
+            self.pos = end
+            yield record
+
+
+def open_reader(f, start=0):
+    """JsonArrayReader if the file starts with "[", else NdjsonReader."""
+    head = f.read(64).lstrip()
+    reader = JsonArrayReader if head.startswith(b"[") else NdjsonReader
+    return reader(f, start)
+
+
+def load_file(path, batch_size=None, deferred=True, restart=False, log=print):
+    """Load one file; returns the number of records written by this run."""
+    source = os.path.abspath(path)
+    checkpoint = None if restart else get_backfill_checkpoint(source)
+    if checkpoint and checkpoint[2]:
+        log(f"{path}: already loaded ({checkpoint[1]} records), skipping")
+        return 0
+    start, records = (checkpoint[0], checkpoint[1]) if checkpoint else (0, 0)
+    if start:
+        log(f"{path}: resuming at byte {start} after {records} records")
+
+    batch_size = batch_size or BACKFILL_BATCH
+    written = 0
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        reader = open_reader(f, start)
+        batch = []
+        for record in reader:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                written += save_backfill_batch(batch, source, reader.position, records + len(batch), deferred)
+                records += len(batch)
+                batch = []
+                elapsed = time.perf_counter() - t0
+                log(f"{path}: {records} records ({written / elapsed:.0f}/s)")
+        if batch:
+            written += save_backfill_batch(batch, source, reader.position, records + len(batch), deferred)
+            records += len(batch)
+        set_backfill_checkpoint(source, reader.position, records, done=True)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load stored extraction results into invoices.db")
+    parser.add_argument("paths", nargs="+", help="JSON array or NDJSON files")
+    parser.add_argument("--batch", type=int, default=BACKFILL_BATCH, help="records per transaction")
+    parser.add_argument("--online", action="store_true",
+                        help="keep indexes, search and totals up to date during the load")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    parser.add_argument("--db", help=f"database file (default {db_util.DB_PATH})")
+    args = parser.parse_args(argv)
+    if storage.STORAGE_BACKEND != "sqlite":
+        parser.error(f"STORAGE_BACKEND={storage.STORAGE_BACKEND}: invoices are not in the sqlite database")
+
+    if args.db:
+        db_util.DB_PATH = args.db
+    init_db()
+    deferred = not args.online
+    t0 = time.perf_counter()
+    if deferred:
+        drop_deferred_indexes()
+    written = sum(load_file(p, args.batch, deferred, args.restart) for p in args.paths)
+    if deferred:
+        print("building indexes, search index and totals")
+        create_deferred_indexes()
+        rebuild_derived_tables()
+    elapsed = time.perf_counter() - t0
+    print(f"{written} invoices in {elapsed:.1f} s ({written / elapsed * 3600:.0f}/hour)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""backfill.py throughput: deferred-index bulk load vs. the online (per-invoice index) mode.
+
+    python benchmarks/bench_backfill.py --invoices 200000 --items 3
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backfill  # noqa: E402
+import db_util  # noqa: E402
+
+
+def write_archive(path, invoices, items):
+    with open(path, "w") as f:
+        for n in range(invoices):
+            f.write(json.dumps({"confidence": 1.0, "dataConfidence": {"InvoiceId": 0.99}, "data": {
+                "InvoiceId": f"{n:08d}", "VendorName": f"Vendor {n % 50}", "InvoiceDate": "Mar 06 2012",
+                "BillingAddressRecipient": "Aaron Bergman",
+                "ShippingAddress": "98103, Seattle, Washington, United States",
+                "SubTotal": 53.82, "ShippingCost": 4.29, "InvoiceTotal": 58.11,
+                "Items": [{"Description": f"Newell {k} Art, Office Supplies, OFF-AR-{5000 + k}",
+                           "Name": f"Newell {k} Art", "Quantity": 3, "UnitPrice": 17.94, "Amount": 53.82}
+                          for k in range(items)],
+            }}) + "\n")
+
+
+def run(tmp, archive, online):
+    db_util.close_db()
+    db_util.DB_PATH = os.path.join(tmp, f"bench-{online}.db")
+    argv = [archive, "--batch", "10000"] + (["--online"] if online else [])
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        backfill.main(argv)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=200000)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "archive.ndjson")
+        write_archive(archive, args.invoices, args.items)
+        online = run(tmp, archive, online=True)
+        deferred = run(tmp, archive, online=False)
+        db_util.close_db()
+
+    for label, elapsed in (("online", online), ("deferred indexes", deferred)):
+        print(f"  {label:18} {elapsed:7.1f} s  {args.invoices / elapsed * 3600 / 1e6:6.2f} M invoices/hour")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Concurrent read/write throughput: connect-per-call rollback journal vs pooled WAL.
+
+    python benchmarks/bench_db_concurrency.py --readers 8 --seconds 5
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_util  # noqa: E402
+
+
+@contextmanager
+def legacy_get_db():
+    """The original db_util.get_db: fresh connection, default journal, no busy timeout."""
+    conn = sqlite3.connect(db_util.DB_PATH)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def invoice(n):
+    return {"data": {
+        "InvoiceId": str(n), "VendorName": "SuperStore", "InvoiceDate": "2012-03-06",
+        "SubTotal": 53.82, "ShippingCost": 4.29, "InvoiceTotal": 58.11,
+        "Items": [{"Description": "Newell 330 Art", "Name": "Newell 330 Art",
+                   "Quantity": 3, "UnitPrice": 17.94, "Amount": 53.82}] * 5,
+    }}
+
+
+def read_one(get_db, invoice_id):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM invoices WHERE InvoiceId = ?", (invoice_id,))
+        cursor.fetchone()
+        cursor.execute("SELECT * FROM items WHERE InvoiceId = ? ORDER BY id", (invoice_id,))
+        cursor.fetchall()
+
+
+def write_one(get_db, n):
+    with get_db() as conn:
+        db_util._write_extractions(conn.cursor(), [invoice(n)])
+
+
+def run(get_db, readers, seconds, seed):
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader(k):
+        n = reads = errors = 0
+        while not stop.is_set():
+            try:
+                read_one(get_db, str((k * 7919 + n) % seed))
+                reads += 1
+            except sqlite3.OperationalError:
+                errors += 1
+            n += 1
+        with lock:
+            counts["reads"] += reads
+            counts["errors"] += errors
+
+    def writer():
+        n = seed
+        writes = errors = 0
+        while not stop.is_set():
+            try:
+                write_one(get_db, n)
+                writes += 1
+            except sqlite3.OperationalError:
+                errors += 1
+            n += 1
+        with lock:
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != "errors" else v for k, v in counts.items()}
+
+
+def bench(name, get_db, tmp, args):
+    db_util.DB_PATH = os.path.join(tmp, f"{name}.db")
+    db_util.init_db()
+    db_util.close_db()
+    if name == "legacy":
+        # init_db switched the file to WAL; put it back on the rollback journal
+        conn = sqlite3.connect(db_util.DB_PATH)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+    with get_db() as conn:
+        db_util._write_extractions(conn.cursor(), [invoice(n) for n in range(args.seed)])
+
+    result = run(get_db, args.readers, args.seconds, args.seed)
+    print(f"  {name:8s} reads/s {result['reads']:10.0f}   writes/s {result['writes']:8.0f}"
+          f"   lock errors {result['errors']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{args.readers} reader threads + 1 writer, {args.seconds}s each")
+    with tempfile.TemporaryDirectory() as tmp:
+        before = bench("legacy", legacy_get_db, tmp, args)
+        after = bench("pooled", db_util.get_db, tmp, args)
+        db_util.close_db()
+    print(f"  read throughput {after['reads'] / max(before['reads'], 1):.1f}x, "
+          f"write throughput {after['writes'] / max(before['writes'], 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Throughput of export.py's NDJSON writer vs. per-row json.dumps, on a synthetic DB.
+
+    python benchmarks/bench_export.py --invoices 200000 --items 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_util  # noqa: E402
+import export  # noqa: E402
+
+
+def seed(invoices, items, batch=5000):
+    for start in range(0, invoices, batch):
+        db_util.save_inv_extractions([{"data": {
+            "InvoiceId": str(n), "VendorName": "SuperStore", "InvoiceDate": "Mar 06 2012",
+            "BillingAddressRecipient": "Aaron Bergman",
+            "ShippingAddress": "98103, Seattle, Washington, United States",
+            "SubTotal": 53.82, "ShippingCost": 4.29, "InvoiceTotal": 58.11,
+            "Items": [{"Description": f"Newell {k} Art, Office Supplies, OFF-AR-{5000 + k}",
+                       "Name": f"Newell {k} Art", "Quantity": 3, "UnitPrice": 17.94, "Amount": 53.82}
+                      for k in range(items)],
+        }} for n in range(start, min(start + batch, invoices))])
+
+
+def python_ndjson(snapshot, table, path):
+    """The same rows serialised in Python, one json.dumps per row."""
+    names = [name for name, _ in export.EXPORT_TABLES[table]]
+    rows = 0
+    with open(path, "w", encoding="utf-8", buffering=1024 * 1024) as f:
+        for chunk in snapshot.row_chunks(table):
+            f.write("".join(json.dumps(dict(zip(names, row))) + "\n" for row in chunk))
+            rows += len(chunk)
+    return rows
+
+
+def timed(label, fn, snapshot, path):
+    t0 = time.perf_counter()
+    rows = fn(snapshot, "items", path)
+    elapsed = time.perf_counter() - t0
+    size = os.path.getsize(path) / 1e6
+    print(f"  {label:24} {rows / elapsed / 1e3:8.0f} k rows/s  {size / elapsed:7.1f} MB/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=200000)
+    parser.add_argument("--items", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_util.DB_PATH = os.path.join(tmp, "bench.db")
+        db_util.init_db()
+        seed(args.invoices, args.items)
+        print(f"items table: {args.invoices * args.items} rows")
+
+        with export.ExportSnapshot() as snapshot:
+            legacy = timed("json.dumps per row", python_ndjson, snapshot, os.path.join(tmp, "a.ndjson"))
+            new = timed("export.write_ndjson", export.write_ndjson, snapshot, os.path.join(tmp, "b.ndjson"))
+        print(f"  ({legacy / new:.1f}x faster)")
+        db_util.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Micro-benchmark: local template extraction of the sample PDFs.
+
+    python benchmarks/bench_local_extract.py --repeat 50
+"""
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from extractors import extract_local  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(ROOT, "invoices_sample", "*.pdf"))):
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        name, result = extract_local(pdf_bytes)
+        assert result is not None, f"{path} was not handled locally"
+        best = min(timeit.repeat(lambda: extract_local(pdf_bytes), number=1, repeat=args.repeat))
+        print(f"  {os.path.basename(path):40s} {name:12s} {best * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
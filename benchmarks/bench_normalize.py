@@ -0,0 +1,111 @@
+"""Micro-benchmark: original getattr/re.sub parse loop vs normalize.normalize_document.
+
+    python benchmarks/bench_normalize.py --items 5000
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+from types import SimpleNamespace as NS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalize import normalize_document  # noqa: E402
+
+
+def legacy_clean_money(value):
+    if not value:
+        return None
+    v = re.sub(r"[^\d.]", "", value)
+    return float(v) if v else None
+
+
+def legacy_parse(document):
+    """The parse loop as it was inlined in app.extract."""
+    data = {}
+    data_confidence = {}
+    confidence = 0.0
+    for page in (document.pages or []):
+        for field in (getattr(page, "document_fields", None) or []):
+            label = getattr(field, "field_label", None)
+            field_name = getattr(label, "name", None)
+            field_confidence = getattr(label, "confidence", None)
+            field_value = getattr(field, "field_value", None)
+            field_value_text = getattr(field_value, "text", None)
+            if field.field_type == "LINE_ITEM_GROUP":
+                items = []
+                for row in getattr(field_value, "items", None) or []:
+                    item = {"Description": None, "Name": None, "Quantity": None,
+                            "UnitPrice": None, "Amount": None}
+                    cols = getattr(getattr(row, "field_value", None), "items", None) or []
+                    for c in cols:
+                        k = getattr(getattr(c, "field_label", None), "name", None)
+                        v_obj = getattr(c, "field_value", None)
+                        v = getattr(v_obj, "text", None) if v_obj else None
+                        if k in ("UnitPrice", "Amount"):
+                            v = legacy_clean_money(v)
+                        elif k == "Quantity":
+                            v = int(legacy_clean_money(v)) if legacy_clean_money(v) is not None else None
+                        if k in item:
+                            item[k] = v
+                    items.append(item)
+                data["Items"] = items
+            elif field_name:
+                v = field_value_text
+                money_fields = {"SubTotal", "ShippingCost", "InvoiceTotal", "AmountDue"}
+                if field_name in money_fields and v:
+                    v = legacy_clean_money(v)
+                data[field_name] = v
+                data_confidence[field_name] = field_confidence
+    if document.detected_document_types:
+        for doc_type in document.detected_document_types:
+            confidence = doc_type.confidence if doc_type.confidence is not None else 0.0
+    return confidence, data, data_confidence
+
+
+def col(name, text):
+    return NS(field_label=NS(name=name, confidence=None), field_value=NS(text=text))
+
+
+def synthetic_document(items):
+    rows = [
+        NS(field_value=NS(items=[
+            col("Description", f"Newell {n} Art, Office Supplies, OFF-AR-{5000 + n}"),
+            col("Name", f"Newell {n} Art"),
+            col("Quantity", str(n % 9 + 1)),
+            col("UnitPrice", f"${n % 100}.{n % 97:02d}" if n % 4 == 0 else f"{n % 100}.{n % 97:02d}"),
+            col("Amount", f"{n % 1000}.{n % 89:02d}"),
+        ]))
+        for n in range(items)
+    ]
+    header = [
+        NS(field_type="KEY_VALUE", field_label=NS(name=name, confidence=0.99), field_value=NS(text=text))
+        for name, text in [("VendorName", "SuperStore"), ("InvoiceId", "36259"),
+                           ("InvoiceDate", "Mar 06 2012"), ("SubTotal", "$53.82"),
+                           ("ShippingCost", "4.29"), ("InvoiceTotal", "58.11"), ("AmountDue", "58.11")]
+    ]
+    group = NS(field_type="LINE_ITEM_GROUP", field_label=NS(name="Items", confidence=None),
+               field_value=NS(items=rows))
+    return NS(pages=[NS(document_fields=header + [group])],
+              detected_document_types=[NS(document_type="INVOICE", confidence=1.0)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    document = synthetic_document(args.items)
+    assert legacy_parse(document) == normalize_document(document), "outputs differ"
+
+    legacy = min(timeit.repeat(lambda: legacy_parse(document), number=1, repeat=args.repeat))
+    new = min(timeit.repeat(lambda: normalize_document(document), number=1, repeat=args.repeat))
+    print(f"{args.items} line items")
+    print(f"  legacy loop:        {legacy * 1000:8.2f} ms")
+    print(f"  normalize_document: {new * 1000:8.2f} ms   ({legacy / new:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Latency of GET /search's query (db_util.search_invoices) on a large synthetic index.
+
+    python benchmarks/bench_search.py --invoices 200000 --items 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_util  # noqa: E402
+
+PRODUCTS = ["Newell {n} Art, Office Supplies, OFF-AR-{sku}",
+            "Eldon Base for stackable storage shelf, Office Supplies, OFF-ST-{sku}",
+            "Global Deluxe Stacking Chair, Furniture, FUR-CH-{sku}",
+            "Xerox {n} Paper, Office Supplies, OFF-PA-{sku}",
+            "Apple Smart Phone, Technology, TEC-PH-{sku}"]
+NAMES = ["Aaron Bergman", "Brosina Hoffman", "Darren Powers", "Claire Gute", "Sean O'Donnell"]
+CITIES = ["98103, Seattle, Washington", "90032, Los Angeles, California", "77095, Houston, Texas",
+          "42420, Henderson, Kentucky", "33311, Fort Lauderdale, Florida"]
+
+
+def seed(invoices, items, batch=5000):
+    rnd = random.Random(1)
+    for start in range(0, invoices, batch):
+        results = []
+        for n in range(start, min(start + batch, invoices)):
+            results.append({"data": {
+                "InvoiceId": str(n), "VendorName": "SuperStore", "InvoiceDate": "Mar 06 2012",
+                "BillingAddressRecipient": f"{rnd.choice(NAMES)} {n}",
+                "ShippingAddress": rnd.choice(CITIES),
+                "Items": [{"Description": rnd.choice(PRODUCTS).format(n=rnd.randrange(1000),
+                                                                      sku=rnd.randrange(10 ** 8)),
+                           "Quantity": 1} for _ in range(items)],
+            }})
+        db_util.save_inv_extractions(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=200000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = ["OFF-AR-5309", "OFF-PA-123", "Bergman 4711", "stacking chair houston", "Henderson", "smart phone"]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_util.DB_PATH = os.path.join(tmp, "bench.db")
+        db_util.init_db()
+        t0 = time.perf_counter()
+        seed(args.invoices, args.items)
+        print(f"{args.invoices} invoices x {args.items} items, indexed in {time.perf_counter() - t0:.1f} s")
+
+        for q in queries:
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                results, ranked = db_util.search_invoices(q, limit=20)
+                times.append(time.perf_counter() - t0)
+            print(f"  {q!r:26} {len(results):3} results{'' if ranked else ' (by rowid)'}   "
+                  f"p50 {statistics.median(times) * 1000:7.2f} ms   max {max(times) * 1000:7.2f} ms")
+        db_util.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Save throughput of the storage backends with several concurrent writer processes.
+
+Each writer saves --batch invoices per call, as /extract/batch does. With one
+SQLite file every save waits for the same write lock; sharded spreads them
+over --shards files.
+
+    python benchmarks/bench_storage.py --writers 4 --invoices 20000 --batch 10 --shards 4 [--key vendor]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_util  # noqa: E402
+import storage  # noqa: E402
+
+
+def invoice(n, batch):
+    return {"data": {
+        "InvoiceId": f"{n:08d}", "VendorName": f"Vendor {n // batch % 50}", "InvoiceDate": "Mar 06 2012",
+        "BillingAddressRecipient": "Aaron Bergman",
+        "ShippingAddress": "98103, Seattle, Washington, United States",
+        "SubTotal": 53.82, "ShippingCost": 4.29, "InvoiceTotal": 58.11,
+        "Items": [{"Description": f"Item {k}", "Name": f"Item {k}", "Quantity": 3,
+                   "UnitPrice": 17.94, "Amount": 53.82} for k in range(3)],
+    }}
+
+
+def make(backend, tmp, shards, key):
+    if backend == "memory":
+        return storage.MemoryRepository()
+    base = os.path.join(tmp, f"{backend}.db")
+    if backend == "sqlite":
+        return storage.SqliteRepository(base)
+    return storage.ShardedSqliteRepository(storage.shard_paths(shards, base), key)
+
+
+def writer(repo, numbers, batch):
+    for start in range(0, len(numbers), batch):
+        repo.save([invoice(n, batch) for n in numbers[start:start + batch]])
+    db_util.close_db()
+
+
+def run(backend, tmp, args):
+    repo = make(backend, tmp, args.shards, args.key)
+    repo.init()
+    db_util.close_db()
+    numbers = list(range(args.invoices))
+    if backend == "memory":  # in-process only: one writer
+        t0 = time.perf_counter()
+        writer(repo, numbers, args.batch)
+        return time.perf_counter() - t0
+    # writer w takes every writers-th run of ``batch`` numbers, so a batch has one vendor
+    runs = [numbers[i:i + args.batch] for i in range(0, len(numbers), args.batch)]
+    procs = [multiprocessing.Process(target=writer, args=(repo, sum(runs[w::args.writers], []), args.batch))
+             for w in range(args.writers)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--key", choices=("invoice", "vendor"), default="invoice")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.writers} writer processes, {args.invoices} invoices, "
+          f"{args.batch} per save")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("memory", "sqlite", "sharded"):
+            elapsed = run(backend, tmp, args)
+            print(f"  {backend:8} {elapsed:7.2f} s  {args.invoices / elapsed:9.0f} invoices/s")
+
+
+if __name__ == "__main__":
+    main()
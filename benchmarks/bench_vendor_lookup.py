@@ -0,0 +1,79 @@
+"""Compare the old per-invoice vendor lookup (N+1 queries) with the set-based one.
+
+    python benchmarks/bench_vendor_lookup.py --invoices 5000 --items 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_util  # noqa: E402
+import app  # noqa: E402
+
+
+def legacy_get_invoices_by_vendor(vendor_name):
+    """The pre-optimisation implementation: one id query, then a per-invoice lookup per row."""
+    with db_util.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT InvoiceId
+            FROM invoices
+            WHERE VendorName = ?
+            ORDER BY InvoiceDate ASC
+        """, (vendor_name,))
+        invoice_ids = [r[0] for r in cursor.fetchall()]
+
+    return [app.load_invoice(inv_id) for inv_id in invoice_ids]
+
+
+def seed(invoices, items, vendor):
+    results = []
+    for n in range(invoices):
+        results.append({"data": {
+            "InvoiceId": f"{vendor}-{n}",
+            "VendorName": vendor,
+            "InvoiceDate": f"2012-{n % 12 + 1:02d}-{n % 28 + 1:02d}",
+            "BillingAddressRecipient": "Aaron Bergman",
+            "ShippingAddress": "98103, Seattle, Washington, United States",
+            "SubTotal": 53.82, "ShippingCost": 4.29, "InvoiceTotal": 58.11,
+            "Items": [{"Description": f"Item {k}", "Name": f"Item {k}", "Quantity": 3,
+                       "UnitPrice": 17.94, "Amount": 53.82} for k in range(items)],
+        }})
+    db_util.save_inv_extractions(results)
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_util.DB_PATH = os.path.join(tmp, "bench.db")
+        db_util.init_db()
+        seed(args.invoices, args.items, "BenchVendor")
+
+        legacy_time, legacy = timed(legacy_get_invoices_by_vendor, "BenchVendor")
+        new_time, new = timed(app.get_invoices_by_vendor, "BenchVendor")
+
+    assert legacy == new, "set-based lookup returned different invoices"
+    print(f"{args.invoices} invoices x {args.items} items")
+    print(f"  per-invoice (N+1): {legacy_time * 1000:9.1f} ms")
+    print(f"  set-based:         {new_time * 1000:9.1f} ms   ({legacy_time / new_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Read throughput of GET /invoice/{id} against `python app.py` with 1..N workers.
+
+Starts the real server (APP_WORKERS=n, so n > 1 also runs the writer process)
+on a seeded database and drives it from --clients keep-alive client processes.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 16 --seconds 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_util  # noqa: E402
+
+
+def seed(invoices, items=3, batch=5000):
+    for start in range(0, invoices, batch):
+        db_util.save_inv_extractions([{"data": {
+            "InvoiceId": str(n), "VendorName": "SuperStore", "InvoiceDate": "Mar 06 2012",
+            "BillingAddressRecipient": "Aaron Bergman",
+            "ShippingAddress": "98103, Seattle, Washington, United States",
+            "SubTotal": 53.82, "ShippingCost": 4.29, "InvoiceTotal": 58.11,
+            "Items": [{"Description": f"Item {k}", "Name": f"Item {k}", "Quantity": 3,
+                       "UnitPrice": 17.94, "Amount": 53.82} for k in range(items)],
+        }} for n in range(start, min(start + batch, invoices))])
+
+
+def client(port, invoices, seconds, counts):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    rnd = random.Random(os.getpid())
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        conn.request("GET", f"/invoice/{rnd.randrange(invoices)}")
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+    counts.put(done)
+
+
+def wait_ready(server, workers):
+    """Block until every worker has logged its startup (uvicorn logs to stderr)."""
+    started = 0
+    for line in server.stderr:
+        if b"Application startup complete" in line:
+            started += 1
+            if started == workers:
+                # keep draining so the server never blocks on a full pipe
+                threading.Thread(target=server.stderr.read, daemon=True).start()
+                return
+    raise RuntimeError("server did not start")
+
+
+def run(workers, db_path, port, args):
+    env = dict(os.environ, APP_WORKERS=str(workers), APP_PORT=str(port), APP_HOST="127.0.0.1",
+               DB_PATH=db_path, LOCAL_EXTRACT_ENABLED="0")
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_ready(server, workers)
+        counts = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(port, args.invoices, args.seconds, counts))
+                   for _ in range(args.clients)]
+        for c in clients:
+            c.start()
+        total = sum(counts.get() for _ in clients)
+        for c in clients:
+            c.join()
+        return total / args.seconds
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_util.DB_PATH = os.path.join(tmp, "bench.db")
+        db_util.init_db()
+        seed(args.invoices)
+        db_util.close_db()
+
+        print(f"{os.cpu_count()} CPUs, {args.clients} client processes, {args.invoices} invoices")
+        base = None
+        for workers in args.workers:
+            rps = run(workers, db_util.DB_PATH, args.port, args)
+            base = base or rps
+            print(f"  {workers:3} workers  {rps:9.0f} req/s  ({rps / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Local stand-in for OCI Document AI used by the benchmark harness.
+
+FakeDocumentClient.analyze_document() sleeps for a configurable latency, fails
+at a configurable rate, and otherwise returns objects shaped like the real
+response (pages -> document_fields, detected_document_types), with values
+drawn from json_output/all_invoices_pretty.json.
+"""
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace as NS
+
+import oci
+
+
+SAMPLES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "json_output", "all_invoices_pretty.json")
+
+
+def load_samples(path=SAMPLES_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+MONEY_FIELDS = ("SubTotal", "ShippingCost", "InvoiceTotal", "AmountDue")
+
+
+def _money_text(value):
+    return None if value is None else f"${value:,.2f}"
+
+
+def _kv(name, text, confidence):
+    return NS(field_type="KEY_VALUE",
+              field_label=NS(name=name, confidence=confidence),
+              field_value=NS(text=text))
+
+
+def _row(item):
+    cols = [
+        ("Description", item.get("Description")),
+        ("Name", item.get("Name")),
+        ("Quantity", None if item.get("Quantity") is None else str(int(item["Quantity"]))),
+        ("UnitPrice", _money_text(item.get("UnitPrice"))),
+        ("Amount", _money_text(item.get("Amount"))),
+    ]
+    return NS(field_value=NS(items=[
+        NS(field_label=NS(name=k, confidence=None), field_value=NS(text=v)) for k, v in cols
+    ]))
+
+
+def synthetic_result(rng, samples, invoice_id, vendors=None, extra_items=0):
+    """A {confidence, data, dataConfidence} dict in the all_invoices_pretty.json shape."""
+    base = rng.choice(samples)
+    data = dict(base["data"])
+    data["InvoiceId"] = str(invoice_id)
+    if vendors:
+        data["VendorName"] = rng.choice(vendors)
+    items = list(base["data"].get("Items") or [])
+    for _ in range(extra_items):
+        items.append(dict(rng.choice(items)))
+    data["Items"] = items
+    return {"confidence": base["confidence"], "data": data,
+            "dataConfidence": dict(base["dataConfidence"])}
+
+
+def to_oci_response(result):
+    data = result["data"]
+    confidences = result["dataConfidence"]
+    fields = []
+    for name, value in data.items():
+        if name == "Items":
+            continue
+        text = _money_text(value) if name in MONEY_FIELDS else value
+        fields.append(_kv(name, text, confidences.get(name)))
+    fields.append(NS(field_type="LINE_ITEM_GROUP",
+                     field_label=NS(name="Items", confidence=None),
+                     field_value=NS(items=[_row(i) for i in data.get("Items") or []])))
+    return NS(data=NS(
+        pages=[NS(document_fields=fields)],
+        detected_document_types=[NS(document_type="INVOICE", confidence=result["confidence"])],
+    ))
+
+
+class FakeDocumentClient:
+    """Drop-in for AIServiceDocumentClient.analyze_document.
+
+    latency: mean seconds per call; jitter: +/- fraction of it;
+    failure_rate: share of calls raising a 503 ServiceError;
+    extra_items: line items added to each sample invoice.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, failure_rate=0.0, extra_items=0,
+                 vendors=None, seed=None, samples=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.extra_items = extra_items
+        self.vendors = vendors
+        self.samples = samples or load_samples()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 1_000_000
+        self.calls = 0
+        self.failures = 0
+
+    def analyze_document(self, request, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self._next_id += 1
+            invoice_id = self._next_id
+            delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.failure_rate
+            result = synthetic_result(self._rng, self.samples, invoice_id,
+                                      self.vendors, self.extra_items)
+            if fail:
+                self.failures += 1
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise oci.exceptions.ServiceError(503, "ServiceUnavailable", {}, "injected failure")
+        return to_oci_response(result)
@@ -0,0 +1,150 @@
+"""Drive the API in-process at controlled concurrency and report latency percentiles.
+
+OCI is replaced by benchmarks.fake_oci.FakeDocumentClient, so no credentials or
+network are needed. Reads run against a seeded SQLite file.
+
+    python benchmarks/load.py --scenario mixed --concurrency 32 --requests 2000 \\
+        --seed-invoices 200000 --oci-latency 0.8 --oci-failure-rate 0.02
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import db_util  # noqa: E402
+from benchmarks.fake_oci import FakeDocumentClient  # noqa: E402
+from benchmarks.seed_db import seed  # noqa: E402
+
+
+SCENARIOS = {
+    "extract": {"extract": 1.0},
+    "invoice": {"invoice": 1.0},
+    "vendor": {"vendor": 1.0},
+    "mixed": {"extract": 0.1, "invoice": 0.8, "vendor": 0.1},
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def report(name, latencies, statuses, elapsed):
+    lat = sorted(latencies)
+    ok = sum(1 for s in statuses if s < 400)
+    codes = {}
+    for s in statuses:
+        codes[s] = codes.get(s, 0) + 1
+    return {
+        "endpoint": name,
+        "requests": len(lat),
+        "ok": ok,
+        "statuses": dict(sorted(codes.items())),
+        "rps": len(lat) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(lat, 50) * 1000,
+        "p95_ms": percentile(lat, 95) * 1000,
+        "p99_ms": percentile(lat, 99) * 1000,
+    }
+
+
+async def run_load(client, scenario, concurrency, total, invoice_ids, vendors, vendor_limit, rng):
+    weights = SCENARIOS[scenario]
+    kinds = rng.choices(list(weights), weights=list(weights.values()), k=total)
+    results = {kind: ([], []) for kind in weights}
+    queue = asyncio.Queue()
+    for n, kind in enumerate(kinds):
+        queue.put_nowait((n, kind))
+
+    async def one(n, kind):
+        if kind == "extract":
+            pdf = b"%PDF-1.4\n% benchmark document " + str(n).encode()
+            return await client.post("/extract", params={"no_cache": "true"},
+                                     files={"file": (f"bench-{n}.pdf", pdf, "application/pdf")})
+        if kind == "invoice":
+            return await client.get(f"/invoice/{rng.choice(invoice_ids)}")
+        return await client.get(f"/invoices/vendor/{rng.choice(vendors)}",
+                                params={"limit": vendor_limit})
+
+    async def worker():
+        while True:
+            try:
+                n, kind = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            response = await one(n, kind)
+            latencies, statuses = results[kind]
+            latencies.append(time.perf_counter() - t0)
+            statuses.append(response.status_code)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return [report(kind, lat, st, elapsed) for kind, (lat, st) in results.items()], elapsed
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    tmp = tempfile.TemporaryDirectory()
+    db_path = args.db or os.path.join(tmp.name, "bench.db")
+    if not args.db or not os.path.exists(args.db):
+        t0 = time.perf_counter()
+        vendors = seed(db_path, args.seed_invoices, args.vendors)
+        print(f"seeded {args.seed_invoices} invoices in {time.perf_counter() - t0:.1f}s")
+    else:
+        db_util.DB_PATH = db_path
+        db_util.init_db()
+        with db_util.get_db() as conn:
+            vendors = [r[0] for r in conn.execute("SELECT DISTINCT VendorName FROM invoices LIMIT 1000")]
+    with db_util.get_db() as conn:
+        invoice_ids = [r[0] for r in conn.execute(
+            "SELECT InvoiceId FROM invoices ORDER BY random() LIMIT 10000")]
+
+    fake = FakeDocumentClient(latency=args.oci_latency, jitter=args.oci_jitter,
+                              failure_rate=args.oci_failure_rate, vendors=vendors, seed=args.seed)
+    transport = httpx.ASGITransport(app=app.app)
+    with patch.object(app, "get_oci_client", return_value=fake):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            rows, elapsed = await run_load(client, args.scenario, args.concurrency, args.requests,
+                                           invoice_ids, vendors, args.vendor_limit, rng)
+    tmp.cleanup()
+
+    print(f"scenario={args.scenario} concurrency={args.concurrency} requests={args.requests} "
+          f"oci_latency={args.oci_latency}s failure_rate={args.oci_failure_rate}")
+    print(f"{'endpoint':10s} {'reqs':>7s} {'rps':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}  statuses")
+    for r in rows:
+        print(f"{r['endpoint']:10s} {r['requests']:7d} {r['rps']:9.1f} {r['p50_ms']:9.2f} "
+              f"{r['p95_ms']:9.2f} {r['p99_ms']:9.2f}  {r['statuses']}")
+    print(f"total {args.requests / elapsed:.1f} req/s over {elapsed:.2f}s")
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--db", help="existing/seeded SQLite file (default: fresh temp file)")
+    parser.add_argument("--seed-invoices", type=int, default=20_000)
+    parser.add_argument("--vendors", type=int, default=50)
+    parser.add_argument("--vendor-limit", type=int, default=50)
+    parser.add_argument("--oci-latency", type=float, default=0.5)
+    parser.add_argument("--oci-jitter", type=float, default=0.2)
+    parser.add_argument("--oci-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
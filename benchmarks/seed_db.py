@@ -0,0 +1,54 @@
+"""Fill a SQLite file with synthetic invoices for benchmarking.
+
+    python benchmarks/seed_db.py --db bench.db --invoices 1000000 --vendors 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_util  # noqa: E402
+from benchmarks.fake_oci import load_samples, synthetic_result  # noqa: E402
+
+
+def vendor_names(count):
+    return [f"Vendor{n:04d}" for n in range(count)]
+
+
+def seed(path, invoices, vendors, extra_items=0, batch=5000, seed=0):
+    """Write ``invoices`` synthetic invoices to ``path``; returns the vendor names used."""
+    db_util.DB_PATH = path
+    db_util.init_db()
+    rng = random.Random(seed)
+    samples = load_samples()
+    names = vendor_names(vendors)
+
+    for start in range(0, invoices, batch):
+        results = []
+        for n in range(start, min(start + batch, invoices)):
+            result = synthetic_result(rng, samples, n, names, extra_items)
+            result["data"]["InvoiceDate"] = f"{2010 + n % 10}-{n % 12 + 1:02d}-{n % 28 + 1:02d}"
+            results.append(result)
+        db_util.save_inv_extractions(results)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--invoices", type=int, default=100_000)
+    parser.add_argument("--vendors", type=int, default=100)
+    parser.add_argument("--extra-items", type=int, default=0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    seed(args.db, args.invoices, args.vendors, args.extra_items)
+    print(f"seeded {args.invoices} invoices / {args.vendors} vendors into {args.db} "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
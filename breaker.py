@@ -0,0 +1,110 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+# נפתח כשלפחות BREAKER_FAILURE_RATE מתוך BREAKER_WINDOW הקריאות האחרונות נכשלו
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+# כמה שניות להישאר פתוח לפני שמנסים קריאת בדיקה (half-open)
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding window of recent calls.
+
+    closed: calls go through and their outcome is recorded. Once at least
+    ``min_calls`` are in the window and the failure rate reaches
+    ``failure_rate``, the breaker opens.
+    open: acquire() raises CircuitOpen until ``open_seconds`` have passed.
+    half_open: up to ``half_open_calls`` probe calls are let through. A
+    successful probe closes the breaker; a failed one opens it again.
+
+    Callers do ``acquire()`` and then exactly one of ``record_success()`` /
+    ``record_failure()``.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, open_seconds=BREAKER_OPEN_SECONDS,
+                 half_open_calls=BREAKER_HALF_OPEN_CALLS, clock=time.monotonic):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _retry_after(self):
+        return max(0.0, self.opened_at + self.open_seconds - self.clock())
+
+    def check(self):
+        """Raise CircuitOpen if open, without taking a half-open probe slot."""
+        with self._lock:
+            if self.state == OPEN and self._retry_after() > 0:
+                raise CircuitOpen(self._retry_after())
+
+    def acquire(self):
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._retry_after()
+                if remaining > 0:
+                    raise CircuitOpen(remaining)
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    raise CircuitOpen(self.open_seconds)
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(False)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures >= self.failure_rate * len(self._outcomes)):
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.times_opened += 1
+        self._outcomes.clear()
+
+    def retry_after_header(self, default):
+        """Whole seconds for Retry-After: time left while open, else ``default``."""
+        with self._lock:
+            if self.state == OPEN:
+                return str(max(1, math.ceil(self._retry_after())))
+        return str(default)
@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# כמה קריאות OCI רצות במקביל, וכמה בקשות מותר להחזיק בתור לפני שמחזירים 429
+OCI_MAX_CONCURRENCY = int(os.getenv("OCI_MAX_CONCURRENCY", "8"))
+OCI_MAX_QUEUE = int(os.getenv("OCI_MAX_QUEUE", "32"))
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "4"))
+# פענוח מקומי של PDF (extractors.py) - עבודת CPU קצרה
+LOCAL_MAX_WORKERS = int(os.getenv("LOCAL_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a bounded executor has no free worker and its queue is full."""
+
+
+class BoundedExecutor:
+    """Thread pool for blocking calls with admission control.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more
+    wait for a worker; anything beyond that is rejected with
+    ExecutorSaturated instead of piling up behind a slow call.
+    ``max_queue=None`` means an unbounded queue.
+    """
+
+    def __init__(self, name, max_workers, max_queue=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    @property
+    def capacity(self):
+        if self.max_queue is None:
+            return None
+        return self.max_workers + self.max_queue
+
+    def _admit(self):
+        with self._lock:
+            if self.capacity is not None and self.pending >= self.capacity:
+                raise ExecutorSaturated(self.name)
+            self.pending += 1
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        self._admit()
+        return await self._submit(fn, *args, **kwargs)
+
+    async def run_queued(self, fn, *args, **kwargs):
+        """Like run(), but waits for a worker even when the queue is full.
+        For callers that already bound their own concurrency (batch jobs)."""
+        with self._lock:
+            self.pending += 1
+        return await self._submit(fn, *args, **kwargs)
+
+    async def _submit(self, fn, *args, **kwargs):
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._release()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+oci_executor = BoundedExecutor("oci", OCI_MAX_CONCURRENCY, OCI_MAX_QUEUE)
+db_executor = BoundedExecutor("db", DB_MAX_WORKERS)
+local_executor = BoundedExecutor("local", LOCAL_MAX_WORKERS)
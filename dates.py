@@ -0,0 +1,42 @@
+"""Parsing of the free-text InvoiceDate values OCI returns."""
+import re
+from datetime import datetime
+
+
+# הפורמטים שמופיעים בחשבוניות; הראשון שמצליח קובע
+DATE_FORMATS = (
+    "%b %d %Y",      # Mar 06 2012 (SuperStore)
+    "%b %d, %Y",
+    "%B %d %Y",
+    "%B %d, %Y",
+    "%d %b %Y",
+    "%d %B %Y",
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d.%m.%Y",
+)
+
+_ISO_PREFIX = re.compile(r"^(\d{4}-\d{2}-\d{2})[T ]")
+
+
+def normalize_date(text):
+    """InvoiceDate text -> "YYYY-MM-DD", or None when it can't be parsed."""
+    if not text or not isinstance(text, str):
+        return None
+    value = " ".join(text.split())
+    m = _ISO_PREFIX.match(value)
+    if m:
+        value = m.group(1)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def invoice_month(text):
+    """"YYYY-MM" of an InvoiceDate, or "" when unknown."""
+    date = normalize_date(text)
+    return date[:7] if date else ""
@@ -1,21 +1,342 @@
+import os
+import itertools
+import json
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 
+from lru import LRUCache
+from dates import invoice_month, normalize_date
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no multi-worker mode, no init lock
+    fcntl = None
+
+
+DB_PATH = os.getenv("DB_PATH", "invoices.db")
+
+# Extraction cache: results of analyze_document keyed by sha256 of the PDF bytes.
+# TTL is in seconds (0 = never expire); MAX_ENTRIES bounds the table (LRU eviction).
+EXTRACT_CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "1") != "0"
+EXTRACT_CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL", str(7 * 24 * 3600)))
+EXTRACT_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", "10000"))
+
+# Review queue: an invoice is flagged when a field's dataConfidence is below its
+# threshold. REVIEW_THRESHOLD applies to every field; REVIEW_FIELD_THRESHOLDS
+# overrides single fields ("InvoiceTotal=0.95,ShippingAddress=0.7"; 0 = never flag).
+REVIEW_THRESHOLD = float(os.getenv("REVIEW_THRESHOLD", "0.9"))
+REVIEW_FIELD_THRESHOLDS = os.getenv("REVIEW_FIELD_THRESHOLDS", "")
+# confidence_stats keeps a histogram of this many equal-width buckets over [0, 1]
+CONFIDENCE_BUCKETS = 10
+
+# Versioned schema migrations, tracked in PRAGMA user_version.
+# MIGRATIONS[n] upgrades a database from version n to n + 1; each step is a
+# list of SQL statements or callables taking a cursor.
+def _create_vendor_monthly_totals(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendor_monthly_totals (
+            VendorName TEXT NOT NULL,
+            Month TEXT NOT NULL,
+            InvoiceCount INTEGER NOT NULL,
+            SubTotal REAL NOT NULL,
+            ShippingCost REAL NOT NULL,
+            InvoiceTotal REAL NOT NULL,
+            ItemCount INTEGER NOT NULL,
+            PRIMARY KEY (VendorName, Month)
+        ) WITHOUT ROWID
+    """)
+    # backfill from the invoices already stored
+    deltas = {}
+    rows = cursor.execute("""
+        SELECT i.VendorName, i.InvoiceDate, i.SubTotal, i.ShippingCost, i.InvoiceTotal,
+               (SELECT COUNT(*) FROM items it WHERE it.InvoiceId = i.InvoiceId)
+        FROM invoices i
+    """)
+    for vendor, invoice_date, *amounts in rows:
+        _add_totals(deltas, (vendor, invoice_month(invoice_date), *amounts), 1)
+    _apply_totals(cursor, deltas)
+
+
+def _add_invoice_date_iso(cursor):
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(invoices)")}
+    if "InvoiceDateISO" not in columns:
+        cursor.execute("ALTER TABLE invoices ADD COLUMN InvoiceDateISO TEXT")
+    rows = cursor.execute(
+        "SELECT InvoiceId, InvoiceDate FROM invoices WHERE InvoiceDate IS NOT NULL"
+    ).fetchall()
+    cursor.executemany("UPDATE invoices SET InvoiceDateISO = ? WHERE InvoiceId = ?",
+                       [(normalize_date(date), invoice_id) for invoice_id, date in rows])
+
+
+def _create_invoice_search(cursor):
+    # שורה אחת לכל חשבונית, rowid = invoices.rowid; prefix index ל-SKU חלקיים
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(
+            VendorName, BillingAddressRecipient, ShippingAddress, Items,
+            prefix = '2 3'
+        )
+    """)
+    cursor.execute("DELETE FROM invoice_search")
+    rows = cursor.connection.execute("""
+        SELECT i.rowid, i.VendorName, i.BillingAddressRecipient, i.ShippingAddress,
+               it.Description, it.Name
+        FROM invoices i LEFT JOIN items it ON it.InvoiceId = i.InvoiceId
+        ORDER BY i.rowid, it.id
+    """)
+    batch = []
+    for rowid, group in itertools.groupby(rows, key=lambda r: r[0]):
+        group = list(group)
+        items = [{"Description": r[4], "Name": r[5]} for r in group if r[4] or r[5]]
+        batch.append((rowid,) + group[0][1:4] + (_items_text(items),))
+        if len(batch) >= 1000:
+            cursor.executemany(_INSERT_SEARCH_ROW, batch)
+            batch = []
+    cursor.executemany(_INSERT_SEARCH_ROW, batch)
+
+
+def _add_change_seq(cursor):
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(invoices)")}
+    if "ChangeSeq" not in columns:
+        cursor.execute("ALTER TABLE invoices ADD COLUMN ChangeSeq INTEGER")
+    # rows from before the column count as one change, so the first export takes them all
+    cursor.execute("UPDATE invoices SET ChangeSeq = 1 WHERE ChangeSeq IS NULL")
+
+
+def _create_review_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_queue (
+            InvoiceId TEXT PRIMARY KEY,
+            VendorName TEXT,
+            MinConfidence REAL NOT NULL,
+            Fields TEXT NOT NULL,
+            FlaggedAt REAL NOT NULL
+        )
+    """)
+    # the review page order: least confident first, keyset on (MinConfidence, InvoiceId)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_queue_order ON review_queue (MinConfidence, InvoiceId)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS confidence_stats (
+            Field TEXT NOT NULL,
+            Bucket INTEGER NOT NULL,
+            Count INTEGER NOT NULL,
+            Sum REAL NOT NULL,
+            SumSquares REAL NOT NULL,
+            Below INTEGER NOT NULL,
+            PRIMARY KEY (Field, Bucket)
+        ) WITHOUT ROWID
+    """)
+    # the thresholds review_queue and confidence_stats.Below were built with (see _sync_review_thresholds)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_thresholds (
+            Field TEXT PRIMARY KEY,
+            Threshold REAL NOT NULL
+        )
+    """)
+
+
+MIGRATIONS = [
+    # 1: secondary indexes for the vendor listing and per-invoice item lookups
+    [
+        "CREATE INDEX IF NOT EXISTS idx_invoices_vendor_date ON invoices (VendorName, InvoiceDate)",
+        "CREATE INDEX IF NOT EXISTS idx_items_invoice ON items (InvoiceId)",
+    ],
+    # 2: InvoiceId as the tie-breaker of the vendor listing's keyset order
+    [
+        "DROP INDEX IF EXISTS idx_invoices_vendor_date",
+        "CREATE INDEX idx_invoices_vendor_date ON invoices (VendorName, InvoiceDate, InvoiceId)",
+    ],
+    # 3: per-vendor, per-month totals for /analytics, kept up to date by save_inv_extractions
+    [_create_vendor_monthly_totals],
+    # 4: InvoiceDate parsed once into a sortable "YYYY-MM-DD" column; the vendor
+    # listing's keyset order and date-range filters use it
+    [
+        _add_invoice_date_iso,
+        "DROP INDEX IF EXISTS idx_invoices_vendor_date",
+        "CREATE INDEX idx_invoices_vendor_date ON invoices (VendorName, InvoiceDateISO, InvoiceId)",
+    ],
+    # 5: FTS5 index over vendor, recipient, address and line item text for GET /search
+    [_create_invoice_search],
+    # 6: ChangeSeq - bumped by every save, so exports can pick up "changed since" rows
+    [
+        _add_change_seq,
+        "CREATE INDEX IF NOT EXISTS idx_invoices_change_seq ON invoices (ChangeSeq)",
+        """CREATE TABLE IF NOT EXISTS export_watermarks (
+            Name TEXT PRIMARY KEY,
+            ChangeSeq INTEGER NOT NULL,
+            ExportedAt REAL NOT NULL
+        )""",
+    ],
+    # 7: resume points of backfill.py runs, one row per source file
+    [
+        """CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            Source TEXT PRIMARY KEY,
+            Position INTEGER NOT NULL,
+            Records INTEGER NOT NULL,
+            Done INTEGER NOT NULL DEFAULT 0,
+            UpdatedAt REAL NOT NULL
+        )""",
+    ],
+    # 8: low-confidence review queue and per-field confidence statistics, kept up to
+    # date by every save; filled by _sync_review_thresholds on the next init_db
+    [_create_review_tables],
+]
+
+# Tables derived from invoices/items/confidences for search, analytics and review.
+# Storage shards (init_db(derived=False)) keep only the base tables.
+DERIVED_TABLES = ("invoice_search", "vendor_monthly_totals", "review_queue", "confidence_stats",
+                  "review_thresholds")
+# the migration step that creates (and fills) each group of derived tables
+_DERIVED_STEPS = {"vendor_monthly_totals": _create_vendor_monthly_totals,
+                  "invoice_search": _create_invoice_search,
+                  "review_queue": _create_review_tables}
+
+# Secondary indexes a bulk load drops first and builds once at the end.
+DEFERRED_INDEXES = {
+    "idx_invoices_vendor_date":
+        "CREATE INDEX IF NOT EXISTS idx_invoices_vendor_date ON invoices (VendorName, InvoiceDateISO, InvoiceId)",
+    "idx_items_invoice": "CREATE INDEX IF NOT EXISTS idx_items_invoice ON items (InvoiceId)",
+}
+
+# In-process cache of assembled invoices for GET /invoice/{id}; writes invalidate it.
+INVOICE_CACHE_SIZE = int(os.getenv("INVOICE_CACHE_SIZE", "10000"))
+INVOICE_CACHE_TTL = float(os.getenv("INVOICE_CACHE_TTL", "0"))
+invoice_cache = LRUCache(INVOICE_CACHE_SIZE, INVOICE_CACHE_TTL)
+
+# Multi-worker mode: invoices saved by another process must leave this one's
+# invoice_cache too. PRAGMA data_version changes when another connection has
+# committed; the ChangeSeq index then says which invoices changed.
+_cache_sync = {"enabled": False, "seq": {}}
+_cache_sync_lock = threading.Lock()
+
+
+def enable_cache_sync(paths=None):
+    """Start watching ``paths`` (default: DB_PATH) - one per storage shard."""
+    seqs = {}
+    for path in [DB_PATH] if paths is None else paths:
+        with get_db(path) as conn:
+            seqs[path] = conn.execute("SELECT COALESCE(MAX(ChangeSeq), 0) FROM invoices").fetchone()[0]
+    with _cache_sync_lock:
+        _cache_sync.update(enabled=True, seq=seqs)
+
+
+def disable_cache_sync():
+    with _cache_sync_lock:
+        _cache_sync["enabled"] = False
+
+
+def sync_invoice_cache():
+    """Evict cached invoices that other processes saved since the last check."""
+    if not _cache_sync["enabled"]:
+        return
+    for path in list(_cache_sync["seq"]):
+        _sync_path(path)
+
+
+def _sync_path(path):
+    with get_db(path) as conn:
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if not hasattr(_local, "data_versions"):
+            _local.data_versions = {}
+        if _local.data_versions.get(path) == version:
+            return
+        _local.data_versions[path] = version
+        with _cache_sync_lock:
+            rows = conn.execute("SELECT InvoiceId, ChangeSeq FROM invoices WHERE ChangeSeq > ?",
+                                (_cache_sync["seq"].get(path, 0),)).fetchall()
+            if rows:
+                invoice_cache.invalidate([r[0] for r in rows])
+                _cache_sync["seq"][path] = max(r[1] for r in rows)
+
+
+extraction_cache_stats = {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+# Connection settings. Each thread keeps one open connection per database file
+# (see get_db); WAL lets readers continue while a writer commits.
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+_local = threading.local()
+
+
+def open_connection(path=None, check_same_thread=True):
+    """A new tuned connection. Prefer get_db(); this is for long-lived cursors
+    that must outlive a single `with` block (e.g. streaming responses)."""
+    conn = sqlite3.connect(path or DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    return conn
 
-DB_PATH = "invoices.db"
 
 @contextmanager
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def get_db(path=None):
+    """Transaction on this thread's pooled connection to ``path`` (default DB_PATH).
+
+    Commits on success and rolls back on error. Nested get_db() blocks on the
+    same thread share the outer transaction; only the outermost one commits.
+    """
+    if not hasattr(_local, "conns"):
+        _local.conns = {}
+        _local.depth = {}
+    path = path or DB_PATH
+    conn = _local.conns.get(path)
+    if conn is None:
+        conn = _local.conns[path] = open_connection(path)
+        _local.depth[path] = 0
+
+    _local.depth[path] += 1
     try:
         yield conn
-        conn.commit()
+        if _local.depth[path] == 1:
+            conn.commit()
+    except BaseException:
+        if _local.depth[path] == 1:
+            conn.rollback()
+        raise
     finally:
+        _local.depth[path] -= 1
+
+
+def close_db():
+    """Close this thread's pooled connections (shutdown, tests)."""
+    conns = getattr(_local, "conns", {})
+    for conn in conns.values():
         conn.close()
+    conns.clear()
+    getattr(_local, "depth", {}).clear()
 
 
-def init_db():
-    with get_db() as conn:
+@contextmanager
+def _file_lock(path):
+    """Exclusive flock on ``path`` - held by one process at a time."""
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def init_db(path=None, derived=True):
+    # כמה workers עולים יחד: רק אחד יוצר טבלאות ומריץ migrations, השאר מחכים ורואים גרסה עדכנית
+    path = path or DB_PATH
+    with _file_lock(path + ".lock"):
+        _init_db(path, derived)
+
+
+def _init_db(path, derived=True):
+    with get_db(path) as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -27,7 +348,9 @@ def init_db():
                 ShippingAddress TEXT,
                 SubTotal REAL,
                 ShippingCost REAL,
-                InvoiceTotal REAL
+                InvoiceTotal REAL,
+                InvoiceDateISO TEXT,
+                ChangeSeq INTEGER
             )
         """)
         
@@ -58,73 +381,829 @@ def init_db():
             )
         """)
 
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                ContentHash TEXT PRIMARY KEY,
+                Result TEXT NOT NULL,
+                CreatedAt REAL NOT NULL,
+                LastUsedAt REAL NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used
+            ON extraction_cache (LastUsedAt)
+        """)
+
+        # תור עבודות של /extract?async=true - נשמר בדיסק כדי לשרוד restart
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                JobId TEXT PRIMARY KEY,
+                Status TEXT NOT NULL,
+                Filename TEXT,
+                Content BLOB,
+                Attempts INTEGER NOT NULL DEFAULT 0,
+                NextAttemptAt REAL NOT NULL,
+                StatusCode INTEGER,
+                Result TEXT,
+                Error TEXT,
+                CreatedAt REAL NOT NULL,
+                UpdatedAt REAL NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_next_attempt
+            ON jobs (Status, NextAttemptAt)
+        """)
+
+        migrate(cursor, derived)
+        if derived:
+            # a file migrated with derived=False (a storage shard) opened as a full database
+            tables = {r[0] for r in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, step in _DERIVED_STEPS.items():
+                if table not in tables:
+                    step(cursor)
+            _sync_review_thresholds(cursor)
+        else:
+            # shard files written before derived=False existed still have them
+            for table in DERIVED_TABLES:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def schema_version(cursor):
+    return cursor.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(cursor, derived=True):
+    """Apply pending MIGRATIONS so older invoices.db files catch up.
+
+    ``derived=False`` skips the steps that create DERIVED_TABLES.
+    """
+    version = schema_version(cursor)
+    for target, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        for step in steps:
+            if not derived and step in _DERIVED_STEPS.values():
+                continue
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+        cursor.execute(f"PRAGMA user_version = {target}")
+
 
 def save_inv_extraction(result):
-    data = result.get("data", {})
-    data_confidence = result.get("dataConfidence", {})
-    
-    invoice_id = data.get("InvoiceId")
-    if invoice_id:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Insert invoice
-            cursor.execute("""
-                INSERT OR REPLACE INTO invoices 
-                (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient, 
-                 ShippingAddress, SubTotal, ShippingCost, InvoiceTotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                invoice_id,
-                data.get("VendorName"),
-                data.get("InvoiceDate"),
-                data.get("BillingAddressRecipient"),
-                data.get("ShippingAddress"),
-                data.get("SubTotal"),
-                data.get("ShippingCost"),
-                data.get("InvoiceTotal")
-            ))
-            
-            # Insert confidences
-            cursor.execute("""
-                INSERT OR REPLACE INTO confidences 
-                (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
-                 ShippingAddress, SubTotal, ShippingCost, InvoiceTotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                invoice_id,
-                data_confidence.get("VendorName"),
-                data_confidence.get("InvoiceDate"),
-                data_confidence.get("BillingAddressRecipient"),
-                data_confidence.get("ShippingAddress"),
-                data_confidence.get("SubTotal"),
-                data_confidence.get("ShippingCost"),
-                data_confidence.get("InvoiceTotal")
-            ))
-            
-            # Insert line items
-            line_items = data.get("Items", [])
-            for item in line_items:
-                cursor.execute("""
-                    INSERT INTO items 
-                    (InvoiceId, Description, Name, Quantity, UnitPrice, Amount)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    invoice_id,
-                    item.get("Description"),
-                    item.get("Name"),
-                    item.get("Quantity"),
-                    item.get("UnitPrice"),
-                    item.get("Amount")
-                ))
-                
-def clean_db():
-    """Remove all test data so each test starts clean."""
+    save_inv_extractions([result])
+
+
+INVOICE_COLUMNS = ("InvoiceId", "VendorName", "InvoiceDate", "BillingAddressRecipient",
+                   "ShippingAddress", "SubTotal", "ShippingCost", "InvoiceTotal")
+CONFIDENCE_COLUMNS = INVOICE_COLUMNS
+ITEM_COLUMNS = ("Description", "Name", "Quantity", "UnitPrice", "Amount")
+
+
+def _parse_review_thresholds(default, overrides):
+    thresholds = dict.fromkeys(CONFIDENCE_COLUMNS[1:], default)
+    for part in filter(None, (p.strip() for p in overrides.split(","))):
+        field, _, value = part.partition("=")
+        if field.strip() not in thresholds:
+            raise ValueError(f"REVIEW_FIELD_THRESHOLDS: unknown field {field.strip()!r}")
+        thresholds[field.strip()] = float(value)
+    return thresholds
+
+
+REVIEW_THRESHOLDS = _parse_review_thresholds(REVIEW_THRESHOLD, REVIEW_FIELD_THRESHOLDS)
+
+
+# Multi-worker mode: a writer.WriterClient that sends saves to the single writer process.
+remote_writer = None
+
+
+def save_inv_extractions(results):
+    """Persist many extraction results in a single transaction."""
+    if remote_writer is not None:
+        remote_writer.save(results)
+        invoice_cache.invalidate([r["data"]["InvoiceId"] for r in results
+                                  if r.get("data", {}).get("InvoiceId")])
+        return
+    write_inv_extractions(results)
+
+
+def write_inv_extractions(results, path=None, derived=True):
+    """save_inv_extractions on this process's own connection (the writer process and
+    storage shards use this). ``derived=False`` writes only invoices, confidences
+    and items, for files created with init_db(derived=False)."""
+    with get_db(path) as conn:
+        if not derived and not conn.in_transaction:
+            # the write lock before ChangeSeq is read, as the invoice_search DELETE takes it otherwise
+            conn.execute("BEGIN IMMEDIATE")
+        invoice_ids = _write_extractions(conn.cursor(), results, deferred=not derived)
+    # once more after commit: a reader may have cached the old row in between
+    invoice_cache.invalidate(invoice_ids)
+
+
+def _write_extractions(cursor, results, deferred=False):
+    """Write ``results``; returns the saved InvoiceIds.
+
+    ``deferred`` is the bulk-load mode (see backfill.py): the caller already
+    holds the write lock and rebuilds invoice_search and vendor_monthly_totals
+    once at the end (rebuild_derived_tables), so they are not touched here.
+    Storage shards, which have no derived tables, write the same way.
+    """
+    # חשבונית שמופיעה פעמיים ברשימה - הגרסה האחרונה קובעת
+    latest = {}
+    for result in results:
+        data = result.get("data", {})
+        invoice_id = data.get("InvoiceId")
+        if invoice_id:
+            latest[invoice_id] = (data, result.get("dataConfidence", {}))
+    if not latest:
+        return []
+    invoice_cache.invalidate(latest)
+
+    if not deferred:
+        # the search rows of replaced invoices go with them (INSERT OR REPLACE gives a new rowid)
+        cursor.executemany(
+            "DELETE FROM invoice_search WHERE rowid = (SELECT rowid FROM invoices WHERE InvoiceId = ?)",
+            [(i,) for i in latest])
+    # one sequence number per save; the DELETE above already holds the write lock
+    change_seq = cursor.execute("SELECT COALESCE(MAX(ChangeSeq), 0) + 1 FROM invoices").fetchone()[0]
+
+    # totals of replaced invoices are subtracted before the new ones are added
+    deltas = {}
+    confidence_deltas = {}
+    if not deferred:
+        for row in _select_in(cursor, _SELECT_TOTALS_ROWS, list(latest)):
+            _add_totals(deltas, row, -1)
+        for row in _select_in(cursor, _SELECT_CONFIDENCE_ROWS, list(latest)):
+            _add_confidence_stats(confidence_deltas, dict(zip(CONFIDENCE_COLUMNS, row)), -1)
+        replaced = list(latest)
+    else:
+        # idx_items_invoice may be dropped: one DELETE per batch, and only if something is replaced
+        replaced = [r[0] for r in _select_in(
+            cursor, "SELECT InvoiceId FROM invoices WHERE InvoiceId IN ({})", list(latest))]
+
+    invoice_rows = []
+    confidence_rows = []
+    item_rows = []
+    search_rows = []
+    review_rows = []
+    now = time.time()
+    for invoice_id, (data, data_confidence) in latest.items():
+        date_iso = normalize_date(data.get("InvoiceDate"))
+        invoice_rows.append((invoice_id,) + tuple(data.get(c) for c in INVOICE_COLUMNS[1:])
+                            + (date_iso, change_seq))
+        confidence_rows.append((invoice_id,) + tuple(data_confidence.get(c) for c in CONFIDENCE_COLUMNS[1:]))
+        for item in data.get("Items") or []:
+            item_rows.append((invoice_id,) + tuple(item.get(c) for c in ITEM_COLUMNS))
+        search_rows.append((data.get("VendorName"), data.get("BillingAddressRecipient"),
+                            data.get("ShippingAddress"), _items_text(data.get("Items") or []),
+                            invoice_id))
+        _add_totals(deltas, (data.get("VendorName"), (date_iso or "")[:7], data.get("SubTotal"),
+                             data.get("ShippingCost"), data.get("InvoiceTotal"),
+                             len(data.get("Items") or [])), 1)
+        if not deferred:
+            _add_confidence_stats(confidence_deltas, data_confidence, 1)
+            review_row = _review_row(invoice_id, data.get("VendorName"), data_confidence, now)
+            if review_row:
+                review_rows.append(review_row)
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO invoices 
+        (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient, 
+         ShippingAddress, SubTotal, ShippingCost, InvoiceTotal, InvoiceDateISO, ChangeSeq)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, invoice_rows)
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO confidences 
+        (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+         ShippingAddress, SubTotal, ShippingCost, InvoiceTotal)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, confidence_rows)
+
+    # re-extraction replaces the invoice's line items instead of appending to them
+    if not deferred:
+        cursor.executemany("DELETE FROM items WHERE InvoiceId = ?", [(i,) for i in replaced])
+    elif replaced:
+        _select_in(cursor, "DELETE FROM items WHERE InvoiceId IN ({})", replaced)
+    cursor.executemany("""
+        INSERT INTO items 
+        (InvoiceId, Description, Name, Quantity, UnitPrice, Amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, item_rows)
+    if deferred:
+        return list(latest)
+    cursor.executemany("""
+        INSERT INTO invoice_search
+        (rowid, VendorName, BillingAddressRecipient, ShippingAddress, Items)
+        SELECT rowid, ?, ?, ?, ? FROM invoices WHERE InvoiceId = ?
+    """, search_rows)
+    _apply_totals(cursor, deltas)
+    cursor.executemany("DELETE FROM review_queue WHERE InvoiceId = ?", [(i,) for i in latest])
+    cursor.executemany(_INSERT_REVIEW_ROW, review_rows)
+    _apply_confidence_stats(cursor, confidence_deltas)
+    return list(latest)
+
+
+# one _add_totals row per stored invoice in "IN ({})"
+_SELECT_TOTALS_ROWS = """
+    SELECT i.VendorName, COALESCE(SUBSTR(i.InvoiceDateISO, 1, 7), ''),
+           i.SubTotal, i.ShippingCost, i.InvoiceTotal,
+           (SELECT COUNT(*) FROM items it WHERE it.InvoiceId = i.InvoiceId)
+    FROM invoices i WHERE i.InvoiceId IN ({})
+"""
+
+
+def delete_invoices(invoice_ids, path=None, derived=True):
+    """Remove invoices with their items, confidences, search rows and totals."""
+    invoice_ids = list(invoice_ids)
+    if not invoice_ids:
+        return
+    with get_db(path) as conn:
+        cursor = conn.cursor()
+        if not derived:
+            for table in ("items", "confidences", "invoices"):
+                _select_in(cursor, f"DELETE FROM {table} WHERE InvoiceId IN ({{}})", invoice_ids)
+            invoice_cache.invalidate(invoice_ids)
+            return
+        deltas = {}
+        for row in _select_in(cursor, _SELECT_TOTALS_ROWS, invoice_ids):
+            _add_totals(deltas, row, -1)
+        confidence_deltas = {}
+        for row in _select_in(cursor, _SELECT_CONFIDENCE_ROWS, invoice_ids):
+            _add_confidence_stats(confidence_deltas, dict(zip(CONFIDENCE_COLUMNS, row)), -1)
+        _select_in(cursor, "DELETE FROM invoice_search WHERE rowid IN "
+                           "(SELECT rowid FROM invoices WHERE InvoiceId IN ({}))", invoice_ids)
+        for table in ("items", "confidences", "review_queue", "invoices"):
+            _select_in(cursor, f"DELETE FROM {table} WHERE InvoiceId IN ({{}})", invoice_ids)
+        _apply_totals(cursor, deltas)
+        _apply_confidence_stats(cursor, confidence_deltas)
+    invoice_cache.invalidate(invoice_ids)
+
+
+def drop_deferred_indexes():
+    with get_db() as conn:
+        for name in DEFERRED_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_deferred_indexes():
+    with get_db() as conn:
+        for sql in DEFERRED_INDEXES.values():
+            conn.execute(sql)
+
+
+def rebuild_derived_tables():
+    """Recompute invoice_search, vendor_monthly_totals, review_queue and
+    confidence_stats from invoices/items/confidences."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM vendor_monthly_totals")
+        _create_vendor_monthly_totals(cursor)
+        _create_invoice_search(cursor)
+        _rebuild_review(cursor)
+
+
+def get_backfill_checkpoint(source):
+    """(Position, Records, Done) of a backfill source, or None."""
+    with get_db() as conn:
+        return conn.execute(
+            "SELECT Position, Records, Done FROM backfill_checkpoints WHERE Source = ?", (source,)
+        ).fetchone()
+
+
+def set_backfill_checkpoint(source, position, records, done=False):
+    with get_db() as conn:
+        _set_backfill_checkpoint(conn.cursor(), source, position, records, done)
+
+
+def _set_backfill_checkpoint(cursor, source, position, records, done):
+    cursor.execute("""
+        INSERT INTO backfill_checkpoints (Source, Position, Records, Done, UpdatedAt)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (Source) DO UPDATE SET
+            Position = excluded.Position, Records = excluded.Records,
+            Done = excluded.Done, UpdatedAt = excluded.UpdatedAt
+    """, (source, position, records, int(done), time.time()))
+
+
+def save_backfill_batch(results, source, position, records, deferred=True):
+    """Write one backfill batch and move its checkpoint in the same transaction,
+    so a batch is either loaded and checkpointed or neither."""
+    with get_db() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        invoice_ids = _write_extractions(cursor, results, deferred=deferred)
+        _set_backfill_checkpoint(cursor, source, position, records, False)
+    invoice_cache.invalidate(invoice_ids)
+    return len(invoice_ids)
+
+
+_INSERT_SEARCH_ROW = """
+    INSERT INTO invoice_search (rowid, VendorName, BillingAddressRecipient, ShippingAddress, Items)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def _items_text(items):
+    """Searchable text of the line items: each Description, plus Name when it adds something."""
+    lines = []
+    for item in items:
+        description, name = item.get("Description") or "", item.get("Name") or ""
+        lines.append(description if name in description else f"{description} {name}".strip())
+    return "\n".join(lines)
+
+
+def fts_query(text):
+    """User search text -> FTS5 MATCH expression.
+
+    Every word becomes a quoted phrase, so "OFF-AR-5309" matches the SKU's
+    tokens in order and FTS5 syntax in the input is never interpreted. The
+    last word is a prefix ("OFF-AR-53" finds OFF-AR-5309). Words are ANDed.
+    """
+    words = ['"' + w.replace('"', '""') + '"' for w in text.split()]
+    if not words:
+        return None
+    words[-1] += " *"
+    return " ".join(words)
+
+
+SEARCH_COLUMNS = ("InvoiceId", "VendorName", "InvoiceDate", "BillingAddressRecipient",
+                  "ShippingAddress", "InvoiceTotal")
+
+# bm25 מחושב לכל התאמה לפני ה-LIMIT; מעל הסף מחזירים לפי rowid (האחרונות שנשמרו)
+SEARCH_MAX_RANKED = int(os.getenv("SEARCH_MAX_RANKED", "10000"))
+
+
+def search_invoices(text, limit=20, offset=0):
+    """(results, ranked) for ``text``.
+
+    Results are best bm25 rank first, each with its score and a highlighted
+    snippet. When more than SEARCH_MAX_RANKED invoices match, ranking them all
+    would cost more than the lookup itself, so the newest matches come first
+    instead and ``ranked`` is False.
+    """
+    query = fts_query(text)
+    if query is None:
+        return [], True
+    with get_db() as conn:
+        matches = conn.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT rowid FROM invoice_search WHERE invoice_search MATCH ? LIMIT ?
+            )
+        """, (query, SEARCH_MAX_RANKED + 1)).fetchone()[0]
+        ranked = matches <= SEARCH_MAX_RANKED
+        rows = conn.execute(f"""
+            SELECT i.InvoiceId, i.VendorName, i.InvoiceDate, i.BillingAddressRecipient,
+                   i.ShippingAddress, i.InvoiceTotal,
+                   s.rank, snippet(invoice_search, -1, '[', ']', '...', 12)
+            FROM invoice_search s
+            JOIN invoices i ON i.rowid = s.rowid
+            WHERE invoice_search MATCH ?
+            ORDER BY {"s.rank" if ranked else "s.rowid DESC"}
+            LIMIT ? OFFSET ?
+        """, (query, limit, offset)).fetchall()
+    results = []
+    for row in rows:
+        result = dict(zip(SEARCH_COLUMNS, row))
+        result["score"] = round(-row[6], 4)
+        result["snippet"] = row[7]
+        results.append(result)
+    return results, ranked
+
+
+# SQLite's default limit of bound parameters per statement
+SQL_MAX_PARAMS = 999
+
+
+def _select_in(cursor, sql, values):
+    """Rows of ``sql`` whose "IN ({})" is filled with ``values``, in chunks."""
+    rows = []
+    for start in range(0, len(values), SQL_MAX_PARAMS):
+        chunk = values[start:start + SQL_MAX_PARAMS]
+        rows.extend(cursor.execute(sql.format(",".join("?" * len(chunk))), chunk))
+    return rows
+
+
+def _add_totals(deltas, row, sign):
+    """Add (sign=1) or remove (sign=-1) one invoice's contribution to ``deltas``.
+
+    ``row`` is (VendorName, "YYYY-MM" or "", SubTotal, ShippingCost, InvoiceTotal, item count).
+    """
+    vendor, month, sub_total, shipping, total, items = row
+    key = (vendor or "", month)
+    d = deltas.setdefault(key, [0, 0.0, 0.0, 0.0, 0])
+    d[0] += sign
+    d[1] += sign * (sub_total or 0)
+    d[2] += sign * (shipping or 0)
+    d[3] += sign * (total or 0)
+    d[4] += sign * (items or 0)
+
+
+def _apply_totals(cursor, deltas):
+    rows = [key + tuple(d) for key, d in deltas.items() if any(d)]
+    if not rows:
+        return
+    cursor.executemany("""
+        INSERT INTO vendor_monthly_totals
+        (VendorName, Month, InvoiceCount, SubTotal, ShippingCost, InvoiceTotal, ItemCount)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (VendorName, Month) DO UPDATE SET
+            InvoiceCount = InvoiceCount + excluded.InvoiceCount,
+            SubTotal = SubTotal + excluded.SubTotal,
+            ShippingCost = ShippingCost + excluded.ShippingCost,
+            InvoiceTotal = InvoiceTotal + excluded.InvoiceTotal,
+            ItemCount = ItemCount + excluded.ItemCount
+    """, rows)
+    cursor.execute("DELETE FROM vendor_monthly_totals WHERE InvoiceCount <= 0")
+
+
+_SELECT_CONFIDENCE_ROWS = f"SELECT {', '.join(CONFIDENCE_COLUMNS)} FROM confidences WHERE InvoiceId IN ({{}})"
+
+_INSERT_REVIEW_ROW = """
+    INSERT INTO review_queue (InvoiceId, VendorName, MinConfidence, Fields, FlaggedAt)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def _low_confidence_fields(confidences):
+    """{field: confidence} of the fields below their REVIEW_THRESHOLDS entry."""
+    return {field: value for field, threshold in REVIEW_THRESHOLDS.items()
+            if (value := confidences.get(field)) is not None and value < threshold}
+
+
+def _review_row(invoice_id, vendor_name, confidences, flagged_at):
+    fields = _low_confidence_fields(confidences)
+    if not fields:
+        return None
+    return (invoice_id, vendor_name, min(fields.values()), json.dumps(fields), flagged_at)
+
+
+def _add_confidence_stats(deltas, confidences, sign):
+    """Add (sign=1) or remove (sign=-1) one invoice's field confidences to ``deltas``."""
+    for field, threshold in REVIEW_THRESHOLDS.items():
+        value = confidences.get(field)
+        if value is None:
+            continue
+        bucket = min(max(int(value * CONFIDENCE_BUCKETS), 0), CONFIDENCE_BUCKETS - 1)
+        d = deltas.setdefault((field, bucket), [0, 0.0, 0.0, 0])
+        d[0] += sign
+        d[1] += sign * value
+        d[2] += sign * value * value
+        d[3] += sign * (value < threshold)
+
+
+def _apply_confidence_stats(cursor, deltas):
+    rows = [key + tuple(d) for key, d in deltas.items() if any(d)]
+    if not rows:
+        return
+    cursor.executemany("""
+        INSERT INTO confidence_stats (Field, Bucket, Count, Sum, SumSquares, Below)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (Field, Bucket) DO UPDATE SET
+            Count = Count + excluded.Count,
+            Sum = Sum + excluded.Sum,
+            SumSquares = SumSquares + excluded.SumSquares,
+            Below = Below + excluded.Below
+    """, rows)
+    cursor.execute("DELETE FROM confidence_stats WHERE Count <= 0")
+
+
+def _rebuild_review(cursor):
+    """Refill review_queue and confidence_stats from confidences with REVIEW_THRESHOLDS."""
+    cursor.execute("DELETE FROM review_queue")
+    cursor.execute("DELETE FROM confidence_stats")
+    deltas = {}
+    now = time.time()
+    rows = cursor.connection.execute(f"""
+        SELECT i.VendorName, {', '.join('c.' + c for c in CONFIDENCE_COLUMNS)}
+        FROM confidences c JOIN invoices i ON i.InvoiceId = c.InvoiceId
+    """)
+    while True:
+        chunk = rows.fetchmany(1000)
+        if not chunk:
+            break
+        review_rows = []
+        for vendor_name, *values in chunk:
+            confidences = dict(zip(CONFIDENCE_COLUMNS, values))
+            _add_confidence_stats(deltas, confidences, 1)
+            review_row = _review_row(confidences["InvoiceId"], vendor_name, confidences, now)
+            if review_row:
+                review_rows.append(review_row)
+        cursor.executemany(_INSERT_REVIEW_ROW, review_rows)
+    _apply_confidence_stats(cursor, deltas)
+    cursor.execute("DELETE FROM review_thresholds")
+    cursor.executemany("INSERT INTO review_thresholds (Field, Threshold) VALUES (?, ?)",
+                       REVIEW_THRESHOLDS.items())
+
+
+def _sync_review_thresholds(cursor):
+    # ספים שהשתנו מאז ההרצה הקודמת: בונים מחדש את התור והסטטיסטיקה פעם אחת, ב-init
+    stored = dict(cursor.execute("SELECT Field, Threshold FROM review_thresholds"))
+    if stored != REVIEW_THRESHOLDS:
+        _rebuild_review(cursor)
+
+
+REVIEW_COLUMNS = ("InvoiceId", "VendorName", "MinConfidence", "Fields", "FlaggedAt")
+
+
+def get_review_queue(limit=50, after=None):
+    """Flagged invoices, least confident first; ``after`` is (MinConfidence, InvoiceId)."""
+    after_sql, params = "", ()
+    if after is not None:
+        after_sql, params = "WHERE (MinConfidence, InvoiceId) > (?, ?)", tuple(after)
+    with get_db() as conn:
+        rows = conn.execute(f"""
+            SELECT {', '.join(REVIEW_COLUMNS)} FROM review_queue {after_sql}
+            ORDER BY MinConfidence ASC, InvoiceId ASC
+            LIMIT ?
+        """, params + (limit,)).fetchall()
+    entries = []
+    for row in rows:
+        entry = dict(zip(REVIEW_COLUMNS, row))
+        entry["Fields"] = json.loads(entry["Fields"])
+        entries.append(entry)
+    return entries
+
+
+def count_review_queue():
+    with get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM review_queue").fetchone()[0]
+
+
+def resolve_review(invoice_id):
+    """Take an invoice off the review queue; False if it was not on it.
+    Saving the invoice again flags it again if it is still below a threshold."""
+    with get_db() as conn:
+        return conn.execute("DELETE FROM review_queue WHERE InvoiceId = ?", (invoice_id,)).rowcount > 0
+
+
+def get_confidence_stats():
+    """Per-field count, mean, standard deviation, flagged count and histogram."""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT Field, Bucket, Count, Sum, SumSquares, Below FROM confidence_stats ORDER BY Field, Bucket"
+        ).fetchall()
+    fields = []
+    for field, group in itertools.groupby(rows, key=lambda r: r[0]):
+        group = list(group)
+        count = sum(r[2] for r in group)
+        mean = sum(r[3] for r in group) / count
+        variance = max(sum(r[4] for r in group) / count - mean * mean, 0.0)
+        histogram = [0] * CONFIDENCE_BUCKETS
+        for r in group:
+            histogram[r[1]] = r[2]
+        fields.append({
+            "field": field,
+            "count": count,
+            "mean": round(mean, 4),
+            "stddev": round(variance ** 0.5, 4),
+            "threshold": REVIEW_THRESHOLDS.get(field),
+            "belowThreshold": sum(r[5] for r in group),
+            "histogram": histogram,
+        })
+    return fields
+
+
+def _month_filter(from_month, to_month):
+    clauses, params = [], []
+    if from_month:
+        clauses.append("Month >= ?")
+        params.append(from_month)
+    if to_month:
+        clauses.append("Month <= ?")
+        params.append(to_month)
+    return clauses, params
+
+
+def _totals_row(row):
+    count, sub_total, shipping, total, items = row
+    return {
+        "invoiceCount": count,
+        "subTotal": round(sub_total, 2),
+        "shippingCost": round(shipping, 2),
+        "invoiceTotal": round(total, 2),
+        "itemCount": items,
+    }
+
+
+def get_vendor_totals(from_month=None, to_month=None):
+    """Totals per vendor, summed over the months in [from_month, to_month] ("YYYY-MM")."""
+    clauses, params = _month_filter(from_month, to_month)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
     with get_db() as conn:
+        rows = conn.execute(f"""
+            SELECT VendorName, SUM(InvoiceCount), SUM(SubTotal), SUM(ShippingCost),
+                   SUM(InvoiceTotal), SUM(ItemCount)
+            FROM vendor_monthly_totals {where}
+            GROUP BY VendorName ORDER BY VendorName
+        """, params).fetchall()
+    return [dict(vendorName=row[0] or None, **_totals_row(row[1:])) for row in rows]
+
+
+def get_monthly_totals(vendor_name=None, from_month=None, to_month=None):
+    """Totals per month, for one vendor or across all of them."""
+    clauses, params = _month_filter(from_month, to_month)
+    if vendor_name is not None:
+        clauses.insert(0, "VendorName = ?")
+        params.insert(0, vendor_name)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with get_db() as conn:
+        rows = conn.execute(f"""
+            SELECT Month, SUM(InvoiceCount), SUM(SubTotal), SUM(ShippingCost),
+                   SUM(InvoiceTotal), SUM(ItemCount)
+            FROM vendor_monthly_totals {where}
+            GROUP BY Month ORDER BY Month
+        """, params).fetchall()
+    return [dict(month=row[0] or None, **_totals_row(row[1:])) for row in rows]
+
+
+def clean_db(path=None, derived=True):
+    """Remove all test data so each test starts clean."""
+    with get_db(path) as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM items")
         cursor.execute("DELETE FROM confidences")
         cursor.execute("DELETE FROM invoices")
+        cursor.execute("DELETE FROM extraction_cache")
+        cursor.execute("DELETE FROM jobs")
+        cursor.execute("DELETE FROM export_watermarks")
+        cursor.execute("DELETE FROM backfill_checkpoints")
+        if derived:
+            cursor.execute("DELETE FROM vendor_monthly_totals")
+            cursor.execute("DELETE FROM invoice_search")
+            cursor.execute("DELETE FROM review_queue")
+            cursor.execute("DELETE FROM confidence_stats")
+    invoice_cache.clear()
 
 
-        
+def _bump_cache_stat(name, n=1):
+    with _stats_lock:
+        extraction_cache_stats[name] += n
+
+
+def record_cache_bypass():
+    _bump_cache_stat("bypassed")
+
+
+def get_cached_extraction(content_hash):
+    """Return the stored extraction result for this PDF hash, or None on a miss."""
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if EXTRACT_CACHE_TTL > 0:
+            cursor.execute("""
+                SELECT Result FROM extraction_cache
+                WHERE ContentHash = ? AND CreatedAt >= ?
+            """, (content_hash, now - EXTRACT_CACHE_TTL))
+        else:
+            cursor.execute(
+                "SELECT Result FROM extraction_cache WHERE ContentHash = ?",
+                (content_hash,),
+            )
+        row = cursor.fetchone()
+        if not row:
+            _bump_cache_stat("misses")
+            return None
+
+        cursor.execute(
+            "UPDATE extraction_cache SET LastUsedAt = ? WHERE ContentHash = ?",
+            (now, content_hash),
+        )
+    _bump_cache_stat("hits")
+    return json.loads(row[0])
+
+
+def cache_extraction(content_hash, result):
+    """Store an extraction result and apply TTL / size eviction."""
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO extraction_cache
+            (ContentHash, Result, CreatedAt, LastUsedAt)
+            VALUES (?, ?, ?, ?)
+        """, (content_hash, json.dumps(result), now, now))
+
+        evicted = 0
+        if EXTRACT_CACHE_TTL > 0:
+            cursor.execute(
+                "DELETE FROM extraction_cache WHERE CreatedAt < ?",
+                (now - EXTRACT_CACHE_TTL,),
+            )
+            evicted += cursor.rowcount
+        if EXTRACT_CACHE_MAX_ENTRIES > 0:
+            # keep the MAX_ENTRIES most recently used rows
+            cursor.execute("""
+                DELETE FROM extraction_cache WHERE ContentHash IN (
+                    SELECT ContentHash FROM extraction_cache
+                    ORDER BY LastUsedAt DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (EXTRACT_CACHE_MAX_ENTRIES,))
+            evicted += cursor.rowcount
+    if evicted:
+        _bump_cache_stat("evictions", evicted)
+
+
+def get_extraction_cache_stats():
+    with get_db() as conn:
+        entries = conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+    with _stats_lock:
+        stats = dict(extraction_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["entries"] = entries
+    stats["hitRate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+JOB_COLUMNS = ("JobId", "Status", "Filename", "Attempts", "StatusCode",
+               "Result", "Error", "CreatedAt", "UpdatedAt")
+
+
+def enqueue_job(job_id, filename, content):
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("""
+            INSERT INTO jobs (JobId, Status, Filename, Content, NextAttemptAt, CreatedAt, UpdatedAt)
+            VALUES (?, 'queued', ?, ?, ?, ?, ?)
+        """, (job_id, filename, content, now, now, now))
+
+
+def claim_next_job():
+    """Atomically move the oldest due job to 'running'.
+
+    Returns (job_id, content, attempts) or None when nothing is due.
+    """
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("""
+                SELECT JobId, Content, Attempts FROM jobs
+                WHERE Status = 'queued' AND NextAttemptAt <= ?
+                ORDER BY NextAttemptAt ASC
+                LIMIT 1
+            """, (now,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            # another worker may have claimed it between SELECT and UPDATE
+            cursor.execute("""
+                UPDATE jobs SET Status = 'running', Attempts = Attempts + 1, UpdatedAt = ?
+                WHERE JobId = ? AND Status = 'queued'
+            """, (now, row[0]))
+            if cursor.rowcount == 1:
+                return row[0], row[1], row[2] + 1
+
+
+def complete_job(job_id, result):
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE jobs SET Status = 'done', StatusCode = 200, Result = ?, Error = NULL,
+                            Content = NULL, UpdatedAt = ?
+            WHERE JobId = ?
+        """, (json.dumps(result), time.time(), job_id))
+
+
+def fail_job(job_id, status_code, error):
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE jobs SET Status = 'failed', StatusCode = ?, Error = ?,
+                            Content = NULL, UpdatedAt = ?
+            WHERE JobId = ?
+        """, (status_code, error, time.time(), job_id))
+
+
+def retry_job(job_id, delay, status_code, error):
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE jobs SET Status = 'queued', StatusCode = ?, Error = ?,
+                            NextAttemptAt = ?, UpdatedAt = ?
+            WHERE JobId = ?
+        """, (status_code, error, now + delay, now, job_id))
+
+
+def requeue_running_jobs():
+    """Jobs left 'running' by a crashed/stopped process go back to the queue."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs SET Status = 'queued', UpdatedAt = ?
+            WHERE Status = 'running'
+        """, (time.time(),))
+        return cursor.rowcount
+
+
+def get_job(job_id):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE JobId = ?", (job_id,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    if job["Result"] is not None:
+        job["Result"] = json.loads(job["Result"])
+    return job
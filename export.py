@@ -0,0 +1,194 @@
+"""Bulk export of invoices, confidences and items to NDJSON or Parquet files.
+
+    python export.py --out exports/ [--format ndjson|parquet] [--name nightly] [--full]
+
+Every save stamps the invoice with a new ChangeSeq (see db_util). An export
+reads all tables from one snapshot and writes the rows of invoices whose
+ChangeSeq is above the named watermark, then moves the watermark to the
+snapshot's highest ChangeSeq. A re-extracted invoice shows up again with all
+of its items, so the consumer replaces by InvoiceId.
+
+Rows are fetched and written in chunks of EXPORT_CHUNK_ROWS, so memory stays
+flat however large the tables are. NDJSON lines are built by SQLite's
+json_object. Parquet needs the optional pyarrow package.
+"""
+import argparse
+import os
+import sys
+import time
+
+from db_util import get_db, init_db, open_connection
+import storage
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional, only for --format parquet
+    pyarrow = None
+
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+# (column, parquet type) per table; "i" is the invoices alias in the incremental joins
+EXPORT_TABLES = {
+    "invoices": [
+        ("InvoiceId", "string"), ("VendorName", "string"), ("InvoiceDate", "string"),
+        ("InvoiceDateISO", "string"), ("BillingAddressRecipient", "string"),
+        ("ShippingAddress", "string"), ("SubTotal", "float64"), ("ShippingCost", "float64"),
+        ("InvoiceTotal", "float64"), ("ChangeSeq", "int64"),
+    ],
+    "confidences": [
+        ("InvoiceId", "string"), ("VendorName", "float64"), ("InvoiceDate", "float64"),
+        ("BillingAddressRecipient", "float64"), ("ShippingAddress", "float64"),
+        ("SubTotal", "float64"), ("ShippingCost", "float64"), ("InvoiceTotal", "float64"),
+    ],
+    "items": [
+        ("id", "int64"), ("InvoiceId", "string"), ("Description", "string"), ("Name", "string"),
+        ("Quantity", "float64"), ("UnitPrice", "float64"), ("Amount", "float64"),
+    ],
+}
+FORMATS = ("ndjson", "parquet")
+
+
+class ExportSnapshot:
+    """A read transaction on its own connection; every table is read as of the same commit."""
+
+    def __init__(self, path=None):
+        self.conn = open_connection(path, check_same_thread=False)
+        self.conn.execute("BEGIN")
+        self.until = self.conn.execute(
+            "SELECT COALESCE(MAX(ChangeSeq), 0) FROM invoices").fetchone()[0]
+
+    def close(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _select(self, table, columns, since):
+        if table == "invoices":
+            sql = f"SELECT {columns} FROM invoices t"
+            return (sql + " WHERE t.ChangeSeq > ?", (since,)) if since else (sql, ())
+        if since:
+            return (f"SELECT {columns} FROM invoices i JOIN {table} t ON t.InvoiceId = i.InvoiceId"
+                    " WHERE i.ChangeSeq > ?", (since,))
+        return f"SELECT {columns} FROM {table} t", ()
+
+    def ndjson_chunks(self, table, since=0, chunk_rows=None):
+        """Yield NDJSON text, one chunk of up to ``chunk_rows`` lines at a time."""
+        pairs = ", ".join(f"'{name}', t.{name}" for name, _ in EXPORT_TABLES[table])
+        sql, params = self._select(table, f"json_object({pairs})", since)
+        cursor = self.conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows or EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield "\n".join([r[0] for r in rows]) + "\n"
+
+    def row_chunks(self, table, since=0, chunk_rows=None):
+        """Yield lists of row tuples, in the EXPORT_TABLES column order."""
+        columns = ", ".join(f"t.{name}" for name, _ in EXPORT_TABLES[table])
+        sql, params = self._select(table, columns, since)
+        cursor = self.conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows or EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield rows
+
+
+def write_ndjson(snapshot, table, path, since=0):
+    rows = 0
+    with open(path, "w", encoding="utf-8", buffering=1024 * 1024) as f:
+        for chunk in snapshot.ndjson_chunks(table, since):
+            f.write(chunk)
+            rows += chunk.count("\n")
+    return rows
+
+
+def write_parquet(snapshot, table, path, since=0):
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    spec = EXPORT_TABLES[table]
+    schema = pyarrow.schema([(name, getattr(pyarrow, kind)()) for name, kind in spec])
+    rows = 0
+    # one row group per fetched chunk
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for chunk in snapshot.row_chunks(table, since):
+            columns = [pyarrow.array(values, type=field.type)
+                       for values, field in zip(zip(*chunk), schema)]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            rows += len(chunk)
+        if not rows:
+            writer.write_table(schema.empty_table())
+    return rows
+
+
+WRITERS = {"ndjson": write_ndjson, "parquet": write_parquet}
+
+
+def get_watermark(name):
+    with get_db() as conn:
+        row = conn.execute("SELECT ChangeSeq FROM export_watermarks WHERE Name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_watermark(name, change_seq):
+    with get_db() as conn:
+        conn.execute("""
+            INSERT INTO export_watermarks (Name, ChangeSeq, ExportedAt) VALUES (?, ?, ?)
+            ON CONFLICT (Name) DO UPDATE SET ChangeSeq = excluded.ChangeSeq,
+                                             ExportedAt = excluded.ExportedAt
+        """, (name, change_seq, time.time()))
+
+
+def export(out_dir, fmt="ndjson", name="default", full=False, tables=None):
+    """Write one file per table under ``out_dir`` and advance watermark ``name``.
+
+    Returns {"since", "until", "files": {table: (path, rows)}}. Files are
+    written as ``.part`` and renamed when complete; the watermark only moves
+    after every file is in place, so a failed run is simply repeated.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    since = 0 if full else get_watermark(name)
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    with ExportSnapshot() as snapshot:
+        until = snapshot.until
+        for table in tables or EXPORT_TABLES:
+            path = os.path.join(out_dir, f"{table}.{since}-{until}.{fmt}")
+            rows = WRITERS[fmt](snapshot, table, path + ".part", since)
+            os.replace(path + ".part", path)
+            files[table] = (path, rows)
+    set_watermark(name, until)
+    return {"since": since, "until": until, "files": files}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored invoices as NDJSON or Parquet")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--name", default="default", help="watermark to read and advance")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and export everything")
+    parser.add_argument("--table", action="append", choices=list(EXPORT_TABLES),
+                        help="export only this table (repeatable)")
+    args = parser.parse_args(argv)
+    if storage.STORAGE_BACKEND != "sqlite":
+        parser.error(f"STORAGE_BACKEND={storage.STORAGE_BACKEND}: invoices are not in the sqlite database")
+
+    init_db()
+    t0 = time.perf_counter()
+    summary = export(args.out, args.format, args.name, args.full, args.table)
+    elapsed = time.perf_counter() - t0
+    for table, (path, rows) in summary["files"].items():
+        print(f"{table:12} {rows:>12} rows  {path}")
+    print(f"ChangeSeq {summary['since']} -> {summary['until']} in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
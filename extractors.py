@@ -0,0 +1,215 @@
+"""Local extractors that run before the OCI Document AI call.
+
+An extractor takes the PDF bytes and returns a result in the same shape as
+``app.parse_analyze_response`` ({confidence, data, dataConfidence}), or None
+when the file is not one it knows. ``extract_local`` tries the registered
+extractors in order; a result below LOCAL_MIN_CONFIDENCE is dropped so the
+file goes to OCI instead.
+"""
+import logging
+import os
+
+from normalize import clean_money, to_quantity
+from pdf_text import text_runs
+
+
+# 0 -> כל קובץ נשלח ל-OCI
+LOCAL_EXTRACT_ENABLED = os.getenv("LOCAL_EXTRACT_ENABLED", "1") != "0"
+LOCAL_MIN_CONFIDENCE = float(os.getenv("LOCAL_MIN_CONFIDENCE", "0.95"))
+# larger uploads go straight to OCI from the spool file, without a bytes copy for the parser
+LOCAL_EXTRACT_MAX_BYTES = int(os.getenv("LOCAL_EXTRACT_MAX_BYTES", str(2 * 1024 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+
+class Extractor:
+    """Base class for local extractors. ``extract`` returns a result dict or None."""
+
+    name = "extractor"
+    # pages of the text layer the extractor reads (None = all); the rest is never decoded
+    max_pages = None
+
+    def extract(self, pdf_bytes: bytes):
+        raise NotImplementedError
+
+
+def _same_line(a, b, tolerance=2.0):
+    return a.page == b.page and abs(a.top - b.top) <= tolerance
+
+
+def _money_total(values):
+    return round(sum(values), 2)
+
+
+class SuperStoreTemplate(Extractor):
+    """Text-layer parser for the SuperStore invoice layout (invoices_sample/).
+
+    The layout is a header with "SuperStore" / "INVOICE" / "# <id>", labelled
+    "Label : value" rows, "Bill To" / "Ship To" columns and an
+    Item/Quantity/Rate/Amount table. Each field found gets confidence 1.0.
+    Fields that fail the arithmetic checks get 0.5: line amounts vs.
+    quantity x rate, the items vs. the subtotal, and subtotal - discount +
+    shipping vs. the total. The document confidence is the lowest field
+    confidence.
+    """
+
+    name = "superstore"
+    vendor = "SuperStore"
+    max_pages = 1  # the whole invoice is on the first page
+    header_labels = {
+        "Date": "InvoiceDate",
+        "Balance Due": "AmountDue",
+        "Subtotal": "SubTotal",
+        "Shipping": "ShippingCost",
+        "Total": "InvoiceTotal",
+    }
+    money_fields = ("AmountDue", "SubTotal", "ShippingCost", "InvoiceTotal")
+    required = ("InvoiceId", "InvoiceDate", "BillingAddressRecipient", "ShippingAddress",
+                "InvoiceTotal", "SubTotal")
+
+    def extract(self, pdf_bytes: bytes):
+        runs = text_runs(pdf_bytes, max_pages=self.max_pages)
+        texts = [r.text for r in runs]
+        if self.vendor not in texts or "INVOICE" not in texts:
+            return None
+        runs.sort(key=lambda r: (r.top, r.x))
+
+        data = {"VendorName": self.vendor, "VendorNameLogo": self.vendor}
+        discount = 0.0
+
+        for run in runs:
+            if run.text.startswith("# ") and "InvoiceId" not in data:
+                data["InvoiceId"] = run.text[2:].strip()
+                continue
+            label = run.text
+            field = self.header_labels.get(label)
+            if field is None and not label.startswith("Discount"):
+                continue
+            value = self._value_right_of(runs, run)
+            if value is None:
+                continue
+            if field is None:
+                discount = clean_money(value) or 0.0
+            elif field in self.money_fields:
+                data[field] = clean_money(value)
+            else:
+                data[field] = value
+
+        bill_to = self._column_below(runs, "Bill To")
+        if bill_to:
+            data["BillingAddressRecipient"] = bill_to[0]
+        ship_to = self._column_below(runs, "Ship To")
+        if ship_to:
+            data["ShippingAddress"] = " ".join(ship_to)
+
+        data["Items"] = self._items(runs)
+
+        data_confidence = {k: 1.0 for k in data if k != "Items"}
+        if any(data.get(k) is None for k in self.required) or not data["Items"]:
+            return {"confidence": 0.0, "data": data, "dataConfidence": data_confidence}
+
+        item_amounts = [i["Amount"] for i in data["Items"]]
+        checks = [
+            (("SubTotal",), None not in item_amounts
+             and _money_total(item_amounts) == data["SubTotal"]),
+            (("InvoiceTotal", "ShippingCost"), data.get("ShippingCost") is not None
+             and _money_total([data["SubTotal"], -discount, data["ShippingCost"]])
+             == data["InvoiceTotal"]),
+        ]
+        if data.get("AmountDue") is not None:
+            checks.append((("AmountDue",), data["AmountDue"] == data["InvoiceTotal"]))
+        for item in data["Items"]:
+            if None in (item["Quantity"], item["UnitPrice"], item["Amount"]) or abs(
+                    item["Quantity"] * item["UnitPrice"] - item["Amount"]) > 0.01 * item["Quantity"]:
+                checks.append((("SubTotal",), False))
+        for fields, ok in checks:
+            if not ok:
+                for f in fields:
+                    data_confidence[f] = 0.5
+
+        return {
+            "confidence": min(data_confidence.values()),
+            "data": data,
+            "dataConfidence": data_confidence,
+        }
+
+    @staticmethod
+    def _value_right_of(runs, label):
+        """Text after the ":" on the label's line (the ``Label : value`` rows)."""
+        line = [r for r in runs if _same_line(r, label) and r.x > label.x]
+        line.sort(key=lambda r: r.x)
+        if len(line) >= 2 and line[0].text == ":":
+            return line[1].text
+        return None
+
+    @staticmethod
+    def _column_below(runs, label_text):
+        label = next((r for r in runs if r.text == label_text), None)
+        if label is None:
+            return []
+        column = []
+        for r in runs:
+            if r.top <= label.top + 2 or abs(r.x - label.x) > 2:
+                continue
+            if column and r.top - column[-1].top > 30:
+                break
+            column.append(r)
+        return [r.text for r in column]
+
+    @staticmethod
+    def _items(runs):
+        header = {r.text: r for r in runs if r.text in ("Item", "Quantity", "Rate", "Amount")}
+        if len(header) < 4:
+            return []
+        end = next((r.top for r in runs if r.text == "Subtotal"), float("inf"))
+        body = [r for r in runs if header["Item"].top + 2 < r.top < end - 2]
+
+        items = []
+        current = None
+        for r in body:
+            if abs(r.x - header["Item"].x) <= 2:
+                if current is not None and not _same_line(r, current["_row"]):
+                    current["Description"] += " " + r.text
+                    continue
+                current = {"_row": r, "Description": r.text, "values": []}
+                items.append(current)
+            elif current is not None and _same_line(r, current["_row"]):
+                current["values"].append(r)
+
+        result = []
+        for item in items:
+            values = sorted(item["values"], key=lambda r: r.x)
+            quantity = next((v.text for v in values
+                             if abs(v.x - header["Quantity"].x) <= 2), None)
+            money = [v.text for v in values if v.text.startswith("$")]
+            result.append({
+                "Description": item["Description"],
+                "Name": item["Description"],
+                "Quantity": to_quantity(quantity),
+                "UnitPrice": clean_money(money[0]) if len(money) == 2 else None,
+                "Amount": clean_money(money[-1]) if money else None,
+            })
+        return result
+
+
+# סדר הרישום = סדר הניסיון
+local_extractors = [SuperStoreTemplate()]
+
+
+def register(extractor: Extractor):
+    local_extractors.append(extractor)
+
+
+def extract_local(pdf_bytes: bytes):
+    """(extractor name, result) from the first confident local extractor, or (None, None)."""
+    if not LOCAL_EXTRACT_ENABLED:
+        return None, None
+    for extractor in local_extractors:
+        try:
+            result = extractor.extract(pdf_bytes)
+        except Exception:
+            logger.exception("Local extractor %s failed", extractor.name)
+            continue
+        if result is not None and result["confidence"] >= LOCAL_MIN_CONFIDENCE:
+            return extractor.name, result
+    return None, None
@@ -0,0 +1,96 @@
+import logging
+import os
+import random
+import threading
+
+from db_util import (
+    claim_next_job, complete_job, fail_job, retry_job, requeue_running_jobs,
+)
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# backoff אחרי 503: base * 2^(attempt-1), עד max, עם jitter
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "60"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempt):
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobWorkerPool:
+    """Background threads that drain the persistent `jobs` table.
+
+    ``handler(pdf_bytes)`` returns the extraction result or raises an
+    exception with a ``status_code``/``detail`` (HTTPException). 503s are
+    retried with exponential backoff up to JOB_MAX_ATTEMPTS; any other error
+    fails the job.
+    """
+
+    def __init__(self, handler, workers=JOB_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self, requeue=True):
+        # multi-worker mode: the supervisor requeues once, before any worker is running jobs
+        if requeue:
+            requeued = requeue_running_jobs()
+            if requeued:
+                logger.info("Requeued %d interrupted jobs", requeued)
+        self._stop.clear()
+        for n in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"job-worker-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake idle workers right away instead of waiting for the next poll."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                worked = self.run_once()
+            except Exception:  # pragma: no cover
+                logger.exception("Job worker error")
+                worked = False
+            if not worked:
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+
+    def run_once(self):
+        """Claim and process one due job. Returns False when the queue is empty."""
+        job = claim_next_job()
+        if job is None:
+            return False
+
+        job_id, content, attempt = job
+        try:
+            result = self.handler(content)
+        except Exception as exc:
+            status_code = getattr(exc, "status_code", 500)
+            error = str(getattr(exc, "detail", exc))
+            if status_code == 503 and attempt < JOB_MAX_ATTEMPTS:
+                retry_job(job_id, retry_delay(attempt), status_code, error)
+            else:
+                if status_code == 500:
+                    logger.exception("Job %s failed", job_id)
+                fail_job(job_id, status_code, error)
+        else:
+            complete_job(job_id, result)
+        return True
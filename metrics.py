@@ -0,0 +1,180 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+Each observation is a dict lookup plus a bisect under a per-metric lock,
+cheap enough to leave on in production. No external dependency.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_collectors = {}
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), register=True):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if register:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._render_values(sorted(self._values.items())))
+        return lines
+
+    def _render_values(self, items):
+        return [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, register=True):
+        super().__init__(name, help, labels, register)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_values(self, items):
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', le))} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+def register_collector(fn):
+    """``fn()`` returns [(name, kind, help, value)] computed at scrape time.
+    Re-registering the same function (module reload) replaces it."""
+    _collectors[f"{fn.__module__}.{fn.__qualname__}"] = fn
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors.values():
+        for name, kind, help, value in collect():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
+
+
+# --- metrics of this service -------------------------------------------------
+
+EXTRACT_STAGE_SECONDS = Histogram(
+    "invoice_extract_stage_seconds",
+    "Time spent in each /extract stage (read, cache_lookup, local, encode, oci, parse, save).",
+    labels=("stage",),
+)
+EXTRACT_REQUESTS = Counter(
+    "invoice_extract_requests_total", "Completed /extract requests by HTTP status.", labels=("status",),
+)
+EXTRACT_IN_FLIGHT = Gauge("invoice_extract_in_flight", "Extractions currently being processed.")
+OCI_CALLS = Counter(
+    "invoice_oci_calls_total", "analyze_document calls by outcome (success, error, retry).", labels=("outcome",),
+)
+DOCUMENT_CONFIDENCE = Histogram(
+    "invoice_document_confidence", "Detected document-type confidence of analyzed files.",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0),
+)
+LOCAL_EXTRACTIONS = Counter(
+    "invoice_local_extract_total",
+    "Files tried against the local template extractors, by the extractor that handled them "
+    "(none = sent to OCI).",
+    labels=("extractor",),
+)
+DB_QUERY_SECONDS = Histogram(
+    "invoice_db_query_seconds", "Latency of invoice lookups against SQLite.", labels=("query",),
+)
@@ -0,0 +1,106 @@
+"""Single-pass conversion of OCI analyze_document output into the result dict.
+
+Field conversions are declared in HEADER_CONVERTERS / ITEM_CONVERTERS; the
+walker below applies them without re-building lookup tables per field.
+"""
+import re
+
+
+_NOT_MONEY = re.compile(r"[^\d.]")
+
+
+# לנקות ערכים כספיים מסימנים
+def clean_money(value):
+    if not value:
+        return None
+    # fast path: "53.82" / "3" need no regex
+    if value.isascii() and value.replace(".", "", 1).isdigit():
+        return float(value)
+    v = _NOT_MONEY.sub("", value)
+    return float(v) if v else None
+
+
+def to_quantity(value):
+    v = clean_money(value)
+    return int(v) if v is not None else None
+
+
+def _header_money(value):
+    # header money fields keep "" / None as-is (only non-empty text is cleaned)
+    return clean_money(value) if value else value
+
+
+HEADER_CONVERTERS = {
+    "SubTotal": _header_money,
+    "ShippingCost": _header_money,
+    "InvoiceTotal": _header_money,
+    "AmountDue": _header_money,
+}
+
+ITEM_CONVERTERS = {
+    "Description": None,
+    "Name": None,
+    "Quantity": to_quantity,
+    "UnitPrice": clean_money,
+    "Amount": clean_money,
+}
+
+_ITEM_TEMPLATE = dict.fromkeys(ITEM_CONVERTERS)
+
+
+def _text(value_obj):
+    return getattr(value_obj, "text", None) if value_obj else None
+
+
+def _line_items(field_value):
+    items = []
+    item_converters = ITEM_CONVERTERS
+    template = _ITEM_TEMPLATE
+    for row in getattr(field_value, "items", None) or []:
+        item = template.copy()
+        cols = getattr(getattr(row, "field_value", None), "items", None) or []
+        for c in cols:
+            try:
+                # OCI models always carry these attributes; fall back if one is missing/None
+                k = c.field_label.name
+                v = c.field_value.text
+            except AttributeError:
+                k = getattr(getattr(c, "field_label", None), "name", None)
+                v = _text(getattr(c, "field_value", None))
+            if k not in item:
+                continue
+            convert = item_converters[k]
+            item[k] = convert(v) if convert else v
+        items.append(item)
+    return items
+
+
+def normalize_document(document):
+    """``response.data`` of analyze_document -> (confidence, data, dataConfidence)."""
+    data = {}
+    data_confidence = {}
+    header_converters = HEADER_CONVERTERS
+
+    for page in document.pages or []:
+        for field in getattr(page, "document_fields", None) or []:
+            field_value = getattr(field, "field_value", None)
+
+            if field.field_type == "LINE_ITEM_GROUP":
+                data["Items"] = _line_items(field_value)
+                continue
+
+            label = getattr(field, "field_label", None)
+            field_name = getattr(label, "name", None)
+            if not field_name:
+                continue
+
+            v = getattr(field_value, "text", None)
+            convert = header_converters.get(field_name)
+            data[field_name] = convert(v) if convert else v
+            data_confidence[field_name] = getattr(label, "confidence", None)
+
+    confidence = 0.0
+    for doc_type in document.detected_document_types or []:
+        confidence = doc_type.confidence if doc_type.confidence is not None else 0.0
+
+    return confidence, data, data_confidence
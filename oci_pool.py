@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+import oci
+
+
+OCI_CONFIG_FILE = os.getenv("OCI_CONFIG_FILE", oci.config.DEFAULT_LOCATION)
+OCI_CONFIG_PROFILE = os.getenv("OCI_CONFIG_PROFILE", oci.config.DEFAULT_PROFILE)
+# כל כמה שניות לבדוק אם קובץ ה-config / המפתח הוחלפו (רוטציה של credentials)
+OCI_CONFIG_CHECK_INTERVAL = float(os.getenv("OCI_CONFIG_CHECK_INTERVAL", "30"))
+# timeout לכל ניסיון (connect, read) בשניות
+OCI_CONNECT_TIMEOUT = float(os.getenv("OCI_CONNECT_TIMEOUT", "5"))
+OCI_READ_TIMEOUT = float(os.getenv("OCI_READ_TIMEOUT", "20"))
+
+logger = logging.getLogger(__name__)
+
+
+def _default_client_factory(config):
+    # retries are done by app.call_oci, behind the circuit breaker
+    return oci.ai_document.AIServiceDocumentClient(
+        config,
+        retry_strategy=oci.retry.NoneRetryStrategy(),
+        timeout=(OCI_CONNECT_TIMEOUT, OCI_READ_TIMEOUT),
+    )
+
+
+class OciClientPool:
+    """Long-lived Document AI clients, one per worker thread.
+
+    OCI clients keep an HTTPS session, so reusing them keeps connections
+    alive across requests. Clients are not shared between threads; the OCI
+    executor's worker threads each get their own, which makes the pool size
+    equal to OCI_MAX_CONCURRENCY.
+
+    The config file (and the key file it points to) is re-checked every
+    ``check_interval`` seconds. When either changes, the config is reloaded
+    and every thread builds a fresh client on its next call.
+    """
+
+    def __init__(self, config_file=OCI_CONFIG_FILE, profile=OCI_CONFIG_PROFILE,
+                 check_interval=OCI_CONFIG_CHECK_INTERVAL,
+                 client_factory=_default_client_factory, config_loader=oci.config.from_file):
+        self.config_file = os.path.expanduser(config_file)
+        self.profile = profile
+        self.check_interval = check_interval
+        self.client_factory = client_factory
+        self.config_loader = config_loader
+
+        self.generation = 0
+        self._config = None
+        self._fingerprint = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._clients = []
+
+    def _files_fingerprint(self, config):
+        paths = [self.config_file]
+        if config and config.get("key_file"):
+            paths.append(os.path.expanduser(config["key_file"]))
+        fingerprint = []
+        for path in paths:
+            try:
+                fingerprint.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    def _load(self):
+        config = self.config_loader(self.config_file, self.profile)
+        self._config = config
+        self._fingerprint = self._files_fingerprint(config)
+        self._last_check = time.monotonic()
+        self.generation += 1
+
+    def start(self):
+        """Load the config once at startup. Missing config is not fatal here;
+        the first extraction will try again and fail with 503."""
+        with self._lock:
+            try:
+                self._load()
+            except Exception as exc:
+                logger.warning("OCI config not loaded at startup: %s", exc)
+
+    def _refresh_if_rotated(self):
+        now = time.monotonic()
+        if self._config is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if self._config is None:
+                self._load()
+                return
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            if self._files_fingerprint(self._config) != self._fingerprint:
+                logger.info("OCI config changed on disk, reloading credentials")
+                self._load()
+
+    def invalidate(self):
+        """Force a config reload and new clients, e.g. after a 401."""
+        with self._lock:
+            self._config = None
+
+    def get(self):
+        self._refresh_if_rotated()
+        local = self._local
+        if getattr(local, "generation", None) != self.generation:
+            client = self.client_factory(self._config)
+            with self._lock:
+                old = getattr(local, "client", None)
+                if old is not None and old in self._clients:
+                    self._clients.remove(old)
+                self._clients.append(client)
+            local.client = client
+            local.generation = self.generation
+            if old is not None:
+                _close_client(old)
+        return local.client
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, []
+            self.generation += 1
+        for client in clients:
+            _close_client(client)
+
+
+def _close_client(client):
+    session = getattr(getattr(client, "base_client", None), "session", None)
+    if session is not None:
+        try:
+            session.close()
+        except Exception:  # pragma: no cover
+            pass
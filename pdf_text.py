@@ -0,0 +1,463 @@
+"""Minimal reader for the text layer of simple PDFs.
+
+Enough of PDF to position the text of machine-generated invoices: plain
+(non-object-stream) files, FlateDecode content streams, Type0/Identity-H
+fonts with a ToUnicode CMap and simple one-byte fonts. Anything it does not
+understand yields no text, so callers fall back to OCI.
+
+Uploads are untrusted, so decoding is bounded: PDF_TEXT_MAX_DECODED_BYTES
+of stream data per document, ToUnicode ranges of at most CMAP_MAX_RANGE
+codes, and only the pages a caller asks for. A file over a limit also
+yields no text. Objects, BT/ET blocks and CMap sections are found by
+searching forward for their end marker, never with a lazy regex, so
+parsing is linear in the input; an unclosed one ends the scan.
+"""
+import os
+import re
+import zlib
+from collections import namedtuple
+
+
+# page: 0-based; x: from the left edge; top: from the top edge (points)
+TextRun = namedtuple("TextRun", "page x top text")
+
+# (?<!\d): a match starts only at the first digit, so a long run of digits is scanned once
+_OBJ = re.compile(rb"(?<!\d)(\d+)\s+\d+\s+obj\b")
+_REF = re.compile(rb"(?<!\d)(\d+)\s+\d+\s+R")
+_STREAM = re.compile(rb"stream\r?\n")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_ESCAPES = {ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b", ord("f"): b"\f"}
+
+# TJ offsets below this (thousandths of an em) are treated as a word gap
+_TJ_SPACE = -250
+_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# zip bomb: סכום ה-streams המפוענחים במסמך אחד
+PDF_TEXT_MAX_DECODED_BYTES = int(os.getenv("PDF_TEXT_MAX_DECODED_BYTES", str(8 * 1024 * 1024)))
+# a bfrange covers at most every two-byte code; all ToUnicode CMaps of a document
+# together map at most PDF_TEXT_MAX_CMAP_CODES codes
+CMAP_MAX_RANGE = 0xFFFF
+PDF_TEXT_MAX_CMAP_CODES = int(os.getenv("PDF_TEXT_MAX_CMAP_CODES", str(4 * 0x10000)))
+
+
+class PdfLimitExceeded(Exception):
+    """The document needs more decoding than the limits allow."""
+
+
+def _objects(data):
+    """{number: body} of every "N G obj ... endobj"; stops at an object with no endobj.
+
+    Each endobj is found with bytes.find from the end of its header, so the
+    scan is linear in the file even when objects are left open.
+    """
+    objects = {}
+    pos = 0
+    while True:
+        m = _OBJ.search(data, pos)
+        if not m:
+            return objects
+        end = data.find(b"endobj", m.end())
+        if end < 0:
+            return objects
+        objects[int(m.group(1))] = data[m.end():end]
+        pos = end + len(b"endobj")
+
+
+def _between(data, begin, end):
+    """The bodies of begin...end sections, scanned with bytes.find; stops at an unclosed one."""
+    sections = []
+    pos = 0
+    while True:
+        start = data.find(begin, pos)
+        if start < 0:
+            return sections
+        stop = data.find(end, start + len(begin))
+        if stop < 0:
+            return sections
+        sections.append(data[start + len(begin):stop])
+        pos = stop + len(end)
+
+
+class PdfDocument:
+    """Objects of a PDF, indexed by number, with stream decoding."""
+
+    def __init__(self, data: bytes, max_decoded=None):
+        self.objects = _objects(data)
+        self.decoded_budget = PDF_TEXT_MAX_DECODED_BYTES if max_decoded is None else max_decoded
+        self.cmap_budget = PDF_TEXT_MAX_CMAP_CODES
+
+    def get(self, ref):
+        m = _REF.fullmatch(ref.strip()) if ref else None
+        return self.objects.get(int(m.group(1)), b"") if m else ref
+
+    def entry(self, body, key):
+        """Raw value of ``/key`` in a dictionary body (a ref, a name, a number or a dict)."""
+        m = re.search(rb"/" + key + rb"(?![A-Za-z])\s*", body)
+        if not m:
+            return None
+        rest = body[m.end():]
+        if rest.startswith(b"<<"):
+            return _balanced(rest, b"<<", b">>")
+        if rest.startswith(b"["):
+            return _balanced(rest, b"[", b"]")
+        ref = re.match(rb"\d+\s+\d+\s+R", rest)
+        if ref:
+            return ref.group(0)
+        return re.match(rb"[^\s/<>\[\]]*(?:/[^\s/<>\[\]]+)?", rest).group(0)
+
+    def resolve(self, body, key):
+        return self.get(self.entry(body, key))
+
+    def stream(self, body):
+        m = _STREAM.search(body)
+        if not m:
+            return b""
+        dictionary = body[:m.start()]
+        length = self.get(self.entry(dictionary, b"Length"))
+        data = body[m.end():]
+        try:
+            data = data[:int(length)]
+        except (TypeError, ValueError):
+            data = data[:data.rfind(b"endstream")].rstrip(b"\r\n")
+        filters = self.entry(dictionary, b"Filter") or b""
+        if b"FlateDecode" in filters:
+            try:
+                # one byte over the budget is enough to know it does not fit
+                data = zlib.decompressobj().decompress(data, self.decoded_budget + 1)
+            except zlib.error:
+                return b""
+        elif filters:
+            return b""
+        if len(data) > self.decoded_budget:
+            raise PdfLimitExceeded("decoded streams over PDF_TEXT_MAX_DECODED_BYTES")
+        self.decoded_budget -= len(data)
+        return data
+
+    def pages(self):
+        roots = [body for body in self.objects.values()
+                 if re.search(rb"/Type\s*/Pages\b", body) and b"/Parent" not in body]
+        pages = []
+        for root in roots[:1]:
+            self._collect_pages(root, {}, pages, depth=0)
+        return pages
+
+    def _collect_pages(self, node, inherited, pages, depth):
+        inherited = dict(inherited)
+        for key in (b"Resources", b"MediaBox"):
+            value = self.entry(node, key)
+            if value is not None:
+                inherited[key] = value
+        if re.search(rb"/Type\s*/Pages\b", node):
+            if depth > 32:
+                return
+            for ref in _REF.findall(self.entry(node, b"Kids") or b""):
+                self._collect_pages(self.objects.get(int(ref), b""), inherited, pages, depth + 1)
+        else:
+            pages.append((node, inherited))
+
+
+def _balanced(data, open_token, close_token):
+    depth = 0
+    i = 0
+    while i < len(data):
+        if data.startswith(open_token, i):
+            depth += 1
+            i += len(open_token)
+        elif data.startswith(close_token, i):
+            depth -= 1
+            i += len(close_token)
+            if depth == 0:
+                return data[:i]
+        else:
+            i += 1
+    return data
+
+
+def parse_cmap(data: bytes, max_codes=PDF_TEXT_MAX_CMAP_CODES):
+    """ToUnicode CMap -> {code: text}; PdfLimitExceeded past ``max_codes`` entries."""
+    mapping = {}
+    codes = 0
+    for section in _between(data, b"beginbfchar", b"endbfchar"):
+        for code, text in re.findall(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>", section):
+            mapping[int(code, 16)] = _utf16(text)
+            codes += 1
+    for section in _between(data, b"beginbfrange", b"endbfrange"):
+        for lo, hi, dst in re.findall(
+                rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(\[[^\]]*\]|<[0-9A-Fa-f]+>)", section):
+            lo, hi = int(lo, 16), int(hi, 16)
+            if not 0 <= hi - lo <= CMAP_MAX_RANGE:
+                raise PdfLimitExceeded("bfrange over CMAP_MAX_RANGE codes")
+            codes += hi - lo + 1
+            if codes > max_codes:
+                raise PdfLimitExceeded("CMaps over PDF_TEXT_MAX_CMAP_CODES codes")
+            if dst.startswith(b"["):
+                for i, text in enumerate(re.findall(rb"<([0-9A-Fa-f]*)>", dst)):
+                    mapping[lo + i] = _utf16(text)
+            else:
+                start = int(dst[1:-1], 16)
+                for i in range(hi - lo + 1):
+                    mapping[lo + i] = chr(start + i)
+    return mapping
+
+
+def _utf16(hex_text):
+    return bytes.fromhex(hex_text.decode()).decode("utf-16-be", "replace")
+
+
+class _Font:
+
+    def __init__(self, pdf, body):
+        self.two_byte = b"Identity-H" in (pdf.entry(body, b"Encoding") or b"")
+        to_unicode = pdf.entry(body, b"ToUnicode")
+        self.cmap = None
+        if to_unicode:
+            self.cmap = parse_cmap(pdf.stream(pdf.get(to_unicode)), pdf.cmap_budget)
+            pdf.cmap_budget -= len(self.cmap)
+
+    def decode(self, raw: bytes):
+        if self.two_byte:
+            codes = [int.from_bytes(raw[i:i + 2], "big") for i in range(0, len(raw) - 1, 2)]
+        else:
+            codes = list(raw)
+        if self.cmap is None:
+            return "".join(chr(c) for c in codes)
+        return "".join(self.cmap.get(c, "") for c in codes)
+
+
+_TOKEN = re.compile(
+    rb"[ \t\r\n\f\x00]*(?:%[^\r\n]*"
+    rb"|(?P<dict><<|>>)"
+    rb"|<(?P<hex>[0-9A-Fa-f \t\r\n]*)>"
+    rb"|(?P<bracket>[\[\]])"
+    rb"|/(?P<name>[^ \t\r\n\f\x00/<>\[\]{}()%]*)"
+    rb"|(?P<num>[+-]?(?:\d+\.?\d*|\.\d+))(?![^ \t\r\n\f\x00/<>\[\]{}()%])"
+    rb"|(?P<op>[^ \t\r\n\f\x00/<>\[\]{}()%]+)"
+    rb"|(?P<str>\()"
+    rb"|.|$)"
+)
+
+
+def _literal(data, i):
+    """Decode a (...) string starting after its "(" -> (bytes, end index)."""
+    out = bytearray()
+    depth = 1
+    n = len(data)
+    while i < n:
+        ch = data[i]
+        if ch == 0x5C and i + 1 < n:  # backslash
+            nxt = data[i + 1]
+            if nxt in _ESCAPES:
+                out += _ESCAPES[nxt]
+                i += 2
+            elif 48 <= nxt <= 55:
+                octal = re.match(rb"[0-7]{1,3}", data[i + 1:i + 4]).group(0)
+                out.append(int(octal, 8) & 0xFF)
+                i += 1 + len(octal)
+            elif nxt in b"\r\n":
+                i += 2
+            else:
+                out.append(nxt)
+                i += 2
+            continue
+        if ch == 0x28:
+            depth += 1
+        elif ch == 0x29:
+            depth -= 1
+            if not depth:
+                return bytes(out), i + 1
+        out.append(ch)
+        i += 1
+    return bytes(out), n
+
+
+def _tokens(data: bytes):
+    """Content-stream tokens: (kind, value) with kind in num/str/name/op/[/]."""
+    i, n = 0, len(data)
+    match = _TOKEN.match
+    while i < n:
+        m = match(data, i)
+        i = m.end()
+        kind = m.lastgroup
+        if kind is None:
+            continue
+        if kind == "num":
+            yield "num", float(m.group("num"))
+        elif kind == "hex":
+            hex_text = re.sub(rb"\s", b"", m.group("hex"))
+            if len(hex_text) % 2:
+                hex_text += b"0"
+            yield "str", bytes.fromhex(hex_text.decode())
+        elif kind == "str":
+            value, i = _literal(data, i)
+            yield "str", value
+        elif kind == "name":
+            yield "name", _Name(m.group("name"))
+        elif kind == "bracket":
+            yield m.group("bracket").decode(), None
+        elif kind == "dict":
+            yield "op", m.group("dict")
+        else:
+            op = m.group("op")
+            if op == b"BI":
+                # inline image: skip its binary data
+                end = data.find(b"EI", i)
+                i = n if end < 0 else end + 2
+                continue
+            yield "op", op
+
+
+class _Name(bytes):
+    """A /Name operand, told apart from string operands by type."""
+
+
+class _Array(list):
+    """A closed [...] operand."""
+
+
+# outside BT/ET only q/Q/cm matter; the matching ET is then found with a plain search
+_SECTIONS = re.compile(rb"\b(?:(?P<bt>BT)|(?P<q>[qQ])|(?P<cm>cm))\b")
+_ET = re.compile(rb"\bET\b")
+
+
+def _multiply(m, n):
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (a * a2 + b * c2, a * b2 + b * d2,
+            c * a2 + d * c2, c * b2 + d * d2,
+            e * a2 + f * c2 + e2, e * b2 + f * d2 + f2)
+
+
+def _page_runs(pdf, page_no, page, inherited):
+    resources = pdf.get(inherited.get(b"Resources")) or b""
+    fonts_dict = pdf.get(pdf.entry(resources, b"Font")) or b""
+    fonts = {}
+    for name, ref in re.findall(rb"/([^\s/<>\[\]]+)\s+(\d+\s+\d+\s+R)", fonts_dict):
+        fonts[name] = _Font(pdf, pdf.get(ref))
+
+    media_box = [float(v) for v in _NUMBER.findall(inherited.get(b"MediaBox") or b"")]
+    page_top = media_box[3] if len(media_box) == 4 else 792.0
+
+    contents = pdf.entry(page, b"Contents") or b""
+    data = b"\n".join(pdf.stream(pdf.objects.get(int(ref), b"")) for ref in _REF.findall(contents))
+
+    runs = []
+    ctm, stack = _IDENTITY, []
+    tm = tlm = _IDENTITY
+    font = None
+    leading = 0.0
+    current = None  # [x, top, text] of the run being built
+
+    def finish():
+        nonlocal current
+        if current and current[2].strip():
+            runs.append(TextRun(page_no, round(current[0], 2), round(current[1], 2),
+                                current[2].strip()))
+        current = None
+
+    def show(text):
+        nonlocal current
+        a, b, c, d, e, f = _multiply(tm, ctm)
+        top = page_top - f
+        if current is None or abs(current[1] - top) > 0.5:
+            finish()
+            current = [e, top, ""]
+        current[2] += text
+
+    def move(tx, ty):
+        nonlocal tm, tlm
+        tlm = _multiply((1.0, 0.0, 0.0, 1.0, tx, ty), tlm)
+        tm = tlm
+
+    # only BT/ET blocks are tokenized; an unclosed BT ends the page
+    pos = 0
+    while True:
+        section = _SECTIONS.search(data, pos)
+        if not section:
+            break
+        pos = section.end()
+        if section.group("cm"):
+            operands = data[max(0, section.start() - 200):section.start()].split()[-6:]
+            if len(operands) == 6 and all(_NUMBER.fullmatch(v) for v in operands):
+                ctm = _multiply(tuple(float(v) for v in operands), ctm)
+            continue
+        if section.group("q"):
+            if section.group("q") == b"q":
+                stack.append(ctm)
+            else:
+                ctm = stack.pop() if stack else _IDENTITY
+            continue
+        end = _ET.search(data, pos)
+        if not end:
+            break
+        text, pos = data[pos:end.start()], end.end()
+
+        tm = tlm = _IDENTITY
+        operands = []
+        for kind, value in _tokens(text):
+            if kind != "op":
+                if kind == "[":
+                    operands.append([])
+                elif kind == "]":
+                    if not (operands and isinstance(operands[-1], list)):
+                        operands.append([])
+                    operands[-1] = _Array(operands[-1])
+                elif operands and type(operands[-1]) is list:
+                    operands[-1].append(value)
+                else:
+                    operands.append(value)
+                continue
+
+            nums = [v for v in operands if type(v) is float]
+            if value in (b"Td", b"TD") and len(nums) == 2:
+                if value == b"TD":
+                    leading = -nums[1]
+                move(*nums)
+            elif value in (b"Tj", b"'", b'"'):
+                if value != b"Tj":
+                    move(0.0, -leading)
+                strings = [v for v in operands if type(v) is bytes]
+                if strings and font is not None:
+                    show(font.decode(strings[-1]))
+            elif value == b"TJ":
+                if font is not None and operands and type(operands[-1]) is _Array:
+                    parts = []
+                    for v in operands[-1]:
+                        if type(v) is bytes:
+                            parts.append(font.decode(v))
+                        elif type(v) is float and v <= _TJ_SPACE:
+                            parts.append(" ")
+                    show("".join(parts))
+            elif value == b"Tf":
+                names = [v for v in operands if type(v) is _Name]
+                if names:
+                    font = fonts.get(names[0])
+            elif value == b"TL" and nums:
+                leading = nums[0]
+            elif value == b"Tm" and len(nums) == 6:
+                finish()
+                tm = tlm = tuple(nums)
+            elif value == b"T*":
+                move(0.0, -leading)
+            elif value == b"cm" and len(nums) == 6:
+                ctm = _multiply(tuple(nums), ctm)
+            operands = []
+        finish()
+
+    return runs
+
+
+def text_runs(data: bytes, max_pages=None):
+    """Positioned text of the first ``max_pages`` pages (default: all), in
+    content-stream order; [] when the file is over a decoding limit.
+
+    A run is the text drawn on one baseline inside one BT/ET block, up to
+    the next Tm.
+    """
+    pdf = PdfDocument(data)
+    runs = []
+    try:
+        for page_no, (page, inherited) in enumerate(pdf.pages()[:max_pages]):
+            runs.extend(_page_runs(pdf, page_no, page, inherited))
+    except PdfLimitExceeded:
+        return []
+    return runs
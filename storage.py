@@ -0,0 +1,446 @@
+"""Invoice persistence and lookup behind one interface (InvoiceRepository).
+
+app.py reads and saves invoices only through ``app.repository``, built by
+from_env() from STORAGE_BACKEND:
+
+    sqlite   (default) the DB_PATH file, as before
+    memory   dicts in this process - tests and benchmarks
+    sharded  STORAGE_SHARDS SQLite files next to DB_PATH (invoices.shard0.db, ...),
+             partitioned by crc32 of the InvoiceId or, with STORAGE_SHARD_KEY=vendor,
+             of the VendorName. Each file has its own write lock, so saves that
+             land on different shards do not wait for each other. Shard files
+             hold only invoices, confidences and items.
+
+Only invoices live here. The extraction cache, the job queue, search,
+analytics, review, export and backfill.py keep using DB_PATH through
+db_util, and only the sqlite backend fills those tables
+(``uses_db_path``). With the other backends app.py answers those endpoints
+with 501 and refuses APP_WORKERS > 1, and the CLIs refuse to run, rather
+than return empty results.
+
+Invoices are dicts of INVOICE_COLUMNS plus "Items" (dicts of ITEM_COLUMNS).
+Vendor listings are ordered by (normalized InvoiceDate, InvoiceId) with
+unparseable dates first; ``after`` is such a key, as decoded from
+app.decode_cursor.
+"""
+import heapq
+import itertools
+import os
+import threading
+import zlib
+
+import db_util
+from db_util import INVOICE_COLUMNS, ITEM_COLUMNS, get_db, open_connection
+from dates import normalize_date
+
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+STORAGE_SHARDS = int(os.getenv("STORAGE_SHARDS", "4"))
+STORAGE_SHARD_KEY = os.getenv("STORAGE_SHARD_KEY", "invoice")
+
+
+def sort_key(invoice_date_iso, invoice_id):
+    """Listing order as a Python key: NULL dates first, then date, then InvoiceId."""
+    return (invoice_date_iso is not None, invoice_date_iso or "", str(invoice_id))
+
+
+def invoice_key(invoice):
+    return sort_key(normalize_date(invoice["InvoiceDate"]), invoice["InvoiceId"])
+
+
+class InvoiceRepository:
+    """Where invoices are saved and looked up. Subclasses implement every method."""
+
+    name = None
+    # SQLite files holding invoices (db_util.enable_cache_sync watches them)
+    paths = ()
+    # saves land in DB_PATH through the multi-worker writer, so search,
+    # analytics, review and export see them
+    uses_db_path = False
+
+    def init(self):
+        """Create or migrate the storage; safe to call in every process."""
+
+    def save(self, results):
+        """Upsert extraction results ({"data": ..., "dataConfidence": ...}); the last one per InvoiceId wins."""
+        raise NotImplementedError
+
+    def get(self, invoice_id):
+        """The invoice, or None."""
+        raise NotImplementedError
+
+    def count_by_vendor(self, vendor_name, date_from=None, date_to=None):
+        raise NotImplementedError
+
+    def list_by_vendor(self, vendor_name, limit=None, after=None, date_from=None, date_to=None):
+        """Invoices of a vendor in listing order; ``date_from``/``date_to`` are inclusive "YYYY-MM-DD"."""
+        raise NotImplementedError
+
+    def iter_by_vendor(self, vendor_name, after=None, date_from=None, date_to=None):
+        """list_by_vendor as a generator that holds one chunk at a time; may be resumed on another thread."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every invoice (tests)."""
+        raise NotImplementedError
+
+
+# keyset: (InvoiceDateISO, InvoiceId) אחרי ה-cursor; NULL dates ממוינים ראשונים
+def _after_clause(after, table=""):
+    if after is None:
+        return "", ()
+    invoice_date, invoice_id = after
+    date_col, id_col = f"{table}InvoiceDateISO", f"{table}InvoiceId"
+    if invoice_date is None:
+        return (f"AND (({date_col} IS NULL AND {id_col} > ?) OR {date_col} IS NOT NULL)",
+                (invoice_id,))
+    return f"AND ({date_col}, {id_col}) > (?, ?)", (invoice_date, invoice_id)
+
+
+# טווח תאריכים (כולל) - range scan על idx_invoices_vendor_date
+def _range_clause(date_from=None, date_to=None):
+    sql, params = "", ()
+    if date_from:
+        sql += " AND InvoiceDateISO >= ?"
+        params += (date_from,)
+    if date_to:
+        sql += " AND InvoiceDateISO <= ?"
+        params += (date_to,)
+    return sql, params
+
+
+class SqliteRepository(InvoiceRepository):
+    """Invoices in one SQLite file; ``path=None`` follows db_util.DB_PATH.
+
+    ``derived=False`` keeps only invoices, confidences and items in the file,
+    without search, totals and review tables (the shards of ShardedSqliteRepository).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=None, derived=True):
+        self.path = path
+        self.derived = derived
+
+    @property
+    def paths(self):
+        return [self.path or db_util.DB_PATH]
+
+    @property
+    def uses_db_path(self):
+        return self.path is None
+
+    def init(self):
+        db_util.init_db(self.path, self.derived)
+
+    def save(self, results):
+        if self.path is None:
+            # goes to the writer process in multi-worker mode
+            db_util.save_inv_extractions(results)
+        else:
+            db_util.write_inv_extractions(results, self.path, self.derived)
+
+    def get(self, invoice_id):
+        with get_db(self.path) as conn: #ניהול חיבור לבסיס הנתונים
+            cursor = conn.cursor() #מצביע (cursor) שרץ על מסד הנתונים ומבצע פקודות SQL
+
+            cursor.execute("""
+                SELECT InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+                       ShippingAddress, SubTotal, ShippingCost, InvoiceTotal
+                FROM invoices
+                WHERE InvoiceId = ?
+            """, (invoice_id,)) #,כי SQLite מצפה ל־ tuple/ של פרמטרים ? = אבטחה ויציבות
+
+            row = cursor.fetchone() #Tuple
+            if not row:
+                return None
+            invoice = dict(zip(INVOICE_COLUMNS, row))
+
+            cursor.execute("""
+                SELECT Description, Name, Quantity, UnitPrice, Amount
+                FROM items
+                WHERE InvoiceId = ?
+                ORDER BY id ASC
+            """, (invoice_id,))
+            invoice["Items"] = [dict(zip(ITEM_COLUMNS, r)) for r in cursor.fetchall()]
+            return invoice
+
+    def count_by_vendor(self, vendor_name, date_from=None, date_to=None):
+        range_sql, range_params = _range_clause(date_from, date_to)
+        with get_db(self.path) as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM invoices WHERE VendorName = ?{range_sql}",
+                (vendor_name,) + range_params,
+            ).fetchone()[0]
+
+    def list_by_vendor(self, vendor_name, limit=None, after=None, date_from=None, date_to=None):
+        # שתי שאילתות לכל ה-vendor (headers + כל ה-items) במקום 2 שאילתות לכל חשבונית
+        after_sql, after_params = _after_clause(after)
+        range_sql, range_params = _range_clause(date_from, date_to)
+        limit_sql = "LIMIT ?" if limit is not None else ""
+        limit_params = (limit,) if limit is not None else ()
+
+        with get_db(self.path) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                SELECT InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+                       ShippingAddress, SubTotal, ShippingCost, InvoiceTotal
+                FROM invoices
+                WHERE VendorName = ? {after_sql}{range_sql}
+                ORDER BY InvoiceDateISO ASC, InvoiceId ASC
+                {limit_sql}
+            """, (vendor_name,) + after_params + range_params + limit_params)
+
+            invoices = []
+            by_id = {}
+            for row in cursor.fetchall():
+                invoice = dict(zip(INVOICE_COLUMNS, row))
+                invoice["Items"] = []
+                invoices.append(invoice)
+                by_id[row[0]] = invoice
+
+            if not invoices:
+                return invoices
+
+            if limit is None:
+                join_after_sql, _ = _after_clause(after, "invoices.")
+                rows = cursor.execute(f"""
+                    SELECT items.InvoiceId, items.Description, items.Name,
+                           items.Quantity, items.UnitPrice, items.Amount
+                    FROM items
+                    JOIN invoices ON invoices.InvoiceId = items.InvoiceId
+                    WHERE invoices.VendorName = ? {join_after_sql}{range_sql}
+                    ORDER BY items.id ASC
+                """, (vendor_name,) + after_params + range_params)
+            else:
+                # עמוד אחד - רק ה-items של החשבוניות בעמוד; IN בחלקים של SQL_MAX_PARAMS
+                rows = db_util._select_in(cursor, """
+                    SELECT InvoiceId, Description, Name, Quantity, UnitPrice, Amount
+                    FROM items
+                    WHERE InvoiceId IN ({})
+                    ORDER BY id ASC
+                """, list(by_id))
+
+            for row in rows:
+                by_id[row[0]]["Items"].append(dict(zip(ITEM_COLUMNS, row[1:])))
+
+        return invoices
+
+    def iter_by_vendor(self, vendor_name, after=None, date_from=None, date_to=None, chunk_size=500):
+        after_sql, after_params = _after_clause(after)
+        range_sql, range_params = _range_clause(date_from, date_to)
+        # connection נפרד: ה-generator רץ ב-threads שונים של ה-threadpool
+        conn = open_connection(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(f"""
+                SELECT InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+                       ShippingAddress, SubTotal, ShippingCost, InvoiceTotal,
+                       it.Description, it.Name, it.Quantity, it.UnitPrice, it.Amount, it.id
+                FROM invoices
+                LEFT JOIN items it USING (InvoiceId)
+                WHERE VendorName = ? {after_sql}{range_sql}
+                ORDER BY InvoiceDateISO ASC, InvoiceId ASC, it.id ASC
+            """, (vendor_name,) + after_params + range_params)
+
+            current = None
+            width = len(INVOICE_COLUMNS)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if current is None or current["InvoiceId"] != row[0]:
+                        if current is not None:
+                            yield current
+                        current = dict(zip(INVOICE_COLUMNS, row[:width]))
+                        current["Items"] = []
+                    if row[-1] is not None:
+                        current["Items"].append(dict(zip(ITEM_COLUMNS, row[width:-1])))
+            if current is not None:
+                yield current
+        finally:
+            conn.close()
+
+    def find_existing(self, invoice_ids):
+        """The subset of ``invoice_ids`` stored here."""
+        with get_db(self.path) as conn:
+            return {r[0] for r in db_util._select_in(
+                conn.cursor(), "SELECT InvoiceId FROM invoices WHERE InvoiceId IN ({})", list(invoice_ids))}
+
+    def delete(self, invoice_ids):
+        db_util.delete_invoices(invoice_ids, self.path, self.derived)
+
+    def clear(self):
+        db_util.clean_db(self.path, self.derived)
+
+
+def _latest(results):
+    """InvoiceId -> last result for it, skipping results without one (as db_util does)."""
+    latest = {}
+    for result in results:
+        invoice_id = result.get("data", {}).get("InvoiceId")
+        if invoice_id:
+            latest[invoice_id] = result
+    return latest
+
+
+class MemoryRepository(InvoiceRepository):
+    """Invoices in dicts; nothing survives the process."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._invoices = {}   # InvoiceId -> (sort key, invoice)
+        self._vendors = {}    # VendorName -> set of InvoiceIds
+
+    def save(self, results):
+        latest = _latest(results)
+        with self._lock:
+            for invoice_id, result in latest.items():
+                data = result["data"]
+                invoice = {c: data.get(c) for c in INVOICE_COLUMNS}
+                invoice["Items"] = [{c: item.get(c) for c in ITEM_COLUMNS} for item in data.get("Items") or []]
+                old = self._invoices.get(invoice_id)
+                if old is not None:
+                    self._vendors[old[1]["VendorName"]].discard(invoice_id)
+                self._invoices[invoice_id] = (invoice_key(invoice), invoice)
+                self._vendors.setdefault(invoice["VendorName"], set()).add(invoice_id)
+        db_util.invoice_cache.invalidate(latest)
+
+    def get(self, invoice_id):
+        with self._lock:
+            entry = self._invoices.get(invoice_id)
+            return _copy(entry[1]) if entry else None
+
+    def _matching(self, vendor_name, after, date_from, date_to):
+        after_key = sort_key(*after) if after is not None else None
+        with self._lock:
+            entries = [self._invoices[i] for i in self._vendors.get(vendor_name, ())]
+            entries = [(key, _copy(invoice)) for key, invoice in entries
+                       if (after_key is None or key > after_key)
+                       and (not date_from or (key[0] and key[1] >= date_from))
+                       and (not date_to or (key[0] and key[1] <= date_to))]
+        entries.sort(key=lambda entry: entry[0])
+        return [invoice for _, invoice in entries]
+
+    def count_by_vendor(self, vendor_name, date_from=None, date_to=None):
+        return len(self._matching(vendor_name, None, date_from, date_to))
+
+    def list_by_vendor(self, vendor_name, limit=None, after=None, date_from=None, date_to=None):
+        invoices = self._matching(vendor_name, after, date_from, date_to)
+        return invoices if limit is None else invoices[:limit]
+
+    def iter_by_vendor(self, vendor_name, after=None, date_from=None, date_to=None):
+        yield from self._matching(vendor_name, after, date_from, date_to)
+
+    def clear(self):
+        with self._lock:
+            self._invoices.clear()
+            self._vendors.clear()
+        db_util.invoice_cache.clear()
+
+
+def _copy(invoice):
+    return dict(invoice, Items=[dict(item) for item in invoice["Items"]])
+
+
+def shard_paths(count, base=None):
+    """invoices.db -> invoices.shard0.db ... invoices.shard<count-1>.db"""
+    root, ext = os.path.splitext(base or db_util.DB_PATH)
+    return [f"{root}.shard{n}{ext}" for n in range(count)]
+
+
+class ShardedSqliteRepository(InvoiceRepository):
+    """Invoices spread over several SQLite files by a hash of InvoiceId or VendorName.
+
+    By InvoiceId, get() reads one shard and vendor listings merge every
+    shard's ordered results. By VendorName it is the other way round, and a
+    save that moves an invoice to another vendor deletes its old copy after
+    writing the new one.
+    """
+
+    name = "sharded"
+
+    def __init__(self, paths, key="invoice"):
+        if key not in ("invoice", "vendor"):
+            raise ValueError(f"Unknown shard key {key!r}")
+        # nothing reads search, totals or review tables on this backend, so shards skip them
+        self.shards = [SqliteRepository(path, derived=False) for path in paths]
+        self.key = key
+
+    @property
+    def paths(self):
+        return [shard.path for shard in self.shards]
+
+    def _shard(self, value):
+        # crc32, not hash(): the same value must land on the same shard in every process
+        return self.shards[zlib.crc32(str(value or "").encode()) % len(self.shards)]
+
+    def _shard_of(self, data):
+        return self._shard(data.get("VendorName") if self.key == "vendor" else data.get("InvoiceId"))
+
+    def init(self):
+        for shard in self.shards:
+            shard.init()
+
+    def save(self, results):
+        groups = {}
+        for result in _latest(results).values():
+            groups.setdefault(self._shard_of(result["data"]), []).append(result)
+        for shard, group in groups.items():
+            shard.save(group)
+        if self.key == "vendor":
+            for shard, group in groups.items():
+                moved = {r["data"]["InvoiceId"] for r in group}
+                for other in self.shards:
+                    if other is not shard:
+                        # a read first: most saves move nothing and take no write lock here
+                        stale = other.find_existing(moved)
+                        if stale:
+                            other.delete(stale)
+
+    def get(self, invoice_id):
+        if self.key == "invoice":
+            return self._shard(invoice_id).get(invoice_id)
+        for shard in self.shards:
+            invoice = shard.get(invoice_id)
+            if invoice is not None:
+                return invoice
+        return None
+
+    def count_by_vendor(self, vendor_name, date_from=None, date_to=None):
+        if self.key == "vendor":
+            return self._shard(vendor_name).count_by_vendor(vendor_name, date_from, date_to)
+        return sum(shard.count_by_vendor(vendor_name, date_from, date_to) for shard in self.shards)
+
+    def list_by_vendor(self, vendor_name, limit=None, after=None, date_from=None, date_to=None):
+        if self.key == "vendor":
+            return self._shard(vendor_name).list_by_vendor(vendor_name, limit, after, date_from, date_to)
+        # every shard's first ``limit`` in order, merged; the page is the first ``limit`` of that
+        merged = heapq.merge(*(shard.list_by_vendor(vendor_name, limit, after, date_from, date_to)
+                               for shard in self.shards), key=invoice_key)
+        return list(itertools.islice(merged, limit))
+
+    def iter_by_vendor(self, vendor_name, after=None, date_from=None, date_to=None):
+        if self.key == "vendor":
+            yield from self._shard(vendor_name).iter_by_vendor(vendor_name, after, date_from, date_to)
+            return
+        yield from heapq.merge(*(shard.iter_by_vendor(vendor_name, after, date_from, date_to)
+                                 for shard in self.shards), key=invoice_key)
+
+    def clear(self):
+        for shard in self.shards:
+            shard.clear()
+
+
+def from_env():
+    """The repository STORAGE_BACKEND selects (see the module docstring)."""
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteRepository()
+    if STORAGE_BACKEND == "memory":
+        return MemoryRepository()
+    if STORAGE_BACKEND == "sharded":
+        return ShardedSqliteRepository(shard_paths(STORAGE_SHARDS), STORAGE_SHARD_KEY)
+    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}")
@@ -0,0 +1,4 @@
+import os
+
+# the sample PDFs match a local template; most tests exercise the (mocked) OCI path
+os.environ.setdefault("LOCAL_EXTRACT_ENABLED", "0")
@@ -0,0 +1,48 @@
+"""OCI-like response objects shared by the extraction tests."""
+
+
+def obj(**kwargs):
+    return type("obj", (), kwargs)()
+
+
+def kv(name, text, confidence=0.99):
+    return obj(field_type="KEY_VALUE",
+               field_label=obj(name=name, confidence=confidence),
+               field_value=obj(value=text, text=text))
+
+
+def line_item(description, quantity, unit_price, amount):
+    cols = [("Description", description), ("Name", description),
+            ("Quantity", quantity), ("UnitPrice", unit_price), ("Amount", amount)]
+    return obj(field_value=obj(items=[
+        obj(field_label=obj(name=k), field_value=obj(value=v, text=str(v)))
+        for k, v in cols
+    ]))
+
+
+def analyze_response(invoice_id="36259", vendor="SuperStore", confidence=1.0,
+                     invoice_date="2012-03-06T00:00:00+00:00", items=None):
+    """Build an analyze_document() return value shaped like the SuperStore samples."""
+    if items is None:
+        items = [line_item("Newell 330 Art, Office Supplies, OFF-AR-5309", 3, 17.94, 53.82)]
+
+    return obj(
+        data=obj(
+            detected_document_types=[obj(document_type="INVOICE", confidence=confidence)],
+            pages=[
+                obj(document_fields=[
+                    kv("VendorName", vendor, 0.95),
+                    kv("InvoiceId", invoice_id),
+                    kv("InvoiceDate", invoice_date),
+                    kv("ShippingAddress", "98103, Seattle, Washington, United States", 0.98),
+                    kv("BillingAddressRecipient", "Aaron Bergman"),
+                    kv("SubTotal", "53.82", 0.90),
+                    kv("ShippingCost", "4.29", 0.98),
+                    kv("InvoiceTotal", "58.11"),
+                    obj(field_type="LINE_ITEM_GROUP",
+                        field_label=obj(name="Items", confidence=None),
+                        field_value=obj(items=items)),
+                ])
+            ],
+        )
+    )
@@ -1,8 +1,11 @@
+import sqlite3
 import unittest
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 
+import app as app_module
 from app import app
-from db_util import init_db, clean_db, get_db
+from db_util import init_db, clean_db, get_db, save_inv_extractions, close_db
 
 
 class TestInvoicesByVendorName(unittest.TestCase):
@@ -72,6 +75,43 @@ class TestInvoicesByVendorName(unittest.TestCase):
         self.assertEqual(body["TotalInvoices"], 0)
         self.assertEqual(body["invoices"], [])
 
+    def test_items_grouped_per_invoice_in_constant_queries(self):
+        save_inv_extractions([
+            {"data": {
+                "InvoiceId": f"INV-{n}", "VendorName": "SuperStore",
+                "InvoiceDate": f"2012-03-0{n}",
+                "Items": [{"Description": f"item {n}.{k}", "Name": f"item {n}.{k}",
+                           "Quantity": k, "UnitPrice": 1.0, "Amount": float(k)}
+                          for k in range(n)],
+            }}
+            for n in range(1, 6)
+        ])
+
+        statements = []
+        real_connect = sqlite3.connect
+
+        def tracing_connect(*args, **kwargs):
+            conn = real_connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        # drop the pooled connection so the lookup opens a traced one
+        close_db()
+        with patch("db_util.sqlite3.connect", tracing_connect):
+            invoices = app_module.get_invoices_by_vendor("SuperStore")
+        close_db()
+
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(selects), 2)
+
+        self.assertEqual([inv["InvoiceId"] for inv in invoices],
+                         ["INV-1", "INV-2", "INV-3", "INV-4", "INV-5"])
+        for n, inv in enumerate(invoices, start=1):
+            self.assertEqual([i["Description"] for i in inv["Items"]],
+                             [f"item {n}.{k}" for k in range(n)])
+            # same shape as GET /invoice/{id}
+            self.assertEqual(inv, self.client.get(f"/invoice/INV-{n}").json())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import importlib
+
+from fastapi.testclient import TestClient
+
+from db_util import init_db, clean_db, get_db, save_inv_extraction, save_inv_extractions
+
+
+def result(invoice_id, vendor, date, total, items=1, shipping=1.0):
+    return {
+        "confidence": 1.0,
+        "data": {
+            "InvoiceId": invoice_id,
+            "VendorName": vendor,
+            "InvoiceDate": date,
+            "SubTotal": total - shipping,
+            "ShippingCost": shipping,
+            "InvoiceTotal": total,
+            "Items": [{"Description": f"item {n}", "Name": f"item {n}", "Quantity": 1,
+                       "UnitPrice": 1.0, "Amount": 1.0} for n in range(items)],
+        },
+        "dataConfidence": {},
+    }
+
+
+class TestVendorAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.client = TestClient(app.app)
+
+        save_inv_extractions([
+            result("1", "SuperStore", "Mar 06 2012", 10.0, items=2),
+            result("2", "SuperStore", "Mar 20 2012", 20.0),
+            result("3", "SuperStore", "2012-04-01T00:00:00Z", 5.0),
+            result("4", "OfficeMart", "Apr 02 2012", 7.5, items=3),
+        ])
+
+    def tearDown(self):
+        clean_db()
+
+    def vendors(self, **params):
+        response = self.client.get("/analytics/vendors", params=params)
+        self.assertEqual(response.status_code, 200)
+        return {v["vendorName"]: v for v in response.json()["vendors"]}
+
+    def test_vendor_totals(self):
+        vendors = self.vendors()
+
+        self.assertEqual(vendors["SuperStore"], {
+            "vendorName": "SuperStore", "invoiceCount": 3, "subTotal": 32.0,
+            "shippingCost": 3.0, "invoiceTotal": 35.0, "itemCount": 4,
+        })
+        self.assertEqual(vendors["OfficeMart"]["invoiceCount"], 1)
+
+    def test_monthly_totals_and_range(self):
+        body = self.client.get("/analytics/vendors/SuperStore/monthly").json()
+        self.assertEqual([(m["month"], m["invoiceCount"], m["invoiceTotal"]) for m in body["months"]],
+                         [("2012-03", 2, 30.0), ("2012-04", 1, 5.0)])
+
+        months = self.client.get("/analytics/monthly", params={"from": "2012-04"}).json()["months"]
+        self.assertEqual([(m["month"], m["invoiceCount"]) for m in months], [("2012-04", 2)])
+
+        self.assertEqual(set(self.vendors(to="2012-03")), {"SuperStore"})
+
+    def test_bad_month_rejected(self):
+        self.assertEqual(self.client.get("/analytics/vendors", params={"from": "March"}).status_code, 422)
+
+    def test_replaced_invoice_moves_between_groups(self):
+        # a corrected re-extraction: other vendor, other month, new total and items
+        save_inv_extraction(result("2", "OfficeMart", "May 01 2012", 12.0, items=4))
+
+        vendors = self.vendors()
+        self.assertEqual((vendors["SuperStore"]["invoiceCount"], vendors["SuperStore"]["invoiceTotal"],
+                          vendors["SuperStore"]["itemCount"]), (2, 15.0, 3))
+        self.assertEqual((vendors["OfficeMart"]["invoiceCount"], vendors["OfficeMart"]["invoiceTotal"],
+                          vendors["OfficeMart"]["itemCount"]), (2, 19.5, 7))
+        self.assertEqual(self.aggregate_rows(), self.recomputed_rows())
+
+    def test_unparsable_date_is_grouped_as_unknown_month(self):
+        save_inv_extraction(result("5", "SuperStore", "sometime", 1.0))
+
+        months = self.client.get("/analytics/vendors/SuperStore/monthly").json()["months"]
+        self.assertEqual(months[0]["month"], None)
+
+    def aggregate_rows(self):
+        with get_db() as conn:
+            return conn.execute("""
+                SELECT VendorName, SUM(InvoiceCount), ROUND(SUM(InvoiceTotal), 2), SUM(ItemCount)
+                FROM vendor_monthly_totals GROUP BY VendorName ORDER BY VendorName
+            """).fetchall()
+
+    def recomputed_rows(self):
+        with get_db() as conn:
+            return conn.execute("""
+                SELECT VendorName, COUNT(*), ROUND(SUM(InvoiceTotal), 2),
+                       SUM((SELECT COUNT(*) FROM items it WHERE it.InvoiceId = i.InvoiceId))
+                FROM invoices i GROUP BY VendorName ORDER BY VendorName
+            """).fetchall()
+
+
+if __name__ == "__main__":
+    unittest.main()
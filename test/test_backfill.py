@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import backfill
+from db_util import init_db, clean_db, get_db, get_backfill_checkpoint, search_invoices
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "json_output", "all_invoices_pretty.json")
+
+
+def record(n):
+    return {"confidence": 1.0, "dataConfidence": {"InvoiceId": 0.99},
+            "data": {"InvoiceId": f"B-{n}", "VendorName": "SuperStore", "InvoiceDate": "Mar 06 2012",
+                     "BillingAddressRecipient": f"לקוח {n} Bergman", "InvoiceTotal": 1.0,
+                     "Items": [{"Description": f"Newell {n} Art, OFF-AR-{5000 + n}", "Quantity": 1}]}}
+
+
+def quiet(*args):
+    pass
+
+
+class TestReaders(unittest.TestCase):
+
+    def test_json_array_across_chunk_boundaries(self):
+        records = [record(n) for n in range(20)]
+        data = json.dumps(records, indent=2, ensure_ascii=False).encode("utf-8")
+        with patch.object(backfill, "READ_CHUNK", 7):
+            reader = backfill.open_reader(io.BytesIO(data))
+            self.assertIsInstance(reader, backfill.JsonArrayReader)
+            out = []
+            for r in reader:
+                out.append(r)
+                if len(out) == 8:
+                    position = reader.position
+            self.assertEqual(out, records)
+            # restarting at a reported position gives the remaining elements
+            rest = list(backfill.JsonArrayReader(io.BytesIO(data), position))
+        self.assertEqual(rest, records[8:])
+
+    def test_malformed_element_raises_without_reading_on(self):
+        records = [record(n) for n in range(200)]
+        good = json.dumps(records[:3], ensure_ascii=False).encode("utf-8")
+        data = good[:-1] + b', {"data": {"InvoiceId": x}}, ' + json.dumps(records[3:]).encode()[1:]
+        f = io.BytesIO(data)
+        with patch.object(backfill, "READ_CHUNK", 256):
+            reader = backfill.JsonArrayReader(f)
+            out = []
+            with self.assertRaises(ValueError) as ctx:
+                for r in reader:
+                    out.append(r)
+        self.assertEqual(out, records[:3])
+        bad = data.index(b"x}}")
+        self.assertIn(f"byte {bad}", str(ctx.exception))
+        self.assertLessEqual(f.tell(), bad + 2 * 256)
+        self.assertLess(f.tell(), len(data))
+
+    def test_ndjson(self):
+        records = [record(n) for n in range(5)]
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n\n" for r in records).encode("utf-8")
+        reader = backfill.open_reader(io.BytesIO(data))
+        self.assertIsInstance(reader, backfill.NdjsonReader)
+        self.assertEqual(list(reader), records)
+        self.assertEqual(reader.position, len(data))
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "archive.ndjson")
+        with open(self.path, "w", encoding="utf-8") as f:
+            for n in range(25):
+                f.write(json.dumps(record(n), ensure_ascii=False) + "\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        clean_db()
+
+    def count(self, sql):
+        with get_db() as conn:
+            return conn.execute(sql).fetchone()[0]
+
+    def test_load_sample_with_deferred_indexes(self):
+        backfill.main([SAMPLE, self.path, "--batch", "10"])
+
+        self.assertEqual(self.count("SELECT COUNT(*) FROM invoices"), 30)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM items"), 33)
+        self.assertEqual(self.count("SELECT SUM(InvoiceCount) FROM vendor_monthly_totals"), 30)
+        self.assertEqual(self.count(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name IN ('idx_items_invoice', 'idx_invoices_vendor_date')"), 2)
+        self.assertEqual([r["InvoiceId"] for r in search_invoices("OFF-AR-5007")[0]], ["B-7"])
+
+    def test_resume_after_interruption(self):
+        real_save = backfill.save_backfill_batch
+        calls = []
+
+        def flaky(batch, *args):
+            if len(calls) == 1:
+                raise KeyboardInterrupt
+            calls.append(len(batch))
+            return real_save(batch, *args)
+
+        with patch.object(backfill, "save_backfill_batch", flaky):
+            with self.assertRaises(KeyboardInterrupt):
+                backfill.load_file(self.path, batch_size=10, log=quiet)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM invoices"), 10)
+        self.assertEqual(get_backfill_checkpoint(os.path.abspath(self.path))[1:], (10, 0))
+
+        written = backfill.load_file(self.path, batch_size=10, log=quiet)
+        self.assertEqual(written, 15)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM invoices"), 25)
+        self.assertEqual(get_backfill_checkpoint(os.path.abspath(self.path))[1:], (25, 1))
+
+        # a finished file is skipped unless restarted
+        self.assertEqual(backfill.load_file(self.path, log=quiet), 0)
+        self.assertEqual(backfill.load_file(self.path, restart=True, log=quiet), 25)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM items"), 25)
+
+    def test_online_load_keeps_search_and_totals(self):
+        backfill.load_file(self.path, batch_size=10, deferred=False, log=quiet)
+        self.assertEqual(self.count("SELECT SUM(InvoiceCount) FROM vendor_monthly_totals"), 25)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM invoice_search"), 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
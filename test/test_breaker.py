@@ -0,0 +1,171 @@
+import unittest
+import importlib
+from unittest.mock import patch, MagicMock
+
+import oci
+from fastapi.testclient import TestClient
+
+from breaker import CircuitBreaker, CircuitOpen, CLOSED, OPEN, HALF_OPEN
+from db_util import init_db, clean_db
+from test.oci_fakes import analyze_response
+
+SAMPLE = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.5,
+                                      open_seconds=30, half_open_calls=1, clock=self.clock)
+
+    def call(self, ok):
+        self.breaker.acquire()
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def test_opens_when_failure_rate_reached(self):
+        self.call(True)
+        self.call(False)
+        self.call(True)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.call(False)
+
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen) as ctx:
+            self.breaker.acquire()
+        self.assertEqual(ctx.exception.retry_after, 30)
+        self.assertEqual(self.breaker.retry_after_header(5), "30")
+
+    def test_half_open_probe_closes_or_reopens(self):
+        for _ in range(4):
+            self.call(False)
+        self.clock.now = 31
+
+        self.breaker.acquire()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        # only one probe at a time
+        with self.assertRaises(CircuitOpen):
+            self.breaker.acquire()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.times_opened, 2)
+
+        self.clock.now = 62
+        self.call(True)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.retry_after_header(5), "5")
+
+
+class TestOciRetries(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.patchers = [
+            patch.object(app, "OCI_RETRY_BASE_DELAY", 0),
+            patch.object(app, "oci_breaker", CircuitBreaker(min_calls=4, failure_rate=0.5)),
+        ]
+        for p in self.patchers:
+            p.start()
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        self.mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_get_client.return_value = self.mock_doc_client
+
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_get_client.stop()
+        for p in self.patchers:
+            p.stop()
+
+    def upload(self):
+        with open(SAMPLE, "rb") as f:
+            return self.client.post(
+                "/extract",
+                params={"no_cache": "true"},
+                files={"file": ("invoice.pdf", f, "application/pdf")},
+            )
+
+    def service_error(self, status):
+        return oci.exceptions.ServiceError(status, "Error", {}, "injected")
+
+    def test_transient_error_is_retried(self):
+        self.mock_doc_client.analyze_document.side_effect = [
+            self.service_error(503), analyze_response(),
+        ]
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 2)
+
+    def test_client_error_is_not_retried(self):
+        self.mock_doc_client.analyze_document.side_effect = self.service_error(400)
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 1)
+        self.assertEqual(self.app.oci_breaker.state, CLOSED)
+
+    def test_retries_stop_at_deadline(self):
+        self.mock_doc_client.analyze_document.side_effect = self.service_error(503)
+
+        with patch.object(self.app, "OCI_RETRY_BASE_DELAY", 10), \
+                patch.object(self.app, "OCI_DEADLINE", 1):
+            response = self.upload()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 1)
+        self.assertEqual(response.headers["Retry-After"], str(self.app.OCI_UNAVAILABLE_RETRY_AFTER))
+
+    def test_no_retry_that_could_outlast_the_deadline(self):
+        self.mock_doc_client.analyze_document.side_effect = self.service_error(503)
+
+        # backoff is instant, but a full attempt no longer fits in what is left of the deadline
+        with patch.object(self.app, "OCI_RETRY_BASE_DELAY", 0), \
+                patch.object(self.app, "OCI_ATTEMPT_TIMEOUT", self.app.OCI_DEADLINE):
+            response = self.upload()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 1)
+
+    def test_open_breaker_fails_fast_with_retry_after(self):
+        self.mock_doc_client.analyze_document.side_effect = self.service_error(503)
+
+        self.upload()
+        self.upload()
+        self.assertEqual(self.app.oci_breaker.state, OPEN)
+        calls = self.mock_doc_client.analyze_document.call_count
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, calls)
+        retry_after = int(response.headers["Retry-After"])
+        self.assertTrue(0 < retry_after <= self.app.oci_breaker.open_seconds)
+
+
+if __name__ == "__main__":
+    unittest.main()
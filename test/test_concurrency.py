@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+import importlib
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+import concurrency
+from db_util import init_db, clean_db, save_inv_extraction
+from test.oci_fakes import analyze_response
+
+SAMPLE_A = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+SAMPLE_B = "invoices_sample/invoice_Alan_Haines_36552.pdf"
+
+
+class TestExtractConcurrency(unittest.TestCase):
+    """Load test: slow OCI calls must not stall other requests on the worker."""
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+        def slow_analyze(request):
+            self.started.set()
+            self.release.wait(5)
+            return analyze_response()
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_doc_client.analyze_document.side_effect = slow_analyze
+        mock_get_client.return_value = self.mock_doc_client
+
+        save_inv_extraction({"data": {"InvoiceId": "READ-1", "VendorName": "SuperStore"}})
+
+    def tearDown(self):
+        self.release.set()
+        clean_db()
+        self.patcher_get_client.stop()
+
+    def upload(self, client, path, results):
+        with open(path, "rb") as f:
+            r = client.post(
+                "/extract",
+                params={"no_cache": "true"},
+                files={"file": (path.rsplit("/", 1)[-1], f, "application/pdf")},
+            )
+        results.append(r.status_code)
+
+    def test_reads_stay_fast_while_extraction_in_flight(self):
+        results = []
+        with TestClient(self.app.app) as client:
+            # baseline read latency with nothing in flight
+            t0 = time.perf_counter()
+            client.get("/invoice/READ-1")
+            idle = time.perf_counter() - t0
+
+            workers = [threading.Thread(target=self.upload, args=(client, SAMPLE_A, results))
+                       for _ in range(3)]
+            for w in workers:
+                w.start()
+            self.assertTrue(self.started.wait(5))
+
+            latencies = []
+            for _ in range(20):
+                t0 = time.perf_counter()
+                r = client.get("/invoice/READ-1")
+                latencies.append(time.perf_counter() - t0)
+                self.assertEqual(r.status_code, 200)
+
+            self.release.set()
+            for w in workers:
+                w.join(5)
+
+        self.assertEqual(results, [200, 200, 200])
+        # OCI is blocked for seconds; reads must not wait for it
+        self.assertLess(max(latencies), 0.5 + idle)
+
+    def test_saturated_oci_pool_returns_429(self):
+        results = []
+        tiny = concurrency.BoundedExecutor("oci-test", max_workers=1, max_queue=0)
+        with patch.object(concurrency, "oci_executor", tiny), TestClient(self.app.app) as client:
+            busy = threading.Thread(target=self.upload, args=(client, SAMPLE_A, results))
+            busy.start()
+            self.assertTrue(self.started.wait(5))
+
+            with open(SAMPLE_B, "rb") as f:
+                rejected = client.post(
+                    "/extract",
+                    files={"file": ("invoice_Alan_Haines_36552.pdf", f, "application/pdf")},
+                )
+
+            self.release.set()
+            busy.join(5)
+        tiny.shutdown()
+
+        self.assertEqual(rejected.status_code, 429)
+        self.assertIn("error", rejected.json())
+        self.assertIn("Retry-After", rejected.headers)
+        self.assertEqual(results, [200])
+
+
+if __name__ == "__main__":
+    unittest.main()
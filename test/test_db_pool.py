@@ -0,0 +1,80 @@
+import threading
+import unittest
+
+from db_util import init_db, clean_db, get_db, save_inv_extraction
+
+
+class TestPooledConnections(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+    def tearDown(self):
+        clean_db()
+
+    def test_connection_reused_and_tuned(self):
+        with get_db() as first:
+            pass
+        with get_db() as second:
+            journal = second.execute("PRAGMA journal_mode").fetchone()[0]
+            busy = second.execute("PRAGMA busy_timeout").fetchone()[0]
+
+        self.assertIs(first, second)
+        self.assertEqual(journal, "wal")
+        self.assertGreater(busy, 0)
+
+    def test_threads_get_separate_connections(self):
+        conns = []
+
+        def grab():
+            with get_db() as conn:
+                conns.append(conn)
+
+        t = threading.Thread(target=grab)
+        t.start()
+        t.join()
+        with get_db() as mine:
+            self.assertIsNot(conns[0], mine)
+
+    def test_error_rolls_back_whole_nested_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with get_db() as conn:
+                conn.execute("INSERT INTO invoices (InvoiceId) VALUES ('outer')")
+                with get_db() as inner:
+                    inner.execute("INSERT INTO invoices (InvoiceId) VALUES ('inner')")
+                raise RuntimeError("boom")
+
+        with get_db() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+        self.assertEqual(count, 0)
+
+    def test_reads_proceed_while_write_transaction_open(self):
+        save_inv_extraction({"data": {"InvoiceId": "R-1", "VendorName": "SuperStore"}})
+        writing = threading.Event()
+        done = threading.Event()
+
+        def writer():
+            with get_db() as conn:
+                conn.execute("INSERT INTO invoices (InvoiceId) VALUES ('W-1')")
+                conn.execute("UPDATE invoices SET VendorName = 'Changed' WHERE InvoiceId = 'R-1'")
+                writing.set()
+                done.wait(5)
+
+        t = threading.Thread(target=writer)
+        t.start()
+        self.assertTrue(writing.wait(5))
+        try:
+            with get_db() as conn:
+                vendor = conn.execute(
+                    "SELECT VendorName FROM invoices WHERE InvoiceId = 'R-1'").fetchone()[0]
+        finally:
+            done.set()
+            t.join(5)
+
+        # reader sees the last committed state without waiting for the writer
+        self.assertEqual(vendor, "SuperStore")
+
+
+if __name__ == "__main__":
+    unittest.main()
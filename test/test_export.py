@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import export
+from app import app
+from db_util import init_db, clean_db, save_inv_extraction, save_inv_extractions
+
+
+def invoice(invoice_id, items=2, total=10.0):
+    return {
+        "data": {"InvoiceId": invoice_id, "VendorName": "SuperStore", "InvoiceDate": "Mar 06 2012",
+                 "InvoiceTotal": total,
+                 "Items": [{"Description": f"item {invoice_id}.{k}", "Quantity": 1, "Amount": 1.5}
+                           for k in range(items)]},
+        "dataConfidence": {"InvoiceId": 0.99, "InvoiceTotal": 0.9},
+    }
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.tmp = tempfile.TemporaryDirectory()
+        save_inv_extractions([invoice("1"), invoice("2", items=3)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        clean_db()
+
+    def test_full_export(self):
+        summary = export.export(self.tmp.name, name="nightly")
+
+        self.assertEqual(summary["since"], 0)
+        self.assertEqual({t: rows for t, (_, rows) in summary["files"].items()},
+                         {"invoices": 2, "confidences": 2, "items": 5})
+        invoices = read_ndjson(summary["files"]["invoices"][0])
+        self.assertEqual(sorted(i["InvoiceId"] for i in invoices), ["1", "2"])
+        self.assertEqual(invoices[0]["InvoiceDateISO"], "2012-03-06")
+        items = read_ndjson(summary["files"]["items"][0])
+        self.assertEqual(items[0]["Description"], "item 1.0")
+        self.assertEqual(items[0]["Amount"], 1.5)
+        self.assertEqual(export.get_watermark("nightly"), summary["until"])
+        self.assertFalse([f for f in os.listdir(self.tmp.name) if f.endswith(".part")])
+
+    def test_incremental_export(self):
+        first = export.export(self.tmp.name, name="nightly")
+        save_inv_extraction(invoice("3", items=1))
+        save_inv_extraction(invoice("1", items=1, total=12.0))  # re-extracted
+
+        second = export.export(self.tmp.name, name="nightly")
+        self.assertEqual(second["since"], first["until"])
+        invoices = read_ndjson(second["files"]["invoices"][0])
+        self.assertEqual(sorted(i["InvoiceId"] for i in invoices), ["1", "3"])
+        items = read_ndjson(second["files"]["items"][0])
+        self.assertEqual(sorted(i["InvoiceId"] for i in items), ["1", "3"])
+
+        third = export.export(self.tmp.name, name="nightly")
+        self.assertEqual(third["files"]["invoices"][1], 0)
+
+    def test_failed_export_keeps_watermark(self):
+        def broken(snapshot, table, path, since=0):
+            raise OSError("disk full")
+
+        with patch.dict(export.WRITERS, {"ndjson": broken}):
+            with self.assertRaises(OSError):
+                export.export(self.tmp.name, name="nightly")
+        self.assertEqual(export.get_watermark("nightly"), 0)
+
+    @unittest.skipUnless(export.pyarrow, "pyarrow not installed")
+    def test_parquet(self):  # pragma: no cover
+        summary = export.export(self.tmp.name, fmt="parquet", full=True)
+        table = export.pyarrow.parquet.read_table(summary["files"]["items"][0])
+        self.assertEqual(table.num_rows, 5)
+
+
+class TestExportEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+        save_inv_extraction(invoice("1"))
+
+    def tearDown(self):
+        clean_db()
+
+    def test_stream_and_watermark(self):
+        response = self.client.get("/export/items")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.text.splitlines()), 2)
+        watermark = response.headers["X-Export-Watermark"]
+
+        save_inv_extraction(invoice("2", items=1))
+        response = self.client.get("/export/items", params={"since": watermark})
+        self.assertEqual([json.loads(line)["InvoiceId"] for line in response.text.splitlines()], ["2"])
+
+    def test_unknown_table(self):
+        self.assertEqual(self.client.get("/export/jobs").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
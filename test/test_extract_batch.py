@@ -0,0 +1,153 @@
+import io
+import threading
+import time
+import unittest
+import importlib
+import zipfile
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+import db_util
+from db_util import init_db, clean_db
+from test.oci_fakes import analyze_response
+
+
+def fake_pdf(n):
+    return b"%PDF-1.4\n% synthetic invoice " + str(n).encode()
+
+
+class TestExtractBatch(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0
+        lock = threading.Lock()
+
+        def analyze(request):
+            with lock:
+                self.calls += 1
+                n = self.calls
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(self.delay)
+            with lock:
+                self.in_flight -= 1
+            return analyze_response(invoice_id=f"B-{n}")
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_doc_client.analyze_document.side_effect = analyze
+        mock_get_client.return_value = self.mock_doc_client
+
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_get_client.stop()
+
+    def post_batch(self, files, **params):
+        return self.client.post("/extract/batch", params=params, files=[
+            ("files", f) for f in files
+        ])
+
+    def test_batch_reports_status_per_file(self):
+        with patch.object(self.app, "save_inv_extractions",
+                          wraps=db_util.save_inv_extractions) as save:
+            response = self.post_batch([
+                ("a.pdf", fake_pdf(1), "application/pdf"),
+                ("notes.txt", b"not a pdf", "text/plain"),
+                ("b.pdf", fake_pdf(2), "application/pdf"),
+            ])
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["total"], 3)
+        self.assertEqual(body["succeeded"], 2)
+        self.assertEqual([r["status"] for r in body["results"]], [200, 400, 200])
+        self.assertIn("error", body["results"][1])
+
+        # one transaction for the whole batch
+        save.assert_called_once()
+        self.assertEqual(len(save.call_args[0][0]), 2)
+        for r in (body["results"][0], body["results"][2]):
+            invoice_id = r["result"]["data"]["InvoiceId"]
+            self.assertEqual(self.client.get(f"/invoice/{invoice_id}").status_code, 200)
+
+    def test_zip_upload_is_expanded(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("one.pdf", fake_pdf(1))
+            zf.writestr("two.pdf", fake_pdf(2))
+            zf.writestr("readme.txt", b"hello")
+
+        response = self.post_batch([("invoices.zip", buf.getvalue(), "application/zip")])
+
+        results = response.json()["results"]
+        self.assertEqual([r["filename"] for r in results], ["one.pdf", "two.pdf", "readme.txt"])
+        self.assertEqual([r["status"] for r in results], [200, 200, 400])
+
+    def test_non_pdf_with_a_valid_files_bytes_is_400(self):
+        response = self.post_batch([("a.pdf", fake_pdf(1), "application/pdf"),
+                                    ("notes.txt", fake_pdf(1), "text/plain")])
+
+        statuses = {r["filename"]: r["status"] for r in response.json()["results"]}
+        self.assertEqual(statuses, {"a.pdf": 200, "notes.txt": 400})
+
+    def test_zip_with_too_many_members_is_400(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for n in range(4):
+                zf.writestr(f"{n}.pdf", fake_pdf(n))
+
+        with patch.object(self.app, "BATCH_MAX_FILES", 3):
+            response = self.post_batch([("invoices.zip", buf.getvalue(), "application/zip")])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.calls, 0)
+
+    def test_oci_failure_is_reported_as_503(self):
+        self.mock_doc_client.analyze_document.side_effect = Exception("OCI down")
+
+        response = self.post_batch([("a.pdf", fake_pdf(1), "application/pdf")])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["status"], 503)
+
+    def test_duplicates_in_batch_analyzed_once(self):
+        response = self.post_batch([
+            ("a.pdf", fake_pdf(1), "application/pdf"),
+            ("a-copy.pdf", fake_pdf(1), "application/pdf"),
+        ])
+
+        self.assertEqual(response.json()["succeeded"], 2)
+        self.assertEqual(self.calls, 1)
+
+    def test_fan_out_is_bounded_and_concurrent(self):
+        self.delay = 0.2
+        files = [(f"{n}.pdf", fake_pdf(n), "application/pdf") for n in range(8)]
+
+        with patch.object(self.app, "BATCH_CONCURRENCY", 4):
+            t0 = time.perf_counter()
+            response = self.post_batch(files)
+            elapsed = time.perf_counter() - t0
+
+        self.assertEqual(response.json()["succeeded"], 8)
+        self.assertLessEqual(self.max_in_flight, 4)
+        self.assertGreater(self.max_in_flight, 1)
+        # 8 files x 0.2s one at a time would be 1.6s
+        self.assertLess(elapsed, 1.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
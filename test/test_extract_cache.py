@@ -0,0 +1,99 @@
+import unittest
+import importlib
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+import db_util
+from db_util import init_db, clean_db
+from test.oci_fakes import analyze_response
+
+SAMPLE_A = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+SAMPLE_B = "invoices_sample/invoice_Alan_Haines_36552.pdf"
+
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        self.mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_get_client.return_value = self.mock_doc_client
+        self.mock_doc_client.analyze_document.return_value = analyze_response()
+
+        for key in db_util.extraction_cache_stats:
+            db_util.extraction_cache_stats[key] = 0
+
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_get_client.stop()
+
+    def upload(self, path, **params):
+        with open(path, "rb") as f:
+            return self.client.post(
+                "/extract",
+                params=params,
+                files={"file": (path.rsplit("/", 1)[-1], f, "application/pdf")},
+            )
+
+    def test_duplicate_upload_served_from_cache(self):
+        first = self.upload(SAMPLE_A)
+        second = self.upload(SAMPLE_A)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 1)
+
+        stats = self.client.get("/stats/cache").json()["extraction"]
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_bypass_flag_calls_oci(self):
+        self.upload(SAMPLE_A)
+        response = self.upload(SAMPLE_A, no_cache="true")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 2)
+        self.assertEqual(self.client.get("/stats/cache").json()["extraction"]["bypassed"], 1)
+
+    def test_expired_entry_is_a_miss(self):
+        self.upload(SAMPLE_A)
+
+        with patch.object(db_util, "EXTRACT_CACHE_TTL", 10), \
+                patch("db_util.time.time", return_value=db_util.time.time() + 60):
+            self.upload(SAMPLE_A)
+
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 2)
+
+    def test_size_eviction_keeps_most_recent(self):
+        with patch.object(db_util, "EXTRACT_CACHE_MAX_ENTRIES", 1):
+            self.upload(SAMPLE_A)
+            self.upload(SAMPLE_B)
+            self.upload(SAMPLE_A)
+
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 3)
+        stats = self.client.get("/stats/cache").json()["extraction"]
+        self.assertEqual(stats["entries"], 1)
+        self.assertGreaterEqual(stats["evictions"], 2)
+
+    def test_failed_extraction_is_not_cached(self):
+        self.mock_doc_client.analyze_document.return_value = analyze_response(confidence=0.4)
+        self.assertEqual(self.upload(SAMPLE_A).status_code, 400)
+        self.assertEqual(self.upload(SAMPLE_A).status_code, 400)
+
+        self.assertEqual(self.mock_doc_client.analyze_document.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import glob
+import importlib
+import json
+import time
+import unittest
+import zlib
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+import extractors
+import pdf_text
+from db_util import init_db, clean_db
+from test.oci_fakes import analyze_response
+
+SAMPLE = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+EXPECTED = "json_output/all_invoices_pretty.json"
+
+
+def simple_pdf(lines, content=None):
+    """One-page PDF drawing ``lines`` [(x, y, text)] with a Helvetica font, or a raw ``content`` stream."""
+    if content is None:
+        content = b"BT /F1 12 Tf " + b" ".join(
+            b"1 0 0 1 %d %d Tm (%s) Tj" % (x, y, text.encode()) for x, y, text in lines
+        ) + b" ET"
+    stream = zlib.compress(content)
+    return b"".join([
+        b"%PDF-1.4\n",
+        b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n",
+        b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 /MediaBox [0 0 612 792] >> endobj\n",
+        b"3 0 obj << /Type /Page /Parent 2 0 R /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >> endobj\n",
+        b"4 0 obj << /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream),
+        stream,
+        b"\nendstream endobj\n",
+        b"5 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n",
+        b"%%EOF\n",
+    ])
+
+
+class TestPdfText(unittest.TestCase):
+
+    def test_runs_are_positioned_from_the_top(self):
+        runs = pdf_text.text_runs(simple_pdf([(50, 700, "Hello"), (300, 650, "World")]))
+
+        self.assertEqual(runs, [
+            pdf_text.TextRun(0, 50.0, 92.0, "Hello"),
+            pdf_text.TextRun(0, 300.0, 142.0, "World"),
+        ])
+
+    def test_unreadable_pdf_has_no_text(self):
+        self.assertEqual(pdf_text.text_runs(b"%PDF-1.4 not really a pdf"), [])
+
+    def test_decompression_bomb_has_no_text(self):
+        pdf = simple_pdf([(50, 700, "Hello")])
+        with patch.object(pdf_text, "PDF_TEXT_MAX_DECODED_BYTES", 16):
+            self.assertEqual(pdf_text.text_runs(pdf), [])
+        self.assertEqual(len(pdf_text.text_runs(pdf)), 1)
+
+    def test_huge_cmap_range_is_rejected(self):
+        cmap = b"begincmap 1 beginbfrange <00000000> <FFFFFFFF> <0041> endbfrange endcmap"
+        with self.assertRaises(pdf_text.PdfLimitExceeded):
+            pdf_text.parse_cmap(cmap)
+        self.assertEqual(pdf_text.parse_cmap(b"beginbfrange <0041> <0043> <0061> endbfrange"),
+                         {0x41: "a", 0x42: "b", 0x43: "c"})
+
+    def test_only_requested_pages_are_decoded(self):
+        pdf = simple_pdf([(50, 700, "Hello")])
+        two_pages = pdf.replace(b"/Kids [3 0 R] /Count 1", b"/Kids [3 0 R 3 0 R] /Count 2")
+        self.assertEqual([r.page for r in pdf_text.text_runs(two_pages)], [0, 1])
+        with patch.object(pdf_text, "_page_runs", wraps=pdf_text._page_runs) as page_runs:
+            runs = pdf_text.text_runs(two_pages, max_pages=1)
+        self.assertEqual([r.page for r in runs], [0])
+        self.assertEqual(page_runs.call_count, 1)
+
+
+    def test_unterminated_sections_are_scanned_in_linear_time(self):
+        cases = [
+            b"%PDF-1.4\n" + b"1 0 obj " * 20000,
+            b"%PDF-1.4\n" + b"1" * 200000 + b" 0 R",
+            simple_pdf([], content=b"BT " * 200000),
+            simple_pdf([], content=b"1" * 200000 + b" cm " * 1000),
+            simple_pdf([(50, 700, "Hello")]).replace(b"/F1 5 0 R", b"/F1 6 0 R")
+            + b"6 0 obj << /ToUnicode 7 0 R >> endobj\n"
+            + b"7 0 obj << >>\nstream\n" + b"beginbfchar " * 20000 + b"\nendstream endobj\n",
+        ]
+        for pdf in cases:
+            t0 = time.perf_counter()
+            pdf_text.text_runs(pdf)
+            self.assertLess(time.perf_counter() - t0, 1.0, pdf[:40])
+
+class TestSuperStoreTemplate(unittest.TestCase):
+
+    def test_samples_match_expected_fields(self):
+        expected = {r["data"]["InvoiceId"]: r["data"] for r in json.load(open(EXPECTED))}
+        template = extractors.SuperStoreTemplate()
+
+        for path in sorted(glob.glob("invoices_sample/*.pdf")):
+            with open(path, "rb") as f:
+                result = template.extract(f.read())
+
+            self.assertEqual(result["confidence"], 1.0, path)
+            data = result["data"]
+            reference = expected[data["InvoiceId"]]
+            for field in ("VendorName", "InvoiceDate", "ShippingAddress", "InvoiceTotal", "ShippingCost"):
+                self.assertEqual(data[field], reference[field], (path, field))
+            self.assertEqual(set(result["dataConfidence"]), set(data) - {"Items"})
+            item = data["Items"][0]
+            self.assertEqual(item["Amount"], round(sum(i["Amount"] for i in data["Items"]), 2))
+            self.assertEqual(item["Name"], item["Description"])
+
+    def test_other_documents_are_declined(self):
+        pdf = simple_pdf([(50, 700, "ACME Corp"), (400, 700, "INVOICE")])
+        self.assertIsNone(extractors.SuperStoreTemplate().extract(pdf))
+
+    def test_inconsistent_totals_lower_confidence(self):
+        lines = [
+            (48, 758, "SuperStore"), (461, 744, "INVOICE"), (528, 724, "# 1"),
+            (439, 674, "Date"), (459, 674, ":"), (512, 674, "Mar 06 2012"),
+            (48, 660, "Bill To"), (182, 660, "Ship To"),
+            (48, 645, "Jane Doe"), (182, 645, "1 Main St"),
+            (44, 560, "Item"), (372, 560, "Quantity"), (472, 560, "Rate"), (534, 560, "Amount"),
+            (44, 534, "Stapler"), (372, 534, "2"), (457, 534, "$5.00"), (524, 534, "$10.00"),
+            (423, 454, "Subtotal"), (459, 454, ":"), (524, 454, "$10.00"),
+            (421, 411, "Shipping"), (459, 411, ":"), (537, 411, "$1.00"),
+            (438, 389, "Total"), (459, 389, ":"), (532, 389, "$99.00"),
+        ]
+
+        result = extractors.SuperStoreTemplate().extract(simple_pdf(lines))
+
+        self.assertEqual(result["data"]["BillingAddressRecipient"], "Jane Doe")
+        self.assertEqual(result["dataConfidence"]["InvoiceTotal"], 0.5)
+        self.assertEqual(result["confidence"], 0.5)
+        self.assertEqual(extractors.extract_local(simple_pdf(lines)), (None, None))
+
+
+@patch.object(extractors, "LOCAL_EXTRACT_ENABLED", True)
+class TestLocalExtractEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        self.mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_get_client.return_value = self.mock_doc_client
+        self.mock_doc_client.analyze_document.return_value = analyze_response()
+
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_get_client.stop()
+
+    def test_known_template_skips_oci(self):
+        with open(SAMPLE, "rb") as f:
+            response = self.client.post("/extract", files={"file": ("a.pdf", f, "application/pdf")})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["BillingAddressRecipient"], "Aaron Bergman")
+        self.mock_doc_client.analyze_document.assert_not_called()
+        self.assertEqual(self.client.get("/invoice/36259").status_code, 200)
+
+    def test_unknown_document_falls_back_to_oci(self):
+        pdf = simple_pdf([(50, 700, "Some other vendor")])
+
+        response = self.client.post("/extract", files={"file": ("b.pdf", pdf, "application/pdf")})
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_doc_client.analyze_document.assert_called_once()
+
+    def test_large_upload_skips_the_local_parser(self):
+        with open(SAMPLE, "rb") as f, \
+                patch.object(extractors, "LOCAL_EXTRACT_MAX_BYTES", 1024), \
+                patch.object(extractors, "extract_local") as extract_local:
+            response = self.client.post("/extract", files={"file": ("a.pdf", f, "application/pdf")})
+
+        self.assertEqual(response.status_code, 200)
+        extract_local.assert_not_called()
+        self.mock_doc_client.analyze_document.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import random
+import unittest
+import importlib
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_oci import FakeDocumentClient, load_samples, synthetic_result, to_oci_response
+from db_util import init_db, clean_db
+
+
+class TestFakeDocumentClient(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+
+    def test_response_round_trips_through_parser(self):
+        for sample in load_samples():
+            parsed = self.app.parse_analyze_response(to_oci_response(sample))
+            self.assertEqual(parsed["data"], sample["data"])
+            self.assertEqual(parsed["dataConfidence"], sample["dataConfidence"])
+
+    def test_synthetic_invoices_vary_ids_and_vendors(self):
+        rng = random.Random(1)
+        samples = load_samples()
+        results = [synthetic_result(rng, samples, n, ["A", "B"], extra_items=2) for n in range(20)]
+
+        self.assertEqual(len({r["data"]["InvoiceId"] for r in results}), 20)
+        self.assertLessEqual({r["data"]["VendorName"] for r in results}, {"A", "B"})
+
+    def test_extract_against_fake_backend(self):
+        fake = FakeDocumentClient(latency=0, failure_rate=0, seed=1)
+        with patch.object(self.app, "get_oci_client", return_value=fake), \
+                patch.object(self.app, "OCI_RETRY_BASE_DELAY", 0):
+            ok = self.client.post("/extract", files={"file": ("a.pdf", b"%PDF-1.4 a", "application/pdf")})
+            fake.failure_rate = 1.0
+            failed = self.client.post("/extract", files={"file": ("b.pdf", b"%PDF-1.4 b", "application/pdf")})
+
+        self.assertEqual(ok.status_code, 200)
+        self.assertEqual(failed.status_code, 503)
+        # the injected 503 is transient, so it is retried OCI_MAX_ATTEMPTS times
+        attempts = self.app.OCI_MAX_ATTEMPTS
+        self.assertEqual((fake.calls, fake.failures), (1 + attempts, attempts))
+
+
+if __name__ == "__main__":
+    unittest.main()
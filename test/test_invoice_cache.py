@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+import db_util
+from app import app
+from db_util import init_db, clean_db, save_inv_extraction
+from lru import LRUCache
+
+
+def result(invoice_id, total, items=("a",)):
+    return {"data": {
+        "InvoiceId": invoice_id, "VendorName": "SuperStore", "InvoiceTotal": total,
+        "Items": [{"Description": d, "Name": d, "Quantity": 1, "UnitPrice": total,
+                   "Amount": total} for d in items],
+    }}
+
+
+class TestInvoiceCache(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+        self.stats_before = db_util.invoice_cache.stats()
+
+    def tearDown(self):
+        clean_db()
+
+    def invoice_stats(self):
+        stats = self.client.get("/stats/cache").json()["invoice"]
+        return stats["hits"] - self.stats_before["hits"], stats["misses"] - self.stats_before["misses"]
+
+    def test_repeat_read_served_from_cache(self):
+        save_inv_extraction(result("1", 10.0))
+
+        with patch.object(app_module, "load_invoice", wraps=app_module.load_invoice) as load:
+            first = self.client.get("/invoice/1")
+            second = self.client.get("/invoice/1")
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(self.invoice_stats(), (1, 1))
+
+    def test_if_none_match_returns_304(self):
+        save_inv_extraction(result("1", 10.0))
+        etag = self.client.get("/invoice/1").headers["ETag"]
+
+        response = self.client.get("/invoice/1", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_reextraction_invalidates_entry_and_etag(self):
+        save_inv_extraction(result("1", 10.0))
+        before = self.client.get("/invoice/1")
+
+        save_inv_extraction(result("1", 20.0, items=("b", "c")))
+        after = self.client.get("/invoice/1", headers={"If-None-Match": before.headers["ETag"]})
+
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json()["InvoiceTotal"], 20.0)
+        self.assertEqual(len(after.json()["Items"]), 2)
+        self.assertNotEqual(after.headers["ETag"], before.headers["ETag"])
+
+    def test_missing_invoice_not_cached(self):
+        self.assertEqual(self.client.get("/invoice/404").status_code, 404)
+        save_inv_extraction(result("404", 1.0))
+        self.assertEqual(self.client.get("/invoice/404").status_code, 200)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        cache = LRUCache(10, ttl=5)
+        with patch("lru.time.monotonic", return_value=100.0):
+            cache.put("a", 1)
+        with patch("lru.time.monotonic", return_value=106.0):
+            self.assertIsNone(cache.get("a"))
+
+    def test_put_after_invalidation_is_dropped(self):
+        cache = LRUCache(10)
+        version = cache.version
+        cache.invalidate(["a"])  # a write lands while the reader is querying
+        cache.put("a", "stale", version)
+
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
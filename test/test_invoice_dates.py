@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import db_util
+from app import app
+from dates import normalize_date
+from db_util import init_db, clean_db, close_db, get_db, save_inv_extractions
+
+
+def invoice(invoice_id, date, vendor="SuperStore"):
+    return {"data": {"InvoiceId": invoice_id, "VendorName": vendor, "InvoiceDate": date,
+                     "InvoiceTotal": 10.0, "Items": []}}
+
+
+class TestNormalizeDate(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(normalize_date("Mar 06 2012"), "2012-03-06")
+        self.assertEqual(normalize_date("March 6, 2012"), "2012-03-06")
+        self.assertEqual(normalize_date("2012-03-06T10:00:00"), "2012-03-06")
+        self.assertEqual(normalize_date("03/06/2012"), "2012-03-06")
+        self.assertIsNone(normalize_date("soon"))
+        self.assertIsNone(normalize_date(None))
+
+
+class TestInvoiceDateOrder(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+        save_inv_extractions([
+            invoice("A", "Dec 01 2011"),
+            invoice("B", "Apr 02 2012"),
+            invoice("C", "2012-01-15"),
+            invoice("D", "Feb 29 2012"),
+            invoice("E", None),
+        ])
+
+    def tearDown(self):
+        clean_db()
+
+    def test_listing_is_chronological(self):
+        body = self.client.get("/invoices/vendor/SuperStore").json()
+        # "Apr ..." sorted before "Dec ..." as text; ISO order is by date
+        self.assertEqual([i["InvoiceId"] for i in body["invoices"]], ["E", "A", "C", "D", "B"])
+        self.assertEqual(body["invoices"][1]["InvoiceDate"], "Dec 01 2011")
+
+    def test_date_range(self):
+        params = {"from": "2012-01-01", "to": "2012-03-31"}
+        body = self.client.get("/invoices/vendor/SuperStore", params=params).json()
+        self.assertEqual(body["TotalInvoices"], 2)
+        self.assertEqual([i["InvoiceId"] for i in body["invoices"]], ["C", "D"])
+
+        lines = self.client.get("/invoices/vendor/SuperStore/stream", params=params).text.splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_date_range_pages(self):
+        params = {"from": "2011-01-01", "limit": 2}
+        first = self.client.get("/invoices/vendor/SuperStore", params=params).json()
+        second = self.client.get("/invoices/vendor/SuperStore",
+                                 params={**params, "after": first["nextCursor"]}).json()
+        self.assertEqual([i["InvoiceId"] for i in first["invoices"]], ["A", "C"])
+        self.assertEqual([i["InvoiceId"] for i in second["invoices"]], ["D", "B"])
+
+    def test_empty_range_keeps_vendor(self):
+        body = self.client.get("/invoices/vendor/SuperStore", params={"from": "2020-01-01"}).json()
+        self.assertEqual(body["VendorName"], "SuperStore")
+        self.assertEqual(body["TotalInvoices"], 0)
+        self.assertEqual(body["invoices"], [])
+
+    def test_bad_date_is_rejected(self):
+        response = self.client.get("/invoices/vendor/SuperStore", params={"from": "Mar 2012"})
+        self.assertEqual(response.status_code, 422)
+
+    def test_range_is_an_index_range_scan(self):
+        with get_db() as conn:
+            plan = " ".join(r[3] for r in conn.execute("""
+                EXPLAIN QUERY PLAN
+                SELECT InvoiceId FROM invoices
+                WHERE VendorName = ? AND InvoiceDateISO >= ? AND InvoiceDateISO <= ?
+                ORDER BY InvoiceDateISO ASC, InvoiceId ASC
+            """, ("SuperStore", "2012-01-01", "2012-03-31")))
+        self.assertIn("idx_invoices_vendor_date", plan)
+        self.assertIn("InvoiceDateISO>?", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class TestInvoiceDateMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "legacy.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE invoices (InvoiceId TEXT PRIMARY KEY, VendorName TEXT, InvoiceDate TEXT,"
+                     " BillingAddressRecipient TEXT, ShippingAddress TEXT, SubTotal REAL,"
+                     " ShippingCost REAL, InvoiceTotal REAL)")
+        conn.execute("INSERT INTO invoices (InvoiceId, VendorName, InvoiceDate) VALUES"
+                     " ('1', 'SuperStore', 'Mar 06 2012'), ('2', 'SuperStore', 'n/a')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_backfill(self):
+        with patch.object(db_util, "DB_PATH", self.path):
+            init_db()
+            with get_db() as conn:
+                rows = conn.execute(
+                    "SELECT InvoiceId, InvoiceDateISO FROM invoices ORDER BY InvoiceId").fetchall()
+            close_db()
+        self.assertEqual(rows, [("1", "2012-03-06"), ("2", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import importlib
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+import jobs
+from db_util import init_db, clean_db, get_db, claim_next_job, requeue_running_jobs
+from test.oci_fakes import analyze_response
+
+SAMPLE = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+
+
+class TestAsyncExtractJobs(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_doc_client.analyze_document.return_value = analyze_response()
+        mock_get_client.return_value = self.mock_doc_client
+
+        # no sleeping between retries in tests
+        self.patcher_delay = patch.object(jobs, "retry_delay", return_value=0)
+        self.patcher_delay.start()
+
+        # TestClient without `with` -> lifespan does not start the background workers;
+        # the tests drain the queue explicitly with run_once()
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_delay.stop()
+        self.patcher_get_client.stop()
+
+    def submit(self):
+        with open(SAMPLE, "rb") as f:
+            return self.client.post(
+                "/extract",
+                params={"async": "true"},
+                files={"file": ("invoice_Aaron_Bergman_36259.pdf", f, "application/pdf")},
+            )
+
+    def test_async_extract_returns_job_and_result(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["jobId"]
+        self.assertEqual(response.headers["Location"], f"/jobs/{job_id}")
+        self.mock_doc_client.analyze_document.assert_not_called()
+
+        self.assertEqual(self.client.get(f"/jobs/{job_id}").json()["status"], "queued")
+
+        self.assertTrue(self.app.job_workers.run_once())
+
+        body = self.client.get(f"/jobs/{job_id}").json()
+        self.assertEqual(body["status"], "done")
+        self.assertEqual(body["result"]["data"]["InvoiceId"], "36259")
+        self.assertIn("dataConfidence", body["result"])
+        self.assertEqual(self.client.get("/invoice/36259").status_code, 200)
+
+    def test_invalid_file_rejected_synchronously(self):
+        response = self.client.post(
+            "/extract",
+            params={"async": "true"},
+            files={"file": ("test.txt", b"not a pdf", "text/plain")},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_503_is_retried_then_succeeds(self):
+        self.mock_doc_client.analyze_document.side_effect = [Exception("OCI down"), analyze_response()]
+        job_id = self.submit().json()["jobId"]
+
+        self.app.job_workers.run_once()
+        body = self.client.get(f"/jobs/{job_id}").json()
+        self.assertEqual(body["status"], "queued")
+        self.assertIn("lastError", body)
+
+        self.app.job_workers.run_once()
+        body = self.client.get(f"/jobs/{job_id}").json()
+        self.assertEqual(body["status"], "done")
+        self.assertEqual(body["attempts"], 2)
+
+    def test_503_gives_up_after_max_attempts(self):
+        self.mock_doc_client.analyze_document.side_effect = Exception("OCI down")
+        job_id = self.submit().json()["jobId"]
+
+        with patch.object(jobs, "JOB_MAX_ATTEMPTS", 2):
+            while self.app.job_workers.run_once():
+                pass
+
+        body = self.client.get(f"/jobs/{job_id}").json()
+        self.assertEqual(body["status"], "failed")
+        self.assertEqual(body["statusCode"], 503)
+        self.assertEqual(body["attempts"], 2)
+
+    def test_low_confidence_fails_without_retry(self):
+        self.mock_doc_client.analyze_document.return_value = analyze_response(confidence=0.4)
+        job_id = self.submit().json()["jobId"]
+
+        self.app.job_workers.run_once()
+
+        body = self.client.get(f"/jobs/{job_id}").json()
+        self.assertEqual(body["status"], "failed")
+        self.assertEqual(body["statusCode"], 400)
+
+    def test_running_jobs_survive_restart(self):
+        job_id = self.submit().json()["jobId"]
+        # simulate a crash mid-job: claimed but never finished
+        self.assertEqual(claim_next_job()[0], job_id)
+        self.assertEqual(self.client.get(f"/jobs/{job_id}").json()["status"], "running")
+
+        self.assertEqual(requeue_running_jobs(), 1)
+        self.assertTrue(self.app.job_workers.run_once())
+        self.assertEqual(self.client.get(f"/jobs/{job_id}").json()["status"], "done")
+
+        with get_db() as conn:
+            content = conn.execute("SELECT Content FROM jobs WHERE JobId = ?", (job_id,)).fetchone()[0]
+        self.assertIsNone(content)
+
+    def test_unknown_job_404(self):
+        response = self.client.get("/jobs/does-not-exist")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], "Job not found")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import re
+import unittest
+import importlib
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+from db_util import init_db, clean_db, save_inv_extraction
+from metrics import Histogram
+from test.oci_fakes import analyze_response
+
+SAMPLE = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+
+
+def sample_value(text, name, **labels):
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = re.escape(name + ("{" + label_text + "}" if label_text else "")) + r" (\S+)"
+    match = re.search("^" + pattern + "$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_doc_client.analyze_document.return_value = analyze_response()
+        mock_get_client.return_value = self.mock_doc_client
+
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_get_client.stop()
+
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        return response.text
+
+    def upload(self):
+        with open(SAMPLE, "rb") as f:
+            return self.client.post(
+                "/extract",
+                params={"no_cache": "true"},
+                files={"file": ("invoice_Aaron_Bergman_36259.pdf", f, "application/pdf")},
+            )
+
+    def test_extraction_stages_are_timed(self):
+        before = self.scrape()
+        self.assertEqual(self.upload().status_code, 200)
+        after = self.scrape()
+
+        for stage in ("read", "encode", "oci", "parse", "save"):
+            name = "invoice_extract_stage_seconds_count"
+            self.assertEqual(sample_value(after, name, stage=stage)
+                             - sample_value(before, name, stage=stage), 1, stage)
+
+        self.assertEqual(sample_value(after, "invoice_extract_requests_total", status=200)
+                         - sample_value(before, "invoice_extract_requests_total", status=200), 1)
+        self.assertEqual(sample_value(after, "invoice_document_confidence_bucket", le="1.0")
+                         - sample_value(before, "invoice_document_confidence_bucket", le="1.0"), 1)
+        self.assertEqual(sample_value(after, "invoice_extract_in_flight"), 0)
+
+    def test_oci_errors_and_503s_counted(self):
+        self.mock_doc_client.analyze_document.side_effect = Exception("OCI down")
+        before = self.scrape()
+        self.assertEqual(self.upload().status_code, 503)
+        after = self.scrape()
+
+        self.assertEqual(sample_value(after, "invoice_oci_calls_total", outcome="error")
+                         - sample_value(before, "invoice_oci_calls_total", outcome="error"), 1)
+        self.assertEqual(sample_value(after, "invoice_extract_requests_total", status=503)
+                         - sample_value(before, "invoice_extract_requests_total", status=503), 1)
+
+    def test_db_query_latency_recorded(self):
+        save_inv_extraction({"data": {"InvoiceId": "1", "VendorName": "SuperStore"}})
+        before = self.scrape()
+        self.client.get("/invoice/missing")
+        self.client.get("/invoices/vendor/SuperStore")
+        after = self.scrape()
+
+        for query in ("get_invoice_by_id", "get_invoices_by_vendor"):
+            name = "invoice_db_query_seconds_count"
+            self.assertEqual(sample_value(after, name, query=query)
+                             - sample_value(before, name, query=query), 1, query)
+
+    def test_each_metric_exposed_once(self):
+        help_lines = [l for l in self.scrape().splitlines() if l.startswith("# HELP")]
+        self.assertEqual(len(help_lines), len(set(help_lines)))
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_cumulative_buckets(self):
+        h = Histogram("test_seconds", "test", buckets=(0.1, 1.0), register=False)
+        for v in (0.05, 0.5, 5.0):
+            h.observe(v)
+
+        lines = h.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("test_seconds_count 3", lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from normalize import clean_money, normalize_document
+from test.oci_fakes import analyze_response, line_item, obj
+
+
+class TestNormalize(unittest.TestCase):
+
+    def test_clean_money(self):
+        self.assertEqual(clean_money("53.82"), 53.82)
+        self.assertEqual(clean_money("$1,234.50"), 1234.5)
+        self.assertEqual(clean_money("USD 7"), 7.0)
+        self.assertIsNone(clean_money(""))
+        self.assertIsNone(clean_money(None))
+        self.assertIsNone(clean_money("n/a"))
+
+    def test_document_to_result(self):
+        document = analyze_response(items=[
+            line_item("Newell 330 Art", "3.0", "$17.94", "53.82"),
+            line_item("Chair mat", "2", "33.57", "$67.14"),
+        ]).data
+
+        confidence, data, data_confidence = normalize_document(document)
+
+        self.assertEqual(confidence, 1.0)
+        self.assertEqual(data["InvoiceId"], "36259")
+        self.assertEqual(data["SubTotal"], 53.82)
+        self.assertEqual(data_confidence["SubTotal"], 0.90)
+        self.assertNotIn("Items", data_confidence)
+        self.assertEqual(data["Items"], [
+            {"Description": "Newell 330 Art", "Name": "Newell 330 Art",
+             "Quantity": 3, "UnitPrice": 17.94, "Amount": 53.82},
+            {"Description": "Chair mat", "Name": "Chair mat",
+             "Quantity": 2, "UnitPrice": 33.57, "Amount": 67.14},
+        ])
+
+    def test_missing_and_unknown_columns(self):
+        row = obj(field_value=obj(items=[
+            obj(field_label=obj(name="Amount"), field_value=None),
+            obj(field_label=None, field_value=obj(text="ignored")),
+            obj(field_label=obj(name="ProductCode"), field_value=obj(text="OFF-AR-5309")),
+            obj(field_label=obj(name="Quantity"), field_value=obj(text="")),
+        ]))
+        document = obj(
+            pages=[obj(document_fields=[
+                obj(field_type="LINE_ITEM_GROUP", field_label=obj(name="Items", confidence=None),
+                    field_value=obj(items=[row])),
+                obj(field_type="KEY_VALUE", field_label=obj(name="SubTotal", confidence=0.5),
+                    field_value=obj(text="")),
+            ])],
+            detected_document_types=None,
+        )
+
+        confidence, data, _ = normalize_document(document)
+
+        self.assertEqual(confidence, 0.0)
+        self.assertEqual(data["SubTotal"], "")
+        self.assertEqual(data["Items"], [
+            {"Description": None, "Name": None, "Quantity": None, "UnitPrice": None, "Amount": None},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import unittest
+import importlib
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from oci_pool import OciClientPool
+
+
+class TestOciClientPool(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp(suffix=".config")
+        os.close(fd)
+        self.loads = []
+        self.built = []
+
+        def loader(path, profile):
+            with open(path) as f:
+                config = {"content": f.read()}
+            self.loads.append(config)
+            return config
+
+        def factory(config):
+            client = object()
+            self.built.append((client, config))
+            return client
+
+        self.write_config("v1")
+        self.pool = OciClientPool(config_file=self.config_path, check_interval=0,
+                                  client_factory=factory, config_loader=loader)
+
+    def tearDown(self):
+        os.remove(self.config_path)
+
+    def write_config(self, content, mtime=None):
+        with open(self.config_path, "w") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(self.config_path, ns=(mtime, mtime))
+
+    def test_client_reused_within_thread(self):
+        self.pool.start()
+        first = self.pool.get()
+        second = self.pool.get()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.loads), 1)
+        self.assertEqual(len(self.built), 1)
+
+    def test_each_thread_gets_its_own_client(self):
+        self.pool.start()
+        clients = []
+        t = threading.Thread(target=lambda: clients.append(self.pool.get()))
+        t.start()
+        t.join()
+
+        self.assertIsNot(clients[0], self.pool.get())
+        self.assertEqual(len(self.loads), 1)
+
+    def test_rotated_config_builds_new_client(self):
+        self.pool.start()
+        before = self.pool.get()
+        self.write_config("v2", mtime=os.stat(self.config_path).st_mtime_ns + 10**9)
+        after = self.pool.get()
+
+        self.assertIsNot(before, after)
+        self.assertEqual(self.built[-1][1], {"content": "v2"})
+
+    def test_invalidate_forces_reload(self):
+        before = self.pool.get()
+        self.pool.invalidate()
+
+        self.assertIsNot(before, self.pool.get())
+        self.assertEqual(len(self.loads), 2)
+
+    def test_missing_config_is_not_fatal_at_startup(self):
+        pool = OciClientPool(config_file="/nonexistent/oci/config")
+        pool.start()
+        with self.assertRaises(Exception):
+            pool.get()
+
+
+class TestAppLifespan(unittest.TestCase):
+
+    def test_lifespan_starts_and_closes_pool(self):
+        import app
+        importlib.reload(app)
+        with patch.object(app.oci_clients, "start") as start, \
+                patch.object(app.oci_clients, "close") as close:
+            with TestClient(app.app):
+                start.assert_called_once()
+            close.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
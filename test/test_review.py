@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import db_util
+from app import app
+from db_util import init_db, clean_db, get_db, save_inv_extraction, save_inv_extractions, delete_invoices
+
+
+def result(invoice_id, **confidences):
+    base = {"VendorName": 0.99, "InvoiceDate": 0.99, "BillingAddressRecipient": 0.99,
+            "ShippingAddress": 0.99, "SubTotal": 0.99, "ShippingCost": 0.99, "InvoiceTotal": 0.99}
+    return {"confidence": 1.0,
+            "data": {"InvoiceId": invoice_id, "VendorName": "SuperStore", "InvoiceTotal": 1.0},
+            "dataConfidence": dict(base, **confidences)}
+
+
+class TestReviewQueue(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        clean_db()
+
+    def queue_ids(self, **params):
+        return [e["InvoiceId"] for e in self.client.get("/review", params=params).json()["invoices"]]
+
+    def test_flags_fields_below_threshold(self):
+        save_inv_extractions([
+            result("1"),
+            result("2", InvoiceTotal=0.5, ShippingAddress=0.7),
+            result("3", VendorName=0.8),
+            result("4", SubTotal=None),
+        ])
+
+        body = self.client.get("/review").json()
+        self.assertEqual(body["total"], 2)
+        self.assertEqual(body["invoices"][0]["InvoiceId"], "2")
+        self.assertEqual(body["invoices"][0]["MinConfidence"], 0.5)
+        self.assertEqual(body["invoices"][0]["Fields"], {"InvoiceTotal": 0.5, "ShippingAddress": 0.7})
+        self.assertEqual(body["invoices"][1]["Fields"], {"VendorName": 0.8})
+
+    def test_pages_with_cursor(self):
+        save_inv_extractions([result(str(n), InvoiceTotal=0.1 * (n % 4)) for n in range(9)])
+
+        seen, after = [], None
+        while True:
+            body = self.client.get("/review", params={"limit": 4, **({"after": after} if after else {})}).json()
+            seen += [(e["MinConfidence"], e["InvoiceId"]) for e in body["invoices"]]
+            after = body["nextCursor"]
+            if after is None:
+                break
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(self.client.get("/review", params={"after": "nope"}).status_code, 400)
+
+    def test_page_uses_the_index(self):
+        with get_db() as conn:
+            plan = " ".join(r[3] for r in conn.execute("""
+                EXPLAIN QUERY PLAN SELECT * FROM review_queue
+                WHERE (MinConfidence, InvoiceId) > (?, ?) ORDER BY MinConfidence, InvoiceId LIMIT 50
+            """, (0.5, "1")))
+        self.assertIn("idx_review_queue_order", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_re_extraction_and_resolve(self):
+        save_inv_extraction(result("1", InvoiceTotal=0.5))
+        save_inv_extraction(result("1"))  # corrected
+        self.assertEqual(self.queue_ids(), [])
+
+        save_inv_extraction(result("2", InvoiceTotal=0.5))
+        self.assertEqual(self.client.delete("/review/2").status_code, 204)
+        self.assertEqual(self.client.delete("/review/2").status_code, 404)
+        self.assertEqual(self.queue_ids(), [])
+
+    def test_threshold_change_rebuilds_queue(self):
+        save_inv_extractions([result("1", InvoiceTotal=0.85), result("2", InvoiceTotal=0.6)])
+        self.assertEqual(self.queue_ids(), ["2", "1"])
+
+        thresholds = dict(db_util.REVIEW_THRESHOLDS, InvoiceTotal=0.7)
+        with patch.object(db_util, "REVIEW_THRESHOLDS", thresholds):
+            init_db()
+            self.assertEqual(self.queue_ids(), ["2"])
+            stats = {f["field"]: f for f in self.client.get("/analytics/confidence").json()["fields"]}
+            self.assertEqual(stats["InvoiceTotal"]["belowThreshold"], 1)
+            self.assertEqual(stats["InvoiceTotal"]["threshold"], 0.7)
+        init_db()
+        self.assertEqual(self.queue_ids(), ["2", "1"])
+
+
+class TestConfidenceStats(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        clean_db()
+
+    def stats(self):
+        return {f["field"]: f for f in self.client.get("/analytics/confidence").json()["fields"]}
+
+    def test_incremental_stats_match_rebuild(self):
+        save_inv_extractions([result("1", InvoiceTotal=0.5), result("2", InvoiceTotal=0.95),
+                              result("3", InvoiceTotal=1.0, ShippingCost=None)])
+        save_inv_extraction(result("2", InvoiceTotal=0.85))  # replaced
+        delete_invoices(["3"])
+
+        total = self.stats()["InvoiceTotal"]
+        self.assertEqual(total["count"], 2)
+        self.assertAlmostEqual(total["mean"], 0.675)
+        self.assertAlmostEqual(total["stddev"], 0.175)
+        self.assertEqual(total["belowThreshold"], 2)
+        self.assertEqual(total["histogram"], [0, 0, 0, 0, 0, 1, 0, 0, 1, 0])
+        self.assertEqual(self.stats()["ShippingCost"]["count"], 2)
+
+        incremental = self.stats()
+        db_util.rebuild_derived_tables()
+        self.assertEqual(self.stats(), incremental)
+
+
+    def test_re_save_within_one_bucket_updates_sums(self):
+        save_inv_extraction(result("1", VendorName=0.91))
+        save_inv_extraction(result("1", VendorName=0.99))
+
+        vendor = self.stats()["VendorName"]
+        self.assertEqual(vendor["count"], 1)
+        self.assertAlmostEqual(vendor["mean"], 0.99)
+        self.assertAlmostEqual(vendor["stddev"], 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from db_util import init_db, clean_db, get_db, save_inv_extraction, save_inv_extractions
+
+
+def result(invoice_id, items, vendor="SuperStore"):
+    return {
+        "confidence": 1.0,
+        "data": {
+            "InvoiceId": invoice_id,
+            "VendorName": vendor,
+            "InvoiceTotal": 10.0,
+            "Items": [{"Description": d, "Name": d, "Quantity": 1,
+                       "UnitPrice": 10.0, "Amount": 10.0} for d in items],
+        },
+        "dataConfidence": {"VendorName": 0.95, "InvoiceTotal": 0.99},
+    }
+
+
+def item_descriptions(invoice_id):
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT Description FROM items WHERE InvoiceId = ? ORDER BY id", (invoice_id,)
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+class TestSaveExtraction(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+    def tearDown(self):
+        clean_db()
+
+    def test_reextraction_replaces_items(self):
+        save_inv_extraction(result("1", ["a", "b"]))
+        save_inv_extraction(result("1", ["c"]))
+
+        self.assertEqual(item_descriptions("1"), ["c"])
+
+    def test_many_results_in_one_call(self):
+        save_inv_extractions([result(str(n), [f"item {n}"] * n) for n in range(1, 51)])
+
+        with get_db() as conn:
+            invoices = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+            confidences = conn.execute("SELECT COUNT(*) FROM confidences").fetchone()[0]
+            items = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        self.assertEqual((invoices, confidences, items), (50, 50, sum(range(1, 51))))
+
+    def test_last_duplicate_in_list_wins(self):
+        save_inv_extractions([result("1", ["old"]), result("1", ["new", "newer"])])
+
+        self.assertEqual(item_descriptions("1"), ["new", "newer"])
+
+    def test_failure_rolls_back_whole_list(self):
+        save_inv_extraction(result("1", ["kept"]))
+        bad = result("2", ["x"])
+        bad["data"]["Items"][0]["Amount"] = {"not": "bindable"}
+
+        with self.assertRaises(Exception):
+            save_inv_extractions([result("1", ["replaced"]), bad])
+
+        self.assertEqual(item_descriptions("1"), ["kept"])
+        self.assertEqual(item_descriptions("2"), [])
+
+    def test_results_without_invoice_id_are_skipped(self):
+        save_inv_extractions([{"data": {"VendorName": "NoId"}}, result("1", ["a"])])
+
+        with get_db() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+        self.assertEqual(count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
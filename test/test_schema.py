@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db_util
+from db_util import init_db, get_db, close_db
+
+
+def query_plan(sql, params):
+    with get_db() as conn:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return " | ".join(r[-1] for r in rows)
+
+
+class TestSchemaIndexes(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+
+    def test_invoice_lookup_by_vendor_uses_index(self):
+        plan = query_plan("""
+            SELECT InvoiceId, VendorName, InvoiceDate FROM invoices
+            WHERE VendorName = ? ORDER BY InvoiceDateISO ASC
+        """, ("SuperStore",))
+
+        self.assertIn("idx_invoices_vendor_date", plan)
+        self.assertNotIn("SCAN invoices", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_items_by_invoice_uses_index(self):
+        plan = query_plan("""
+            SELECT Description, Name, Quantity, UnitPrice, Amount FROM items
+            WHERE InvoiceId = ? ORDER BY id ASC
+        """, ("36259",))
+
+        self.assertIn("idx_items_invoice", plan)
+        self.assertNotIn("SCAN items", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_vendor_items_join_uses_indexes(self):
+        plan = query_plan("""
+            SELECT items.InvoiceId, items.Description FROM items
+            JOIN invoices ON invoices.InvoiceId = items.InvoiceId
+            WHERE invoices.VendorName = ? ORDER BY items.id ASC
+        """, ("SuperStore",))
+
+        self.assertIn("idx_invoices_vendor_date", plan)
+        self.assertIn("idx_items_invoice", plan)
+        self.assertNotIn("SCAN items", plan)
+
+
+class TestSchemaMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "legacy.db")
+        # a database created by the original init_db: tables only, user_version 0
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE invoices (InvoiceId TEXT PRIMARY KEY, VendorName TEXT, InvoiceDate TEXT,"
+                     " BillingAddressRecipient TEXT, ShippingAddress TEXT, SubTotal REAL,"
+                     " ShippingCost REAL, InvoiceTotal REAL)")
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, InvoiceId TEXT,"
+                     " Description TEXT, Name TEXT, Quantity REAL, UnitPrice REAL, Amount REAL)")
+        conn.execute("INSERT INTO invoices (InvoiceId, VendorName) VALUES ('1', 'SuperStore')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_existing_database_gains_indexes(self):
+        with patch.object(db_util, "DB_PATH", self.path):
+            init_db()
+            init_db()  # idempotent
+            with get_db() as conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                indexes = {r[0] for r in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'")}
+                rows = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+                totals = conn.execute(
+                    "SELECT VendorName, InvoiceCount FROM vendor_monthly_totals").fetchall()
+            close_db()
+
+        self.assertEqual(version, len(db_util.MIGRATIONS))
+        self.assertIn("idx_invoices_vendor_date", indexes)
+        self.assertIn("idx_items_invoice", indexes)
+        self.assertEqual(rows, 1)
+        self.assertEqual(totals, [("SuperStore", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
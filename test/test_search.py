@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import db_util
+from app import app
+from db_util import init_db, clean_db, close_db, get_db, save_inv_extraction, fts_query
+
+
+def invoice(invoice_id, recipient, address, descriptions):
+    return {"data": {
+        "InvoiceId": invoice_id, "VendorName": "SuperStore", "InvoiceDate": "Mar 06 2012",
+        "BillingAddressRecipient": recipient, "ShippingAddress": address,
+        "Items": [{"Description": d, "Name": d, "Quantity": 1} for d in descriptions],
+    }}
+
+
+class TestFtsQuery(unittest.TestCase):
+
+    def test_words_are_quoted_phrases(self):
+        self.assertEqual(fts_query("OFF-AR-53"), '"OFF-AR-53" *')
+        self.assertEqual(fts_query('aaron "berg'), '"aaron" """berg" *')
+        self.assertEqual(fts_query(' NOT OR '), '"NOT" "OR" *')
+        self.assertIsNone(fts_query("   "))
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+        save_inv_extraction(invoice("1", "Aaron Bergman", "98103, Seattle, Washington",
+                                    ["Newell 330 Art, Office Supplies, OFF-AR-5309"]))
+        save_inv_extraction(invoice("2", "Brosina Hoffman", "90032, Los Angeles, California",
+                                    ["Eldon Base for stackable storage shelf, OFF-ST-10000798",
+                                     "Newell 317 Art, Office Supplies, OFF-AR-5310"]))
+        save_inv_extraction(invoice("3", "Darren Powers", "77095, Houston, Texas",
+                                    ["Global Deluxe Stacking Chair, FUR-CH-10002774"]))
+
+    def tearDown(self):
+        clean_db()
+
+    def ids(self, q, **params):
+        response = self.client.get("/search", params={"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [r["InvoiceId"] for r in response.json()["results"]]
+
+    def test_sku_fragment(self):
+        self.assertEqual(self.ids("OFF-AR-5309"), ["1"])
+        self.assertEqual(sorted(self.ids("OFF-AR-53")), ["1", "2"])
+        self.assertEqual(self.ids("FUR-CH"), ["3"])
+
+    def test_recipient_address_and_product(self):
+        self.assertEqual(self.ids("hoffman"), ["2"])
+        self.assertEqual(self.ids("Seattle"), ["1"])
+        self.assertEqual(self.ids("stacking chair"), ["3"])
+        self.assertEqual(self.ids("newell houston"), [])
+
+    def test_ranking_and_snippet(self):
+        body = self.client.get("/search", params={"q": "newell"}).json()
+        self.assertEqual(len(body["results"]), 2)
+        scores = [r["score"] for r in body["results"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertIn("[Newell]", body["results"][0]["snippet"])
+        self.assertTrue(body["ranked"])
+
+    def test_broad_query_falls_back_to_newest_first(self):
+        with patch.object(db_util, "SEARCH_MAX_RANKED", 1):
+            body = self.client.get("/search", params={"q": "office"}).json()
+        self.assertFalse(body["ranked"])
+        self.assertEqual([r["InvoiceId"] for r in body["results"]], ["2", "1"])
+
+    def test_pagination(self):
+        first = self.client.get("/search", params={"q": "office", "limit": 1}).json()
+        second = self.client.get("/search", params={"q": "office", "limit": 1,
+                                                    "offset": first["nextOffset"]}).json()
+        self.assertEqual(first["nextOffset"], 1)
+        self.assertEqual(len(second["results"]), 1)
+        self.assertNotEqual(first["results"][0]["InvoiceId"], second["results"][0]["InvoiceId"])
+
+    def test_reextraction_replaces_search_row(self):
+        save_inv_extraction(invoice("1", "Aaron Bergman", "98103, Seattle, Washington",
+                                    ["Xerox 1967 Paper, OFF-PA-10000174"]))
+        self.assertEqual(self.ids("OFF-AR-5309"), [])
+        self.assertEqual(self.ids("xerox"), ["1"])
+        with get_db() as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM invoice_search").fetchone()[0]
+        self.assertEqual(rows, 3)
+
+    def test_fts_syntax_is_not_interpreted(self):
+        self.assertEqual(self.ids('"'), [])
+        self.assertEqual(self.ids("NEAR(aaron"), [])
+        self.assertEqual(self.client.get("/search", params={"q": ""}).status_code, 422)
+
+
+class TestSearchMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "legacy.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE invoices (InvoiceId TEXT PRIMARY KEY, VendorName TEXT, InvoiceDate TEXT,"
+                     " BillingAddressRecipient TEXT, ShippingAddress TEXT, SubTotal REAL,"
+                     " ShippingCost REAL, InvoiceTotal REAL)")
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, InvoiceId TEXT,"
+                     " Description TEXT, Name TEXT, Quantity REAL, UnitPrice REAL, Amount REAL)")
+        conn.execute("INSERT INTO invoices (InvoiceId, VendorName, BillingAddressRecipient)"
+                     " VALUES ('1', 'SuperStore', 'Aaron Bergman'), ('2', 'SuperStore', 'Darren Powers')")
+        conn.execute("INSERT INTO items (InvoiceId, Description) VALUES ('1', 'Newell 330 Art, OFF-AR-5309')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_backfill(self):
+        with patch.object(db_util, "DB_PATH", self.path):
+            init_db()
+            found = [r["InvoiceId"] for r in db_util.search_invoices("OFF-AR-5309")[0]]
+            powers = [r["InvoiceId"] for r in db_util.search_invoices("powers")[0]]
+            close_db()
+        self.assertEqual(found, ["1"])
+        self.assertEqual(powers, ["2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+import backfill
+import db_util
+import export
+import storage
+from app import app
+from db_util import init_db, clean_db, close_db, get_db
+
+
+def result(invoice_id, vendor="SuperStore", date="Mar 06 2012", items=1):
+    return {"data": {"InvoiceId": invoice_id, "VendorName": vendor, "InvoiceDate": date,
+                     "InvoiceTotal": 1.5,
+                     "Items": [{"Description": f"item {k}", "Quantity": 1} for k in range(items)]}}
+
+
+class RepositoryContract:
+    """Behaviour every backend shares; subclasses build self.repo."""
+
+    def test_get_and_replace(self):
+        self.repo.save([result("1", items=2)])
+        self.repo.save([result("1", items=1)])
+        invoice = self.repo.get("1")
+        self.assertEqual(invoice["InvoiceTotal"], 1.5)
+        self.assertEqual(invoice["Items"], [{"Description": "item 0", "Name": None, "Quantity": 1,
+                                             "UnitPrice": None, "Amount": None}])
+        self.assertIsNone(self.repo.get("missing"))
+
+    def test_vendor_listing_order_cursor_and_range(self):
+        self.repo.save([result(str(n), date=date) for n, date in enumerate(
+            ["Mar 06 2012", "Jan 01 2012", "someday", "Mar 06 2012", "Feb 10 2012", "Dec 31 2011"])]
+            + [result("x", vendor="OfficeMart")])
+
+        ids = [i["InvoiceId"] for i in self.repo.list_by_vendor("SuperStore")]
+        self.assertEqual(ids, ["2", "5", "1", "4", "0", "3"])
+        self.assertEqual(self.repo.count_by_vendor("SuperStore"), 6)
+
+        page = self.repo.list_by_vendor("SuperStore", limit=2, after=("2012-01-01", "1"))
+        self.assertEqual([i["InvoiceId"] for i in page], ["4", "0"])
+        self.assertEqual([i["InvoiceId"] for i in self.repo.list_by_vendor("SuperStore", after=(None, "2"))],
+                         ["5", "1", "4", "0", "3"])
+
+        self.assertEqual(self.repo.count_by_vendor("SuperStore", "2012-01-01", "2012-02-29"), 2)
+        streamed = self.repo.iter_by_vendor("SuperStore", date_from="2012-02-01")
+        self.assertEqual([i["InvoiceId"] for i in streamed], ["4", "0", "3"])
+
+    def test_vendor_change_moves_invoice(self):
+        self.repo.save([result("1", vendor="SuperStore")])
+        self.repo.save([result("1", vendor="OfficeMart")])
+        self.assertEqual(self.repo.count_by_vendor("SuperStore"), 0)
+        self.assertEqual([i["InvoiceId"] for i in self.repo.list_by_vendor("OfficeMart")], ["1"])
+        self.assertEqual(self.repo.get("1")["VendorName"], "OfficeMart")
+
+
+class TestSqliteRepository(RepositoryContract, unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.repo = storage.SqliteRepository()
+
+    def tearDown(self):
+        clean_db()
+
+
+class TestMemoryRepository(RepositoryContract, unittest.TestCase):
+
+    def setUp(self):
+        self.repo = storage.MemoryRepository()
+
+
+class ShardedTestCase(unittest.TestCase):
+    key = "invoice"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = storage.ShardedSqliteRepository(
+            storage.shard_paths(3, os.path.join(self.tmp.name, "invoices.db")), key=self.key)
+        self.repo.init()
+
+    def tearDown(self):
+        close_db()
+        self.tmp.cleanup()
+
+    def shard_counts(self):
+        counts = []
+        for path in self.repo.paths:
+            with get_db(path) as conn:
+                counts.append(conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0])
+        return counts
+
+
+class TestShardedByInvoice(RepositoryContract, ShardedTestCase):
+
+    def test_shards_have_no_derived_tables(self):
+        self.repo.save([result(f"INV-{n}") for n in range(10)])
+        for path in self.repo.paths:
+            self.assertTrue({"invoices", "items", "confidences"} <= self.tables(path))
+            self.assertFalse(self.tables(path) & set(db_util.DERIVED_TABLES), path)
+
+        # opened as a full database, a shard file gets its derived tables back, filled
+        path = self.repo.paths[0]
+        db_util.init_db(path)
+        self.assertTrue(set(db_util.DERIVED_TABLES) <= self.tables(path))
+        with get_db(path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM invoice_search").fetchone()[0],
+                             conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0])
+        self.repo.init()
+        self.assertFalse(self.tables(path) & set(db_util.DERIVED_TABLES))
+
+    def tables(self, path):
+        with get_db(path) as conn:
+            return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def test_invoices_spread_over_shards(self):
+        self.repo.save([result(f"INV-{n}") for n in range(30)])
+        counts = self.shard_counts()
+        self.assertEqual(sum(counts), 30)
+        self.assertTrue(all(counts), counts)
+
+
+class TestShardedByVendor(RepositoryContract, ShardedTestCase):
+    key = "vendor"
+
+    def test_vendor_lives_on_one_shard(self):
+        self.repo.save([result(f"INV-{n}") for n in range(10)])
+        self.assertEqual(sorted(self.shard_counts()), [0, 0, 10])
+
+    def test_moved_invoice_leaves_old_shard(self):
+        vendors = ["SuperStore", "OfficeMart", "Staples", "Newell"]
+        shard = {v: self.repo._shard(v) for v in vendors}
+        old, new = next((a, b) for a in vendors for b in vendors if shard[a] is not shard[b])
+        self.repo.save([result("1", vendor=old)])
+        self.repo.save([result("1", vendor=new)])
+        self.assertEqual(sorted(self.shard_counts()), [0, 0, 1])
+
+
+class TestAppOnMemoryBackend(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        self.repo = storage.MemoryRepository()
+        self.patcher = patch.object(app_module, "repository", self.repo)
+        self.patcher.start()
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.repo.clear()
+
+    def test_endpoints_read_the_repository(self):
+        app_module.save_inv_extractions([result(str(n)) for n in range(3)])
+
+        self.assertEqual(self.client.get("/invoice/1").json()["InvoiceId"], "1")
+        self.assertEqual(self.client.get("/invoice/9").status_code, 404)
+        body = self.client.get("/invoices/vendor/SuperStore", params={"limit": 2}).json()
+        self.assertEqual(body["TotalInvoices"], 3)
+        rest = self.client.get("/invoices/vendor/SuperStore", params={"limit": 2, "after": body["nextCursor"]})
+        self.assertEqual([i["InvoiceId"] for i in rest.json()["invoices"]], ["2"])
+        lines = self.client.get("/invoices/vendor/SuperStore/stream").text.splitlines()
+        self.assertEqual(len(lines), 3)
+        with get_db() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0], 0)
+
+
+    def test_db_path_endpoints_refuse(self):
+        app_module.save_inv_extractions([result("1")])
+
+        for path in ("/search?q=item", "/analytics/vendors", "/analytics/monthly",
+                     "/analytics/vendors/SuperStore/monthly", "/export/invoices"):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 501, path)
+            self.assertIn("memory", response.json()["error"])
+
+    def test_review_endpoints_refuse(self):
+        for method, path in (("GET", "/review"), ("DELETE", "/review/1"), ("GET", "/analytics/confidence")):
+            self.assertEqual(self.client.request(method, path).status_code, 501, path)
+
+    def test_several_workers_refused(self):
+        app_module.check_workers(1)
+        with self.assertRaises(RuntimeError):
+            app_module.check_workers(2)
+
+
+class TestCliBackend(unittest.TestCase):
+
+    def test_backfill_and_export_refuse_other_backends(self):
+        with patch.object(storage, "STORAGE_BACKEND", "sharded"):
+            for main, argv in ((backfill.main, ["results.json"]), (export.main, ["--out", "x"])):
+                with self.assertRaises(SystemExit), patch("sys.stderr"):
+                    main(argv)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import importlib
+import io
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch, MagicMock
+
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+import uploads
+from db_util import init_db, clean_db
+from test.oci_fakes import analyze_response
+
+SAMPLE = "invoices_sample/invoice_Aaron_Bergman_36259.pdf"
+
+
+class TestUploadLimits(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+
+        import app
+        importlib.reload(app)
+        self.app = app
+
+        self.patcher_get_client = patch.object(app, "get_oci_client")
+        self.mock_get_client = self.patcher_get_client.start()
+        self.mock_doc_client = MagicMock()
+        self.mock_get_client.return_value = self.mock_doc_client
+        self.mock_doc_client.analyze_document.return_value = analyze_response()
+
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        clean_db()
+        self.patcher_get_client.stop()
+
+    def upload(self, content, filename="invoice.pdf"):
+        return self.client.post(
+            "/extract",
+            files={"file": (filename, content, "application/pdf")},
+        )
+
+    def test_spooled_upload_is_sent_to_oci(self):
+        with open(SAMPLE, "rb") as f:
+            pdf_bytes = f.read()
+
+        response = self.upload(pdf_bytes)
+
+        self.assertEqual(response.status_code, 200)
+        request = self.mock_doc_client.analyze_document.call_args[0][0]
+        self.assertEqual(base64.b64decode(request.document.data), pdf_bytes)
+
+    def test_oversized_upload_rejected_413(self):
+        with patch.object(uploads, "MAX_UPLOAD_BYTES", 1024):
+            response = self.upload(b"%PDF-1.4\n" + b"0" * 4096)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("error", response.json())
+        self.mock_doc_client.analyze_document.assert_not_called()
+
+    def test_declared_content_length_rejected_before_body_is_read(self):
+        with patch.object(uploads, "MAX_UPLOAD_BYTES", 1024), \
+                patch.object(uploads, "spool_upload") as mock_spool:
+            response = self.upload(b"%PDF-1.4\n" + b"0" * (200 * 1024))
+
+        self.assertEqual(response.status_code, 413)
+        mock_spool.assert_not_called()
+
+    def test_batch_marks_oversized_file_413(self):
+        with open(SAMPLE, "rb") as f:
+            pdf_bytes = f.read()
+
+        with patch.object(uploads, "MAX_UPLOAD_BYTES", len(pdf_bytes)):
+            response = self.client.post("/extract/batch", files=[
+                ("files", ("ok.pdf", pdf_bytes, "application/pdf")),
+                ("files", ("big.pdf", pdf_bytes + b"0", "application/pdf")),
+            ])
+
+        statuses = {r["filename"]: r["status"] for r in response.json()["results"]}
+        self.assertEqual(statuses, {"ok.pdf": 200, "big.pdf": 413})
+
+
+    def test_oversized_zip_member_is_413_without_decompressing(self):
+        with open(SAMPLE, "rb") as f:
+            pdf_bytes = f.read()
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("ok.pdf", pdf_bytes)
+            zf.writestr("bomb.pdf", b"%PDF-1.4\n" + b"0" * (4 * len(pdf_bytes)))
+
+        with patch.object(uploads, "MAX_UPLOAD_BYTES", len(pdf_bytes)), \
+                patch.object(zipfile.ZipFile, "open", autospec=True,
+                             side_effect=zipfile.ZipFile.open) as mock_open:
+            response = self.client.post("/extract/batch", files=[
+                ("files", ("invoices.zip", buf.getvalue(), "application/zip"))])
+
+        statuses = {r["filename"]: r["status"] for r in response.json()["results"]}
+        self.assertEqual(statuses, {"ok.pdf": 200, "bomb.pdf": 413})
+        self.assertEqual([c.args[1].filename for c in mock_open.call_args_list], ["ok.pdf"])
+
+    def test_batch_total_size_is_bounded(self):
+        with open(SAMPLE, "rb") as f:
+            pdf_bytes = f.read()
+
+        with patch.object(self.app, "BATCH_MAX_BYTES", 2 * len(pdf_bytes)):
+            response = self.client.post("/extract/batch", files=[
+                ("files", (f"{n}.pdf", pdf_bytes + bytes([n]), "application/pdf")) for n in range(3)])
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("error", response.json())
+        self.mock_doc_client.analyze_document.assert_not_called()
+
+    def test_batch_declared_content_length_rejected(self):
+        with patch.object(self.app, "BATCH_MAX_BYTES", 1024), \
+                patch.object(self.app, "_expand_batch_upload") as mock_expand:
+            response = self.client.post("/extract/batch", files=[
+                ("files", ("big.pdf", b"%PDF-1.4\n" + b"0" * (200 * 1024), "application/pdf"))])
+
+        self.assertEqual(response.status_code, 413)
+        mock_expand.assert_not_called()
+
+class TestSpoolUpload(unittest.TestCase):
+
+    def spool(self, upload, accept=True):
+        return asyncio.run(uploads.spool_upload(upload, lambda u, head: accept, "bad"))
+
+    def test_non_pdf_rejected_after_reading_head_only(self):
+        upload = UploadFile(io.BytesIO(b"not a pdf" * 10000), filename="x.txt")
+
+        with self.assertRaises(HTTPException) as ctx:
+            self.spool(upload, accept=False)
+
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(upload.file.tell(), uploads.PDF_HEAD_BYTES)
+
+    def test_encode_base64_matches_b64encode(self):
+        chunk = uploads.UPLOAD_CHUNK
+        data = b"%PDF-" + bytes(range(256)) * (3 * chunk // 256)
+        for size in (5, 6, 7, chunk - 1, chunk, chunk + 1, 2 * chunk + 2):
+            content = data[:size]
+            with tempfile.SpooledTemporaryFile() as spool:
+                spool.write(content)
+                spool.seek(0)
+                pdf = self.spool(UploadFile(spool, filename="invoice.pdf"))
+
+                self.assertEqual(pdf.size, len(content))
+                self.assertEqual(uploads.encode_base64(pdf),
+                                 base64.b64encode(content).decode("ascii"))
+
+
+if __name__ == "__main__":
+    unittest.main()
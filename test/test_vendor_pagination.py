@@ -0,0 +1,128 @@
+import json
+import unittest
+
+from fastapi.testclient import TestClient
+
+from app import app
+from db_util import init_db, clean_db, get_db, save_inv_extractions
+
+
+def seed(n, vendor="SuperStore"):
+    save_inv_extractions([
+        {"data": {
+            "InvoiceId": f"INV-{k:03d}",
+            "VendorName": vendor,
+            # a few invoices share a date, a few have none
+            "InvoiceDate": None if k % 10 == 0 else f"2012-03-{k % 7 + 1:02d}",
+            "InvoiceTotal": float(k),
+            "Items": [{"Description": f"item {k}.{i}", "Name": None, "Quantity": 1,
+                       "UnitPrice": 1.0, "Amount": 1.0} for i in range(k % 3)],
+        }}
+        for k in range(n)
+    ])
+
+
+class TestVendorPagination(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        clean_db()
+
+    def test_pages_cover_full_listing_in_order(self):
+        seed(25)
+        full = self.client.get("/invoices/vendor/SuperStore").json()["invoices"]
+
+        pages, after = [], None
+        while True:
+            params = {"limit": 10}
+            if after:
+                params["after"] = after
+            body = self.client.get("/invoices/vendor/SuperStore", params=params).json()
+            self.assertEqual(body["TotalInvoices"], 25)
+            pages.extend(body["invoices"])
+            after = body["nextCursor"]
+            if after is None:
+                break
+
+        self.assertEqual(len(full), 25)
+        self.assertEqual(pages, full)
+
+    def test_last_full_page_then_empty_page(self):
+        seed(10)
+        first = self.client.get("/invoices/vendor/SuperStore", params={"limit": 10}).json()
+        second = self.client.get("/invoices/vendor/SuperStore",
+                                 params={"limit": 10, "after": first["nextCursor"]}).json()
+
+        self.assertEqual(len(first["invoices"]), 10)
+        self.assertEqual(second["invoices"], [])
+        self.assertIsNone(second["nextCursor"])
+
+    def test_after_without_limit_returns_the_rest(self):
+        seed(25)
+        full = self.client.get("/invoices/vendor/SuperStore").json()["invoices"]
+        first = self.client.get("/invoices/vendor/SuperStore", params={"limit": 10}).json()
+        rest = self.client.get("/invoices/vendor/SuperStore", params={"after": first["nextCursor"]})
+
+        self.assertEqual(rest.status_code, 200)
+        self.assertEqual(rest.json()["invoices"], full[10:])
+
+    def test_page_larger_than_sqlite_param_limit(self):
+        seed(1200)
+        page = self.client.get("/invoices/vendor/SuperStore", params={"limit": 1000})
+
+        self.assertEqual(page.status_code, 200)
+        invoices = page.json()["invoices"]
+        self.assertEqual(len(invoices), 1000)
+        self.assertEqual(sum(len(i["Items"]) for i in invoices),
+                         sum(k % 3 for k in range(1200) if f"INV-{k:03d}" in {i["InvoiceId"] for i in invoices}))
+
+    def test_invalid_cursor_is_400(self):
+        seed(1)
+        response = self.client.get("/invoices/vendor/SuperStore",
+                                   params={"limit": 5, "after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Invalid cursor")
+
+    def test_stream_matches_listing(self):
+        seed(25)
+        seed(3, vendor="Other")
+        full = self.client.get("/invoices/vendor/SuperStore").json()["invoices"]
+
+        response = self.client.get("/invoices/vendor/SuperStore/stream")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        streamed = [json.loads(line) for line in response.text.splitlines()]
+
+        self.assertEqual(streamed, full)
+
+    def test_stream_resumes_after_cursor(self):
+        seed(25)
+        page = self.client.get("/invoices/vendor/SuperStore", params={"limit": 10}).json()
+        full = self.client.get("/invoices/vendor/SuperStore").json()["invoices"]
+
+        response = self.client.get("/invoices/vendor/SuperStore/stream",
+                                   params={"after": page["nextCursor"]})
+        streamed = [json.loads(line) for line in response.text.splitlines()]
+
+        self.assertEqual(streamed, full[10:])
+
+    def test_keyset_page_is_an_index_range_scan(self):
+        with get_db() as conn:
+            plan = " | ".join(r[-1] for r in conn.execute("""
+                EXPLAIN QUERY PLAN
+                SELECT InvoiceId FROM invoices
+                WHERE VendorName = ? AND (InvoiceDateISO, InvoiceId) > (?, ?)
+                ORDER BY InvoiceDateISO ASC, InvoiceId ASC LIMIT 10
+            """, ("SuperStore", "2012-03-01", "INV-001")))
+
+        self.assertIn("idx_invoices_vendor_date", plan)
+        self.assertIn("(InvoiceDateISO,InvoiceId)>", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import db_util
+import writer
+from app import app
+from db_util import init_db, clean_db, close_db, get_db, open_connection, save_inv_extraction
+
+
+def result(invoice_id, total=1.0):
+    return {"data": {"InvoiceId": invoice_id, "VendorName": "SuperStore", "InvoiceTotal": total,
+                     "Items": [{"Description": "item", "Quantity": 1}]}}
+
+
+class WriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.tmp.name, "writer.sock")
+        self.server = writer.WriterServer(self.address, b"secret")
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        while not os.path.exists(self.address):
+            pass
+        self.client = writer.WriterClient(self.address, b"secret")
+
+    def tearDown(self):
+        db_util.remote_writer = None
+        self.client.close()
+        self.server.close()
+        self.thread.join(5)
+        self.tmp.cleanup()
+        clean_db()
+
+    def count(self):
+        with get_db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+
+class TestWriter(WriterTestCase):
+
+    def test_concurrent_clients(self):
+        errors = []
+
+        def save(n):
+            try:
+                for k in range(10):
+                    self.client.save([result(f"{n}-{k}")])
+            except Exception as exc:  # pragma: no cover
+                errors.append(exc)
+
+        threads = [threading.Thread(target=save, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.count(), 80)
+
+    def test_bad_request_does_not_fail_its_group(self):
+        server = writer.WriterServer(os.path.join(self.tmp.name, "other.sock"), b"secret")
+        good = server.submit([result("1")])
+        bad = server.submit([result("2"), {"data": {"InvoiceId": ["not", "a", "string"]}}])
+        also_good = server.submit([result("3")])
+        server.close()
+        with patch.object(db_util, "write_inv_extractions", wraps=db_util.write_inv_extractions) as save:
+            server._write_loop()
+
+        self.assertEqual(save.call_count, 4)  # the group, then one by one
+        self.assertEqual([good.reply, bad.reply, also_good.reply],
+                         [("ok", None), ("error", "save failed"), ("ok", None)])
+        self.assertEqual(self.count(), 2)
+
+    def test_save_goes_through_remote_writer(self):
+        db_util.remote_writer = self.client
+        threads = []
+        real_write = db_util._write_extractions
+
+        def write(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return real_write(*args, **kwargs)
+
+        with patch.object(db_util, "_write_extractions", write):
+            save_inv_extraction(result("1"))
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(threads, ["writer"])
+
+    def test_client_reconnects_after_writer_restart(self):
+        self.client.save([result("1")])
+        self.server.close()
+        self.thread.join(5)
+        self.server = writer.WriterServer(self.address, b"secret")
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        while not os.path.exists(self.address):
+            pass
+
+        self.client.save([result("2")])
+        self.assertEqual(self.count(), 2)
+
+
+class TestCacheSync(unittest.TestCase):
+
+    def setUp(self):
+        init_db()
+        clean_db()
+        self.client = TestClient(app)
+        save_inv_extraction(result("1", total=1.0))
+        db_util.enable_cache_sync()
+
+    def tearDown(self):
+        db_util.disable_cache_sync()
+        clean_db()
+
+    def test_save_from_another_process_evicts_cached_invoice(self):
+        first = self.client.get("/invoice/1").json()
+        self.assertEqual(first["InvoiceTotal"], 1.0)
+
+        # another process: its own connection, this process's cache is not told
+        other = open_connection()
+        with patch.object(db_util.invoice_cache, "invalidate"):
+            db_util._write_extractions(other.cursor(), [result("1", total=2.0)])
+        other.commit()
+        other.close()
+
+        self.assertEqual(self.client.get("/invoice/1").json()["InvoiceTotal"], 2.0)
+
+
+class TestInitLock(unittest.TestCase):
+
+    def test_concurrent_init_on_new_database(self):
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "new.db")
+        errors = []
+
+        def init():
+            try:
+                init_db()
+            except Exception as exc:  # pragma: no cover
+                errors.append(exc)
+            finally:
+                close_db()
+
+        with patch.object(db_util, "DB_PATH", path):
+            threads = [threading.Thread(target=init) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            with get_db() as conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+            close_db()
+        tmp.cleanup()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(version, len(db_util.MIGRATIONS))
+
+
+if __name__ == "__main__":
+    unittest.main()
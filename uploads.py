@@ -0,0 +1,95 @@
+import base64
+import binascii
+import hashlib
+import os
+
+from fastapi import HTTPException, UploadFile
+
+
+# הגודל המקסימלי של PDF בבקשה אחת; קבצים גדולים יותר נדחים ב-413
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# multiple of 3, so base64 of consecutive chunks concatenates without padding
+UPLOAD_CHUNK = 3 * 256 * 1024
+PDF_HEAD_BYTES = 5
+
+FILE_TOO_LARGE = "File too large. Maximum upload size is {} bytes."
+
+
+class SpooledPdf:
+    """An uploaded PDF left in Starlette's spool file instead of a bytes copy.
+
+    Holds the size and sha256 computed while the upload was read; the body is
+    re-read from the spool in chunks when it is encoded.
+    """
+
+    def __init__(self, file, size, content_hash):
+        self.file = file
+        self.size = size
+        self.content_hash = content_hash
+
+    def read(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def __len__(self):
+        return self.size
+
+
+def too_large():
+    return HTTPException(status_code=413, detail=FILE_TOO_LARGE.format(MAX_UPLOAD_BYTES))
+
+
+async def spool_upload(upload: UploadFile, is_valid_head, invalid_detail):
+    """Validate and hash an upload without materializing it.
+
+    The size limit is checked against the declared size first, and
+    ``is_valid_head(upload, first_bytes)`` runs on the first bytes before
+    the rest is read.
+    """
+    if upload.size is not None and upload.size > MAX_UPLOAD_BYTES:
+        raise too_large()
+
+    head = await upload.read(PDF_HEAD_BYTES)
+    if not head or not is_valid_head(upload, head):
+        raise HTTPException(status_code=400, detail=invalid_detail)
+
+    hasher = hashlib.sha256(head)
+    size = len(head)
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise too_large()
+        hasher.update(chunk)
+
+    return SpooledPdf(upload.file, size, hasher.hexdigest())
+
+
+def content_hash(pdf):
+    if isinstance(pdf, SpooledPdf):
+        return pdf.content_hash
+    return hashlib.sha256(pdf).hexdigest()
+
+
+def encode_base64(pdf):
+    """Base64 text of the PDF for InlineDocumentDetails.
+
+    A spooled upload is encoded chunk by chunk into one preallocated buffer,
+    so the raw PDF is never held in memory alongside its encoding.
+    """
+    if not isinstance(pdf, SpooledPdf):
+        return base64.b64encode(pdf).decode("ascii")
+
+    out = bytearray(4 * ((pdf.size + 2) // 3))
+    pos = 0
+    pdf.file.seek(0)
+    while True:
+        chunk = pdf.file.read(UPLOAD_CHUNK)
+        if not chunk:
+            break
+        encoded = binascii.b2a_base64(chunk, newline=False)
+        out[pos:pos + len(encoded)] = encoded
+        pos += len(encoded)
+    return out.decode("ascii")
@@ -0,0 +1,232 @@
+"""Single writer process for multi-worker mode (APP_WORKERS > 1).
+
+Every uvicorn worker sends its invoice saves here over a unix socket
+(multiprocessing.connection), so only one process ever writes invoices and
+SQLite never answers "database is locked" to a save. The writer groups
+whatever requests are waiting into one transaction (up to WRITER_BATCH_MAX
+results), so concurrent saves cost one commit instead of one each.
+
+    with writer_process():        # in the supervisor, before starting workers
+        uvicorn.run("app:app", workers=n)
+
+Workers find the socket through INVOICE_WRITER_ADDRESS / INVOICE_WRITER_AUTHKEY
+(see client_from_env) and set db_util.remote_writer.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import secrets
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.connection import Client, Listener
+
+import db_util
+
+
+WRITER_BATCH_MAX = int(os.getenv("WRITER_BATCH_MAX", "500"))
+WRITER_START_TIMEOUT = float(os.getenv("WRITER_START_TIMEOUT", "10"))
+ADDRESS_ENV = "INVOICE_WRITER_ADDRESS"
+AUTHKEY_ENV = "INVOICE_WRITER_AUTHKEY"
+
+logger = logging.getLogger(__name__)
+
+
+class WriterError(Exception):
+    """The writer process could not save the results."""
+
+
+class _Request:
+    __slots__ = ("results", "reply", "done")
+
+    def __init__(self, results):
+        self.results = results
+        self.reply = None
+        self.done = threading.Event()
+
+
+class WriterServer:
+    """Accepts save requests on ``address``; one thread does all the writing."""
+
+    def __init__(self, address, authkey, batch_max=None):
+        self.address = address
+        self.authkey = authkey
+        self.batch_max = batch_max or WRITER_BATCH_MAX
+        self._queue = queue.Queue()
+        self._closing = False
+        self._connections = set()
+
+    def serve_forever(self):
+        db_util.init_db()
+        threading.Thread(target=self._write_loop, name="writer", daemon=True).start()
+        with Listener(self.address, family="AF_UNIX", authkey=self.authkey) as listener:
+            logger.info("Writer listening on %s", self.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, multiprocessing.AuthenticationError):  # pragma: no cover
+                    logger.exception("Writer accept failed")
+                    continue
+                if self._closing:
+                    conn.close()
+                    return
+                self._connections.add(conn)
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        """Stop the writer thread and the accept loop (which closes and unlinks the socket)."""
+        self._closing = True
+        self._queue.put(None)
+        try:
+            # accept() is not interrupted by closing the socket; wake it with a connection
+            Client(self.address, family="AF_UNIX", authkey=self.authkey).close()
+        except OSError:
+            pass
+        # handler threads are blocked in recv(); shutting the sockets down gives them EOF
+        for conn in list(self._connections):
+            try:
+                with socket.fromfd(conn.fileno(), socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def submit(self, results):
+        """Queue ``results`` for the writer thread; wait on the returned request's ``done``."""
+        request = _Request(results)
+        self._queue.put(request)
+        return request
+
+    def _handle(self, conn):
+        try:
+            while True:
+                op, payload = conn.recv()
+                if op != "save":
+                    conn.send(("error", f"unknown op {op!r}"))
+                    continue
+                request = self.submit(payload)
+                request.done.wait()
+                conn.send(request.reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            self._connections.discard(conn)
+            conn.close()
+
+    def _write_loop(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            group, size = [request], len(request.results)
+            while size < self.batch_max:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                group.append(request)
+                size += len(request.results)
+            self._write(group)
+
+    def _write(self, group):
+        try:
+            db_util.write_inv_extractions([r for request in group for r in request.results])
+            replies = [("ok", None)] * len(group)
+        except Exception:
+            if len(group) == 1:
+                logger.exception("Writer save failed")
+                replies = [("error", "save failed")]
+            else:
+                # one bad request must not fail the others: retry them one by one
+                for request in group:
+                    self._write([request])
+                return
+        for request, reply in zip(group, replies):
+            request.reply = reply
+            request.done.set()
+
+
+class WriterClient:
+    """Sends saves to a WriterServer; one connection per calling thread."""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        return conn
+
+    def save(self, results):
+        # saves are idempotent (INSERT OR REPLACE), so resending after a broken connection is safe
+        for attempt in (1, 2):
+            try:
+                conn = self._connection()
+                conn.send(("save", results))
+                status, detail = conn.recv()
+                break
+            except (EOFError, OSError):
+                self.close()
+                if attempt == 2:
+                    raise WriterError("writer process unavailable")
+        if status != "ok":
+            raise WriterError(detail)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+
+def client_from_env():
+    """WriterClient for the supervisor's writer, or None when running single-process."""
+    address = os.getenv(ADDRESS_ENV)
+    if not address:
+        return None
+    return WriterClient(address, bytes.fromhex(os.environ[AUTHKEY_ENV]))
+
+
+def _run_writer(address, authkey, db_path):  # pragma: no cover - runs in the child process
+    db_util.DB_PATH = db_path
+    logging.basicConfig(level=logging.INFO)
+    WriterServer(address, authkey).serve_forever()
+
+
+@contextmanager
+def writer_process():
+    """Start the writer process and export its address to child processes' env."""
+    address = os.path.join(tempfile.gettempdir(), f"invoice-writer-{os.getpid()}.sock")
+    if os.path.exists(address):
+        os.unlink(address)
+    authkey = secrets.token_bytes(16)
+    process = multiprocessing.get_context("spawn").Process(
+        target=_run_writer, args=(address, authkey, db_util.DB_PATH), name="invoice-writer", daemon=True)
+    process.start()
+
+    deadline = time.monotonic() + WRITER_START_TIMEOUT
+    while not os.path.exists(address):
+        if not process.is_alive() or time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError("writer process did not start")
+        time.sleep(0.05)
+
+    os.environ[ADDRESS_ENV] = address
+    os.environ[AUTHKEY_ENV] = authkey.hex()
+    try:
+        yield address
+    finally:
+        os.environ.pop(ADDRESS_ENV, None)
+        os.environ.pop(AUTHKEY_ENV, None)
+        process.terminate()
+        process.join(5)
+        if os.path.exists(address):
+            os.unlink(address)